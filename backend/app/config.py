@@ -1,4 +1,5 @@
 """Configuration management using Pydantic Settings."""
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,14 +15,81 @@ class Settings(BaseSettings):
     
     # Database configuration
     database_url: str
+    default_database: str = "default"  # name under which database_url is served
+    databases: Dict[str, str] = {}  # additional databases: JSON object of name -> URL
+    database_idle_timeout: int = 900  # seconds before an idle additional database is closed, 0 = never
     
-    # OpenAI configuration
-    openai_api_key: str
+    # LLM configuration
+    llm_backend: str = "openai"  # "openai" or "fake" (local, no network, for load tests)
+    openai_api_key: str = ""  # required with the openai backend
     openai_model: str = "gpt-4"
+    llm_fast_model: str = ""  # faster, cheaper model for easy questions (e.g. "gpt-4o-mini"), "" disables the cascade
+    llm_fast_max_complexity: float = 1.5  # questions scoring above this go to openai_model
+    sql_explanation_mode: str = "llm"  # "llm" (written by the model) or "local" (rendered from the SQL, fewer output tokens)
+    
+    # Outbound LLM call scheduling (provider rate limits)
+    llm_requests_per_minute: int = 0  # 0 = unlimited
+    llm_tokens_per_minute: int = 0  # estimated prompt + completion tokens, 0 = unlimited
+    llm_max_concurrency: int = 0  # calls in flight, 0 = unlimited
+    llm_queue_timeout: float = 10  # max seconds a call may wait for admission, 0 = no limit
+    chat_request_timeout: float = 60  # seconds for the LLM calls of a chat request, 0 = no deadline
+    llm_hedge_percentile: float = 0  # hedge SQL generations slower than this latency percentile (e.g. 0.95), 0 disables
+    llm_hedge_budget: float = 0.05  # max hedged calls as a fraction of all calls
+    llm_hedge_min_samples: int = 20  # latencies observed before hedging starts
+    
+    # HTTP connections to the LLM provider
+    llm_http_max_connections: int = 100
+    llm_http_max_keepalive: int = 20  # idle connections kept open
+    llm_http_keepalive_expiry: float = 60  # seconds before an idle connection is closed
+    llm_http2: bool = False  # needs the h2 package (httpx[http2])
+    llm_http_warmup_connections: int = 2  # opened at startup, 0 disables
+    
+    # Fake LLM backend (llm_backend = "fake")
+    fake_llm_latency_ms: float = 500  # median time to first token
+    fake_llm_latency_distribution: str = "lognormal"  # "fixed", "uniform" or "lognormal"
+    fake_llm_latency_sigma: float = 0.5  # lognormal sigma; uniform spread as a fraction of the median
+    fake_llm_token_ms: float = 20  # per generated token
+    fake_llm_summary_tokens: int = 80  # summary length in tokens, 0 = natural length
+    fake_llm_error_rate: float = 0.0  # fraction of calls that fail
+    fake_llm_seed: Optional[int] = None  # fixed seed for reproducible runs
+    fake_llm_responses: Dict[str, str] = {}  # canned SQL: JSON object of question -> SQL
     
     # Query execution limits
     statement_timeout: int = 30  # seconds
     max_query_limit: int = 100
+    large_table_rows: int = 1_000_000  # tables with more rows get a cost check
+    max_query_cost: float = 0  # planner cost limit for queries on large tables, 0 disables
+    sql_repair_max_fixes: int = 3  # misspelled/mis-cased identifiers fixed per query, 0 disables repair
+    
+    # Schema loading
+    schema_load_mode: str = "bulk"  # "bulk", "per_table" or "lazy"
+    schema_lazy_cache_tables: int = 2000  # table details kept in memory in lazy mode
+    schema_load_parallelism: int = 1  # pool connections used by bulk loading
+    schema_refresh_interval: int = 60  # seconds between catalog polls, 0 disables
+    schema_refresh_channel: str = ""  # LISTEN channel for DDL notifications
+    schema_stats_interval: int = 600  # seconds between table statistics reloads, 0 disables
+    schema_snapshot_dir: str = ""  # directory for on-disk schema snapshots, empty disables
+    
+    # Schema context sent to the LLM
+    schema_context_token_budget: int = 4000  # estimated tokens, 0 = unlimited
+    schema_context_max_tables: int = 0  # 0 = no limit
+    schema_join_max_depth: int = 3  # max foreign-key hops when joining selected tables
+    
+    # Value dictionary for grounding question literals
+    value_dictionary_ttl: int = 3600  # seconds before a column is re-sampled, 0 disables
+    value_dictionary_max_distinct: int = 50  # columns with more distinct values are skipped
+    value_dictionary_max_entries: int = 50000  # total sampled values
+    
+    # Rule-based SQL for "how many X", "top N X by Y" and "list X where col = value"
+    rule_sql_enabled: bool = True  # questions that don't resolve unambiguously still go to the LLM
+    
+    # Result summaries
+    summary_mode: str = "llm"  # "none", "stats" (local, no LLM call) or "llm" (LLM over local stats)
+    
+    # Cache of generated SQL
+    generation_cache_size: int = 1000  # in-memory entries, 0 disables the cache
+    generation_cache_ttl: int = 86400  # seconds, 0 disables the cache
+    generation_cache_path: str = ""  # sqlite file for a persistent tier, empty disables
     
     # API configuration
     api_host: str = "0.0.0.0"
@@ -9,13 +9,19 @@ from app.config import settings
 class Database:
     """Database connection pool manager."""
     
-    def __init__(self):
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or settings.database_url
         self._pool: Optional[asyncpg.Pool] = None
     
+    @property
+    def is_connected(self) -> bool:
+        """Whether the connection pool has been created."""
+        return self._pool is not None
+    
     async def connect(self):
         """Create connection pool."""
         self._pool = await asyncpg.create_pool(
-            settings.database_url,
+            self.url,
             min_size=1,
             max_size=10,
             command_timeout=settings.statement_timeout + 5,
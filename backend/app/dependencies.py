@@ -3,6 +3,8 @@ from fastapi import Depends
 from typing import Annotated
 
 from app.database import db
+from app.services.database_registry import database_registry
+from app.services.generation_cache import generation_cache
 from app.services.schema_loader import schema_loader
 from app.services.llm_service import llm_service
 from app.services.sql_validator import sql_validator
@@ -14,6 +16,16 @@ def get_database():
     return db
 
 
+def get_database_registry():
+    """Dependency for the database registry."""
+    return database_registry
+
+
+def get_generation_cache():
+    """Dependency for the SQL generation cache."""
+    return generation_cache
+
+
 def get_schema_loader():
     """Dependency for schema loader."""
     return schema_loader
@@ -5,9 +5,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.database import db
-from app.services.schema_loader import schema_loader
-from app.routes import chat
+from app.services.database_registry import database_registry
+from app.services.generation_cache import generation_cache
+from app.services.llm_service import llm_service
+from app.routes import cache, chat, llm, repair, rules
 
 # Configure logging
 logging.basicConfig(
@@ -23,13 +24,13 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting application...")
     try:
-        # Connect to database
-        await db.connect()
+        # Connect to the default database and load its schema; other
+        # databases start on first use
+        await database_registry.start()
         logger.info("Database connected")
         
-        # Load schema
-        await schema_loader.load_schema()
-        logger.info(f"Schema loaded: {len(schema_loader.get_schema())} tables")
+        # Open LLM connections now rather than on the first request
+        await llm_service.warm_up()
         
     except Exception as e:
         logger.error(f"Startup failed: {str(e)}")
@@ -39,7 +40,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down application...")
-    await db.disconnect()
+    await database_registry.stop()
+    generation_cache.close()
+    await llm_service.close()
     logger.info("Application shut down")
 
 
@@ -62,15 +65,33 @@ app.add_middleware(
 
 # Include routers
 app.include_router(chat.router)
+app.include_router(cache.router)
+app.include_router(llm.router)
+app.include_router(repair.router)
+app.include_router(rules.router)
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint (reports the default database)."""
+    default = await database_registry.get()
     return {
         "status": "healthy",
-        "database": "connected" if db._pool else "disconnected",
-        "schema_loaded": schema_loader._schema_cache is not None
+        "database": "connected" if default.database.is_connected else "disconnected",
+        "schema_loaded": default.schema_loader.is_loaded,
+        "schema_version": default.schema_loader.snapshot.version if default.schema_loader.is_loaded else None
+    }
+
+
+@app.get("/databases")
+async def list_databases():
+    """List the configured databases and whether each is currently loaded."""
+    return {
+        "default": database_registry.default_name,
+        "databases": [
+            {"name": name, "loaded": database_registry.is_loaded(name)}
+            for name in database_registry.names
+        ]
     }
 
 
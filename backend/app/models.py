@@ -1,11 +1,13 @@
 """Pydantic models for request/response validation."""
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 
 
 class ChatRequest(BaseModel):
     """Request model for chat endpoint."""
     query: str
+    database: Optional[str] = None  # configured database name, default if omitted
+    summary: Optional[Literal["none", "stats", "llm"]] = None  # summary mode, settings.summary_mode if omitted
 
 
 class ChatResponse(BaseModel):
@@ -0,0 +1,19 @@
+"""Generation cache statistics and maintenance."""
+from fastapi import APIRouter
+
+from app.services.generation_cache import generation_cache
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+
+@router.get("")
+async def cache_stats():
+    """Hit/miss counters and size of the SQL generation cache."""
+    return generation_cache.stats()
+
+
+@router.delete("")
+async def purge_cache():
+    """Remove every cached SQL generation (memory and disk)."""
+    removed = await generation_cache.purge()
+    return {"purged": removed}
@@ -1,12 +1,29 @@
 """Chat endpoint for natural language to SQL queries."""
+import json
+import math
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 import logging
 
+from app.config import settings
 from app.models import ChatRequest, ChatResponse
+from app.services.database_registry import (
+    database_registry, DatabaseContext, UnknownDatabaseError
+)
+from app.services.generation_cache import generation_cache
+from app.services.llm_backend import LLMTimeoutError
+from app.services.llm_cascade import TIER_FAST, TIER_STRONG
+from app.services.llm_scheduler import LLMOverloadedError
 from app.services.llm_service import llm_service
-from app.services.schema_loader import schema_loader
-from app.services.sql_validator import sql_validator, ValidationError
-from app.services.query_executor import query_executor, QueryExecutionError
+from app.services.question_template import QuestionTemplate
+from app.services.result_summarizer import profile_rows, render_summary
+from app.services.rule_generator import TIER_RULES, rule_generator
+from app.services.sql_explainer import explain_sql
+from app.services.sql_repair import sql_repairer
+from app.services.sql_validator import ValidationError
+from app.services.query_executor import QueryExecutionError
 
 logger = logging.getLogger(__name__)
 
@@ -27,24 +44,292 @@ async def chat(request: ChatRequest):
     6. Return response
     """
     try:
-        # Get schema context
-        schema_context = schema_loader.get_schema_context()
-        
-        # Generate SQL via LLM
-        logger.info(f"Generating SQL for query: {request.query}")
-        llm_result = await llm_service.generate_sql(
-            user_query=request.query,
-            schema_context=schema_context
+        async with database_registry.use(request.database) as database:
+            return await _answer(request, database)
+        
+    except UnknownDatabaseError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LLMOverloadedError as e:
+        raise _overloaded(e)
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error in chat endpoint")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process natural language query, streaming progress as server-sent events.
+    
+    Events, in order:
+    - sql: generated SQL, params, explanation and whether it came from cache;
+      sent again (escalated) when SQL from the rules or the fast model of
+      the cascade failed and was generated again
+    - validated_sql: the SQL that will run (LIMIT enforced) and the local
+      identifier repairs applied to it; sent again if the database rejected
+      an identifier that could then be repaired
+    - rows: query results
+    - summary: one event per summary fragment, as the LLM produces it
+      (a single event in "stats" summary mode, none in "none" mode)
+    - done
+    
+    A failing stage emits an error event (status and detail, as the
+    non-streaming endpoint would return them, plus retry_after when the
+    LLM rate limits were reached) and ends the stream.
+    """
+    # Unknown databases are rejected before the stream starts
+    try:
+        await database_registry.get(request.database)
+    except UnknownDatabaseError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return StreamingResponse(
+        _stream_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _answer(request: ChatRequest, database: DatabaseContext) -> ChatResponse:
+    """Run the chat flow against one database."""
+    run = _ChatRun(request, database)
+    llm_result = await run.generate_sql()
+    while True:
+        try:
+            validated_sql = await run.validate_sql(llm_result)
+            rows, validated_sql = await run.execute_sql(
+                validated_sql, llm_result.get("params", []), llm_result
+            )
+            break
+        except HTTPException as e:
+            llm_result = await run.escalate(e)
+    summary = "".join([fragment async for fragment in run.summarize(rows, validated_sql)])
+    
+    return ChatResponse(
+        summary=summary,
+        rows=rows,
+        explanation=_explanation(llm_result, validated_sql),
+        sql=validated_sql
+    )
+
+
+async def _stream_events(request: ChatRequest) -> AsyncIterator[str]:
+    """Run the chat flow, yielding an event as each stage completes."""
+    try:
+        async with database_registry.use(request.database) as database:
+            run = _ChatRun(request, database)
+            llm_result = await run.generate_sql()
+            while True:
+                params = llm_result.get("params", [])
+                yield _event("sql", {
+                    "sql": llm_result["sql"],
+                    "params": params,
+                    "explanation": _explanation(llm_result, llm_result["sql"]),
+                    "cached": run.cache_hit,
+                    "escalated": run.escalated
+                })
+                
+                try:
+                    validated_sql = await run.validate_sql(llm_result)
+                    yield _event("validated_sql", {"sql": validated_sql, "repairs": run.repairs})
+                    
+                    executed_sql = validated_sql
+                    rows, validated_sql = await run.execute_sql(validated_sql, params, llm_result)
+                    if validated_sql != executed_sql:
+                        yield _event("validated_sql", {"sql": validated_sql, "repairs": run.repairs})
+                    break
+                except HTTPException as e:
+                    llm_result = await run.escalate(e)
+            yield _event("rows", {"rows": rows})
+        
+        # The summary doesn't need the database, so it is released first
+        async for fragment in run.summarize(rows, validated_sql, stream=True):
+            yield _event("summary", {"text": fragment})
+        yield _event("done", {})
+        
+    except LLMOverloadedError as e:
+        yield _event("error", {"status": 503, "detail": str(e), "retry_after": math.ceil(e.retry_after)})
+    except LLMTimeoutError as e:
+        yield _event("error", {"status": 504, "detail": str(e)})
+    except HTTPException as e:
+        yield _event("error", {"status": e.status_code, "detail": e.detail})
+    except Exception as e:
+        logger.exception("Unexpected error in chat stream")
+        yield _event("error", {"status": 500, "detail": f"Internal server error: {str(e)}"})
+
+
+def _overloaded(error: LLMOverloadedError) -> HTTPException:
+    """503 for an LLM call that the rate limits don't allow in time."""
+    logger.warning(f"LLM call rejected: {str(error)}")
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(math.ceil(error.retry_after))}
+    )
+
+
+def _explanation(llm_result: Dict[str, Any], sql: str) -> str:
+    """The model's explanation, or one rendered from the SQL if it has none."""
+    return llm_result.get("explanation") or explain_sql(sql)
+
+
+def _event(name: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event."""
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class _ChatRun:
+    """The stages of one chat request, shared by the plain and streaming endpoints."""
+    
+    def __init__(self, request: ChatRequest, database: DatabaseContext):
+        self.request = request
+        self.database = database
+        # Use one schema snapshot for the whole request, even if a refresh
+        # publishes a new one meanwhile
+        self.snapshot = database.schema_loader.snapshot
+        self.template = QuestionTemplate(request.query)
+        self.cache_hit = False
+        # Whether the SQL should be cached once it has run: generated by the
+        # LLM, or repaired after it came from the cache
+        self._cacheable = False
+        self.repairs: List[str] = []
+        # Cascade tier that generated the SQL (TIER_RULES for the rule-based
+        # fast path, None for cache hits)
+        self.tier: Optional[str] = None
+        self.escalated = False
+        self._schema_context = ""
+        # LLM calls of the request must finish by this time.monotonic()
+        self.deadline = (
+            time.monotonic() + settings.chat_request_timeout
+            if settings.chat_request_timeout > 0 else None
+        )
+        
+        # Reuse SQL generated earlier for the same question, schema and model,
+        # or for the same question with different literals
+        self._cache_key = generation_cache.key(
+            request.query, self.snapshot.content_hash, llm_service.model, database.name
+        )
+        self._template_key = generation_cache.key(
+            self.template.text, self.snapshot.content_hash, llm_service.model,
+            database.name, kind="template"
+        ) if self.template.literals else None
+    
+    async def generate_sql(self) -> Dict[str, Any]:
+        """Get SQL for the question from the rules, the generation cache or the LLM."""
+        # Common question shapes are answered without a model
+        rule_result = await rule_generator.generate(
+            self.request.query,
+            self.snapshot,
+            self.database.schema_loader,
+            self.database.value_dictionary
+        )
+        if rule_result is not None:
+            self.tier = TIER_RULES
+            return rule_result
+        return await self._generate()
+    
+    async def _generate(self, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Get SQL for the question from the generation cache or the LLM.
+        
+        Args:
+            use_cache: Look in the generation cache first (False after
+                cached SQL failed)
+        """
+        self.tier = None
+        llm_result = None
+        if use_cache:
+            llm_result = await generation_cache.get(self._cache_key)
+            if llm_result is None and self._template_key is not None:
+                entry = await generation_cache.get(self._template_key)
+                llm_result = self.template.bind(entry) if entry is not None else None
+        self.cache_hit = llm_result is not None
+        self._cacheable = not self.cache_hit
+        if self.cache_hit:
+            logger.info(f"Generation cache hit for query: {self.request.query}")
+            return llm_result
+        
+        # Ground literals of the question in stored column values
+        value_matches = self.database.value_dictionary.match(self.request.query, self.snapshot)
+        
+        # Get schema context, pruned to the tables relevant to the question
+        schema_context = await self.database.schema_loader.get_schema_context(
+            max_tables=settings.schema_context_max_tables or None,
+            snapshot=self.snapshot,
+            question=self.request.query,
+            required_tables=[match.table for match in value_matches]
+        ) + self.database.value_dictionary.render_hints(value_matches)
+        
+        # Generate SQL via LLM, with the fast model if the question is easy
+        self._schema_context = schema_context
+        self.tier = llm_service.route(self.request.query, schema_context)
+        logger.info(f"Generating SQL ({self.tier} model) for query: {self.request.query}")
+        return await llm_service.generate_sql(
+            user_query=self.request.query,
+            schema_context=schema_context,
+            deadline=self.deadline,
+            tier=self.tier
         )
+    
+    async def escalate(self, error: HTTPException) -> Dict[str, Any]:
+        """
+        Generate SQL again after SQL from the rules failed (with the LLM),
+        SQL from the generation cache failed (with the LLM, after evicting
+        the entries) or SQL from the fast model failed (with the strong
+        model).
         
-        sql = llm_result["sql"]
-        params = llm_result.get("params", [])
-        explanation = llm_result.get("explanation", "Generated SQL query")
+        Raises:
+            HTTPException: The original error, if the SQL came from none of them
+        """
+        stage = "validation" if error.status_code == 400 else "execution"
+        if self.tier == TIER_RULES:
+            rule_generator.record_failure(stage)
+            logger.info(f"Rule-based SQL failed {stage}, asking the LLM: {error.detail}")
+            self.escalated = True
+            self.repairs = []
+            return await self._generate()
+        if self.cache_hit:
+            logger.info(f"Cached SQL failed {stage}, generating again: {error.detail}")
+            await generation_cache.evict(self._cache_key, self._template_key)
+            self.escalated = True
+            self.repairs = []
+            return await self._generate(use_cache=False)
+        if self.tier != TIER_FAST:
+            raise error
+        llm_service.cascade.record_escalation(stage)
+        logger.info(f"Escalating to the strong model after {stage} failed: {error.detail}")
+        self.tier = TIER_STRONG
+        self.escalated = True
+        self.repairs = []
+        return await llm_service.generate_sql(
+            user_query=self.request.query,
+            schema_context=self._schema_context,
+            deadline=self.deadline,
+            tier=TIER_STRONG
+        )
+    
+    async def validate_sql(self, llm_result: Dict[str, Any]) -> str:
+        """
+        Validate generated SQL, repairing unknown identifiers.
         
-        # Validate SQL
-        logger.info(f"Validating SQL: {sql}")
+        Raises:
+            HTTPException: 400 if the SQL is invalid or unsafe
+        """
+        logger.info(f"Validating SQL: {llm_result['sql']}")
         try:
-            validated_sql = sql_validator.validate(sql)
+            sql, validated_sql, fixes = await sql_repairer.validate(
+                llm_result["sql"],
+                self.database.sql_validator,
+                self.database.schema_loader,
+                self.snapshot
+            )
         except ValidationError as e:
             logger.error(f"SQL validation failed: {str(e)}")
             raise HTTPException(
@@ -52,38 +337,154 @@ async def chat(request: ChatRequest):
                 detail=f"Generated SQL is invalid or unsafe: {str(e)}"
             )
         
-        # Execute query
+        if fixes:
+            self.repairs.extend(fixes)
+            llm_result["sql"] = sql
+            # Don't serve the unrepaired SQL from the cache
+            self._cacheable = self.tier != TIER_RULES
+        return validated_sql
+    
+    async def _remember(self, llm_result: Dict[str, Any]):
+        """
+        Cache a generation whose SQL ran.
+        
+        Only SQL that passed validation and execution is worth reusing. The
+        template entry is only stored when every literal maps to exactly one
+        parameter. Rule-based SQL is cheaper to build again than to look up.
+        """
+        if not self._cacheable:
+            return
+        await generation_cache.put(self._cache_key, llm_result)
+        if self._template_key is not None:
+            entry = self.template.parameterize(llm_result)
+            if entry is not None:
+                await generation_cache.put(self._template_key, entry)
+    
+    async def execute_sql(
+        self,
+        validated_sql: str,
+        params: List[Any],
+        llm_result: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Run validated SQL, and cache the generation once it has run.
+        
+        If the database rejects an unknown column that can be repaired, the
+        repaired SQL is validated again and run instead.
+        
+        Returns:
+            The rows and the SQL that produced them
+        
+        Raises:
+            HTTPException: 500 if execution fails
+        """
+        # Details of the referenced tables (only fetched in lazy schema mode)
+        referenced_tables = self.database.sql_validator.get_referenced_tables(validated_sql)
+        await self.database.schema_loader.load_tables(referenced_tables, self.snapshot)
+        
         logger.info(f"Executing SQL with params: {params}")
         try:
-            rows = await query_executor.execute(validated_sql, params)
+            rows = await self.database.query_executor.execute(
+                validated_sql,
+                params,
+                tables=referenced_tables,
+                snapshot=self.snapshot
+            )
+            if llm_result is not None:
+                await self._remember(llm_result)
+            return rows, validated_sql
         except QueryExecutionError as e:
-            logger.error(f"Query execution failed: {str(e)}")
+            repaired = sql_repairer.repair_execution_error(
+                validated_sql, e, self.snapshot, referenced_tables
+            )
+            if repaired is None:
+                logger.error(f"Query execution failed: {str(e)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Query execution failed: {str(e)}"
+                )
+            error = e
+        
+        # Repaired SQL goes through validation again before it runs
+        repaired_sql, fix = repaired
+        try:
+            repaired_sql, validated_sql, fixes = await sql_repairer.validate(
+                repaired_sql,
+                self.database.sql_validator,
+                self.database.schema_loader,
+                self.snapshot
+            )
+            rows = await self.database.query_executor.execute(
+                validated_sql,
+                params,
+                tables=referenced_tables,
+                snapshot=self.snapshot
+            )
+        except (ValidationError, QueryExecutionError) as e:
+            logger.error(f"Query execution failed after repair: {str(e)}")
             raise HTTPException(
                 status_code=500,
-                detail=f"Query execution failed: {str(e)}"
+                detail=f"Query execution failed: {str(error)}"
             )
         
-        # Summarize results
-        logger.info(f"Summarizing {len(rows)} rows")
-        summary = await llm_service.summarize_results(
-            user_query=request.query,
-            rows=rows,
-            sql=validated_sql
-        )
+        sql_repairer.record_execution_repaired()
+        self.repairs.extend([fix] + fixes)
+        logger.info(f"Repaired SQL after database error ({fix})")
+        if llm_result is not None:
+            llm_result["sql"] = repaired_sql
+            self._cacheable = self.tier != TIER_RULES
+            await self._remember(llm_result)
+        return rows, validated_sql
+    
+    async def summarize(
+        self,
+        rows: List[Dict[str, Any]],
+        validated_sql: str,
+        stream: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Summarize query results in the request's summary mode.
         
-        return ChatResponse(
-            summary=summary,
-            rows=rows,
-            explanation=explanation,
-            sql=validated_sql
-        )
+        "none" yields nothing, "stats" a local statistical summary, and
+        "llm" an LLM summary written from the column statistics (streamed
+        fragment by fragment if requested, and replaced by the local summary
+        when the LLM rate limits don't admit the call in time or it misses
+        the request deadline).
+        """
+        mode = self.request.summary or settings.summary_mode
+        if mode == "none":
+            return
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.exception("Unexpected error in chat endpoint")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Internal server error: {str(e)}"
-        )
-
+        profile = profile_rows(rows)
+        if mode == "stats":
+            yield render_summary(profile, rows)
+            return
+        
+        logger.info(f"Summarizing {len(rows)} rows")
+        produced = False
+        try:
+            if stream:
+                async for fragment in llm_service.stream_summary(
+                    user_query=self.request.query,
+                    rows=rows,
+                    sql=validated_sql,
+                    profile=profile,
+                    deadline=self.deadline
+                ):
+                    produced = True
+                    yield fragment
+            else:
+                yield await llm_service.summarize_results(
+                    user_query=self.request.query,
+                    rows=rows,
+                    sql=validated_sql,
+                    profile=profile,
+                    deadline=self.deadline
+                )
+        except (LLMOverloadedError, LLMTimeoutError) as e:
+            # The results are already there: fall back to the local summary,
+            # unless part of the LLM summary was streamed
+            if produced:
+                raise
+            logger.warning(f"LLM summary unavailable, using local statistics: {str(e)}")
+            yield render_summary(profile, rows)
@@ -0,0 +1,20 @@
+"""LLM backend and call scheduler statistics."""
+from fastapi import APIRouter
+
+from app.services.llm_http import llm_http_pool
+from app.services.llm_scheduler import llm_scheduler
+from app.services.llm_service import llm_service
+
+router = APIRouter(prefix="/llm", tags=["llm"])
+
+
+@router.get("")
+async def llm_stats():
+    """Model in use, the rate-limit queue of outbound LLM calls, hedging, model cascade and connection pool."""
+    return {
+        "model": llm_service.model,
+        "scheduler": llm_scheduler.stats(),
+        "hedging": llm_service.hedger.stats(),
+        "cascade": llm_service.cascade_stats(),
+        "http_pool": llm_http_pool.stats()
+    }
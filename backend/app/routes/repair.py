@@ -0,0 +1,12 @@
+"""SQL repair statistics."""
+from fastapi import APIRouter
+
+from app.services.sql_repair import sql_repairer
+
+router = APIRouter(prefix="/repair", tags=["repair"])
+
+
+@router.get("")
+async def repair_stats():
+    """How often generated SQL referenced unknown names and how often repair saved the request."""
+    return sql_repairer.stats()
@@ -0,0 +1,12 @@
+"""Rule-based SQL statistics."""
+from fastapi import APIRouter
+
+from app.services.rule_generator import rule_generator
+
+router = APIRouter(prefix="/rules", tags=["rules"])
+
+
+@router.get("")
+async def rule_stats():
+    """How many questions the rule-based fast path answered without the LLM."""
+    return rule_generator.stats()
@@ -0,0 +1,209 @@
+"""Registry of named databases, each with its own pool and schema caches."""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+from app.database import db, Database
+from app.services.query_executor import query_executor, QueryExecutor
+from app.services.schema_loader import schema_loader, SchemaLoader
+from app.services.schema_refresher import schema_refresher, SchemaRefresher
+from app.services.sql_validator import sql_validator, SQLValidator
+from app.services.value_dictionary import value_dictionary, ValueDictionary
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownDatabaseError(Exception):
+    """Raised when a request names a database that is not configured."""
+    pass
+
+
+class DatabaseContext:
+    """Connection pool, schema snapshot and services of one database."""
+    
+    def __init__(
+        self,
+        name: str,
+        database: Database,
+        schema_loader: SchemaLoader,
+        schema_refresher: SchemaRefresher,
+        value_dictionary: ValueDictionary,
+        sql_validator: SQLValidator,
+        query_executor: QueryExecutor
+    ):
+        self.name = name
+        self.database = database
+        self.schema_loader = schema_loader
+        self.schema_refresher = schema_refresher
+        self.value_dictionary = value_dictionary
+        self.sql_validator = sql_validator
+        self.query_executor = query_executor
+        self.active_requests = 0
+        self.last_used = time.monotonic()
+    
+    @classmethod
+    def create(cls, name: str, url: str) -> "DatabaseContext":
+        """Build a context with its own instances of every service."""
+        database = Database(url)
+        loader = SchemaLoader(database)
+        return cls(
+            name,
+            database,
+            loader,
+            SchemaRefresher(loader),
+            ValueDictionary(loader),
+            SQLValidator(loader),
+            QueryExecutor(database, loader)
+        )
+    
+    async def start(self):
+        """Connect, load the schema and start the background tasks."""
+        await self.database.connect()
+        
+        # Load schema: serve from the snapshot file of a previous run if there
+        # is one and revalidate it in the background, else crawl the catalog
+        from_file = self.schema_loader.load_snapshot_file()
+        if not from_file:
+            await self.schema_loader.load_schema()
+        logger.info(
+            f"Database '{self.name}': schema loaded"
+            f"{' from snapshot file' if from_file else ''}, "
+            f"{len(self.schema_loader.get_schema())} tables"
+        )
+        
+        # Keep the schema in sync with DDL changes
+        await self.schema_refresher.start(revalidate=from_file)
+        
+        # Sample column values for grounding literals in the background
+        await self.value_dictionary.start()
+    
+    async def stop(self):
+        """Stop the background tasks and close the pool."""
+        await self.value_dictionary.stop()
+        await self.schema_refresher.stop()
+        await self.database.disconnect()
+
+
+class DatabaseRegistry:
+    """
+    Named databases, started lazily and evicted when idle.
+    
+    The default database (settings.database_url) uses the global service
+    instances and is started eagerly; databases from settings.databases get
+    their own pool, schema snapshot and allow-list on first use and are
+    stopped after database_idle_timeout seconds without requests.
+    """
+    
+    def __init__(self):
+        self.default_name = settings.default_database
+        self._urls: Dict[str, str] = {
+            **settings.databases,
+            self.default_name: settings.database_url
+        }
+        self._contexts: Dict[str, DatabaseContext] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._eviction_task: Optional[asyncio.Task] = None
+    
+    @property
+    def names(self) -> List[str]:
+        """Names of all configured databases."""
+        return sorted(self._urls)
+    
+    def is_loaded(self, name: str) -> bool:
+        """Whether a database is currently started."""
+        return name in self._contexts
+    
+    async def start(self):
+        """Start the default database and the idle eviction task."""
+        default = DatabaseContext(
+            self.default_name,
+            db,
+            schema_loader,
+            schema_refresher,
+            value_dictionary,
+            sql_validator,
+            query_executor
+        )
+        await default.start()
+        self._contexts[self.default_name] = default
+        
+        if settings.database_idle_timeout > 0 and len(self._urls) > 1:
+            self._eviction_task = asyncio.create_task(self._evict_idle())
+    
+    async def stop(self):
+        """Stop the eviction task and every started database."""
+        if self._eviction_task:
+            self._eviction_task.cancel()
+            try:
+                await self._eviction_task
+            except asyncio.CancelledError:
+                pass
+            self._eviction_task = None
+        contexts, self._contexts = self._contexts, {}
+        for context in contexts.values():
+            await context.stop()
+    
+    async def get(self, name: Optional[str] = None) -> DatabaseContext:
+        """
+        Get a started database context, starting it on first use.
+        
+        Raises:
+            UnknownDatabaseError: If the name is not configured
+        """
+        name = name or self.default_name
+        context = self._contexts.get(name)
+        if context is None:
+            if name not in self._urls:
+                raise UnknownDatabaseError(
+                    f"Unknown database '{name}'. Available databases: {self.names}"
+                )
+            lock = self._locks.setdefault(name, asyncio.Lock())
+            async with lock:
+                context = self._contexts.get(name)
+                if context is None:
+                    context = DatabaseContext.create(name, self._urls[name])
+                    try:
+                        await context.start()
+                    except Exception:
+                        await context.stop()
+                        raise
+                    self._contexts[name] = context
+        context.last_used = time.monotonic()
+        return context
+    
+    @asynccontextmanager
+    async def use(self, name: Optional[str] = None) -> AsyncIterator[DatabaseContext]:
+        """Get a database context and keep it from being evicted while in use."""
+        context = await self.get(name)
+        context.active_requests += 1
+        try:
+            yield context
+        finally:
+            context.active_requests -= 1
+            context.last_used = time.monotonic()
+    
+    async def _evict_idle(self):
+        """Stop databases (other than the default) that have been idle too long."""
+        timeout = settings.database_idle_timeout
+        while True:
+            await asyncio.sleep(min(60, timeout))
+            now = time.monotonic()
+            for name, context in list(self._contexts.items()):
+                if (
+                    name != self.default_name
+                    and context.active_requests == 0
+                    and now - context.last_used > timeout
+                ):
+                    del self._contexts[name]
+                    logger.info(f"Database '{name}' idle for {timeout}s, stopping")
+                    try:
+                        await context.stop()
+                    except Exception as e:
+                        logger.error(f"Failed to stop database '{name}': {str(e)}")
+
+
+# Global database registry instance
+database_registry = DatabaseRegistry()
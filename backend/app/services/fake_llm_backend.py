@@ -0,0 +1,144 @@
+"""Deterministic local LLM backend for load tests and benchmarks."""
+import asyncio
+import logging
+import math
+import random
+import re
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+from app.services.generation_cache import normalize_question
+from app.services.llm_backend import LLMBackend
+from app.services.result_summarizer import profile_rows, render_summary
+from app.services.schema_loader import CHARS_PER_TOKEN, RELATION_HEADER
+from app.services.sql_ast import quote_table
+
+logger = logging.getLogger(__name__)
+
+_COUNT_QUESTION = re.compile(r"\b(how many|count|number of)\b", re.IGNORECASE)
+
+
+class FakeLLMError(Exception):
+    """Injected failure of the fake backend."""
+    pass
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Answers without a model or network, so the server can be load-tested.
+    
+    SQL comes from the canned responses when the question has one, otherwise
+    from simple rules over the first table of the schema context: count
+    questions get a COUNT(*), anything else the table's first rows.
+    Summaries are the local column statistics, stretched or cut to the
+    configured token count. Every call waits for a time to first token drawn
+    from the configured latency distribution, plus a per-token delay, and
+    fails with the configured probability.
+    """
+    
+    def __init__(
+        self,
+        latency_ms: float = settings.fake_llm_latency_ms,
+        distribution: str = settings.fake_llm_latency_distribution,
+        sigma: float = settings.fake_llm_latency_sigma,
+        token_ms: float = settings.fake_llm_token_ms,
+        summary_tokens: int = settings.fake_llm_summary_tokens,
+        error_rate: float = settings.fake_llm_error_rate,
+        responses: Optional[Dict[str, str]] = None,
+        seed: Optional[int] = settings.fake_llm_seed,
+        model: str = "fake",
+        explain: bool = settings.sql_explanation_mode != "local"
+    ):
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown fake LLM latency distribution: {distribution}")
+        self.model = model
+        self.explain = explain
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.token_ms = token_ms
+        self.summary_tokens = summary_tokens
+        self.error_rate = error_rate
+        canned = settings.fake_llm_responses if responses is None else responses
+        self.responses = {normalize_question(question): sql for question, sql in canned.items()}
+        self._random = random.Random(seed)
+    
+    async def generate_sql(self, user_query: str, schema_context: str) -> Dict:
+        """Canned or rule-based SQL for the question."""
+        sql = self.responses.get(normalize_question(user_query))
+        if sql is not None:
+            explanation = "Canned response"
+        else:
+            match = RELATION_HEADER.search(schema_context)
+            if match is None:
+                raise ValueError("Fake LLM backend: no table in the schema context")
+            table = quote_table(match.group(1))
+            if _COUNT_QUESTION.search(user_query):
+                sql = f"SELECT COUNT(*) AS count FROM {table} LIMIT 1"
+                explanation = f"Counts the rows of {match.group(1)}"
+            else:
+                sql = f"SELECT * FROM {table} LIMIT 10"
+                explanation = f"Returns the first rows of {match.group(1)}"
+        
+        result = {"sql": sql, "params": []}
+        if self.explain:
+            result["explanation"] = explanation
+        else:
+            explanation = ""
+        await self._respond(len(sql + explanation) // CHARS_PER_TOKEN + 1)
+        return result
+    
+    async def summarize_results(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None
+    ) -> str:
+        """Local statistical summary after a simulated generation delay."""
+        tokens = self._summary_tokens(rows, profile)
+        await self._respond(len(tokens))
+        return " ".join(tokens)
+    
+    async def stream_summary(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """Local statistical summary, one token at a time."""
+        tokens = self._summary_tokens(rows, profile)
+        await self._respond(0)
+        for position, token in enumerate(tokens):
+            if self.token_ms > 0:
+                await asyncio.sleep(self.token_ms / 1000)
+            yield token if position == 0 else " " + token
+    
+    def _summary_tokens(self, rows: List[Dict], profile: Optional[Dict]) -> List[str]:
+        """Words of the local summary, repeated or cut to summary_tokens."""
+        if profile is None:
+            profile = profile_rows(rows)
+        words = render_summary(profile, rows).split()
+        if self.summary_tokens <= 0:
+            return words
+        repeats = math.ceil(self.summary_tokens / len(words))
+        return (words * repeats)[:self.summary_tokens]
+    
+    def _first_token_delay(self) -> float:
+        """Seconds to the first token, drawn from the latency distribution."""
+        median = self.latency_ms / 1000
+        if self.distribution == "fixed" or median <= 0:
+            return max(median, 0.0)
+        if self.distribution == "uniform":
+            return self._random.uniform(median * max(0.0, 1 - self.sigma), median * (1 + self.sigma))
+        return self._random.lognormvariate(math.log(median), self.sigma)
+    
+    async def _respond(self, output_tokens: int):
+        """Wait as long as a model producing output_tokens would, or fail."""
+        delay = self._first_token_delay() + output_tokens * self.token_ms / 1000
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            logger.debug("Fake LLM backend: injecting failure")
+            raise FakeLLMError("Fake LLM backend: injected failure")
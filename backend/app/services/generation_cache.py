@@ -0,0 +1,241 @@
+"""Exact-match cache of generated SQL, in memory and optionally on disk."""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS generations (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+"""
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question for cache keys."""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", question.strip().lower()))
+
+
+class GenerationCache:
+    """
+    Cache of LLM SQL generations keyed by question, schema and model.
+    
+    The first tier is an in-process LRU with a TTL. The optional second tier
+    is a sqlite file that survives restarts; disk hits are promoted to
+    memory. Keys include the schema's content hash, so any DDL change makes
+    earlier entries unreachable (they expire through the TTL).
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = settings.generation_cache_size,
+        ttl: int = settings.generation_cache_ttl,
+        path: str = settings.generation_cache_path
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._memory: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether caching is configured at all."""
+        return self.max_entries > 0 and self.ttl > 0
+    
+    @staticmethod
+    def key(
+        question: str,
+        schema_hash: str,
+        model: str,
+        database: str = "",
+        kind: str = "exact"
+    ) -> str:
+        """
+        Cache key of a question against one schema, model and database.
+        
+        Args:
+            question: The question, or its literal-free template
+            schema_hash: SchemaSnapshot.content_hash
+            model: LLM model name
+            database: Database name
+            kind: "exact" for generations, "template" for template entries
+        """
+        material = "\0".join(
+            (kind, normalize_question(question), schema_hash, model, database)
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached generation.
+        
+        Returns:
+            The cached generation (sql, params, explanation), or None
+        """
+        if not self.enabled:
+            return None
+        
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if time.time() - created_at < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._memory[key]
+        
+        if self.path:
+            try:
+                found = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                logger.warning(f"Generation cache read failed: {str(e)}")
+                found = None
+            if found is not None:
+                value, created_at = found
+                self._remember(key, value, created_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+        
+        self.misses += 1
+        return None
+    
+    async def put(self, key: str, value: Dict[str, Any]):
+        """Store a generation in both tiers."""
+        if not self.enabled:
+            return
+        created_at = time.time()
+        self._remember(key, value, created_at)
+        self.stores += 1
+        if self.path:
+            try:
+                await asyncio.to_thread(self._disk_put, key, value, created_at)
+            except Exception as e:
+                logger.warning(f"Generation cache write failed: {str(e)}")
+    
+    async def evict(self, *keys: Optional[str]):
+        """Remove the given generations from both tiers (None keys are skipped)."""
+        keys = tuple(key for key in keys if key is not None)
+        if not self.enabled or not keys:
+            return
+        for key in keys:
+            self._memory.pop(key, None)
+        if self.path:
+            try:
+                await asyncio.to_thread(self._disk_evict, keys)
+            except Exception as e:
+                logger.warning(f"Generation cache eviction failed: {str(e)}")
+    
+    async def purge(self) -> int:
+        """
+        Remove every cached generation from both tiers.
+        
+        Returns:
+            Number of entries removed
+        """
+        removed = len(self._memory)
+        self._memory.clear()
+        if self.path:
+            removed = max(removed, await asyncio.to_thread(self._disk_purge))
+        logger.info(f"Generation cache purged ({removed} entries)")
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "persistent": bool(self.path)
+        }
+    
+    def close(self):
+        """Close the on-disk tier."""
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+    
+    def _remember(self, key: str, value: Dict[str, Any], created_at: float):
+        """Insert into the memory tier, evicting the least recently used entries."""
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Open the sqlite file on first use (caller holds the lock)."""
+        if self._disk is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._disk = sqlite3.connect(self.path, check_same_thread=False)
+            self._disk.execute(_CREATE_TABLE)
+            self._disk.execute(
+                "DELETE FROM generations WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._disk.commit()
+        return self._disk
+    
+    def _disk_get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._disk_lock:
+            row = self._connection().execute(
+                "SELECT value, created_at FROM generations WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+    
+    def _disk_put(self, key: str, value: Dict[str, Any], created_at: float):
+        with self._disk_lock:
+            disk = self._connection()
+            disk.execute(
+                "INSERT OR REPLACE INTO generations (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), created_at)
+            )
+            disk.commit()
+    
+    def _disk_evict(self, keys: Tuple[str, ...]):
+        with self._disk_lock:
+            disk = self._connection()
+            disk.executemany("DELETE FROM generations WHERE key = ?", [(key,) for key in keys])
+            disk.commit()
+    
+    def _disk_purge(self) -> int:
+        with self._disk_lock:
+            disk = self._connection()
+            removed = disk.execute("DELETE FROM generations").rowcount
+            disk.commit()
+        return removed
+
+
+# Global generation cache instance
+generation_cache = GenerationCache()
@@ -0,0 +1,159 @@
+"""Foreign-key join graph with shortest join paths between tables."""
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.schema_model import Table, group_foreign_keys
+
+
+class JoinEdge(NamedTuple):
+    """One foreign key constraint, usable as a join condition in either direction."""
+    table: str
+    columns: Tuple[str, ...]
+    references_table: str
+    references_columns: Tuple[str, ...]
+    
+    def condition(self) -> str:
+        """Join condition as SQL, with every column of a composite key."""
+        return " AND ".join(
+            f"{self.table}.{column} = {self.references_table}.{references_column}"
+            for column, references_column in zip(self.columns, self.references_columns)
+        )
+
+
+# The foreign key constraints between one pair of tables; more than one when
+# a table references the same table several times (billing and shipping address)
+JoinHop = Tuple[JoinEdge, ...]
+
+
+def describe_hop(hop: JoinHop) -> str:
+    """
+    Join hint for one hop.
+    
+    A hop with several foreign keys has no single right join condition, so
+    the alternatives are listed for the question to decide between.
+    """
+    if len(hop) == 1:
+        return hop[0].condition()
+    first = hop[0]
+    alternatives = "; ".join(edge.condition() for edge in hop)
+    return (
+        f"{first.table} and {first.references_table} are linked by {len(hop)} foreign keys, "
+        f"join on the one the question means: {alternatives}"
+    )
+
+
+class JoinGraph:
+    """
+    Undirected adjacency graph of the foreign keys between tables.
+    
+    Parallel foreign keys between the same two tables form one hop, so a
+    path never silently picks one of them. Breadth-first search trees are
+    memoized per source table, so each shortest-path lookup after the first
+    one from a table is a walk up a parent map.
+    """
+    
+    def __init__(self, tables: Dict[str, Table], max_depth: int = 3):
+        self.max_depth = max_depth
+        self._adjacency: Dict[str, List[Tuple[str, JoinHop]]] = {name: [] for name in tables}
+        self._bfs_cache: Dict[str, Dict[str, Optional[Tuple[str, JoinHop]]]] = {}
+        
+        hops: Dict[Tuple[str, str], List[JoinEdge]] = {}
+        for table_name, table in tables.items():
+            for constraint in group_foreign_keys(table.foreign_keys):
+                target = constraint[0].references_table
+                # Self-references never help to connect two tables
+                if target == table_name or target not in self._adjacency:
+                    continue
+                edge = JoinEdge(
+                    table_name,
+                    tuple(fk.column for fk in constraint),
+                    target,
+                    tuple(fk.references_column for fk in constraint)
+                )
+                hops.setdefault(tuple(sorted((table_name, target))), []).append(edge)
+        for (first, second), edges in hops.items():
+            hop = tuple(edges)
+            self._adjacency[first].append((second, hop))
+            self._adjacency[second].append((first, hop))
+    
+    def _bfs(self, source: str) -> Dict[str, Optional[Tuple[str, JoinHop]]]:
+        """Parent map of the BFS tree from source, limited to max_depth hops."""
+        parents = self._bfs_cache.get(source)
+        if parents is not None:
+            return parents
+        
+        parents = {source: None}
+        frontier = deque([(source, 0)])
+        while frontier:
+            node, depth = frontier.popleft()
+            if depth >= self.max_depth:
+                continue
+            for neighbour, hop in self._adjacency.get(node, ()):
+                if neighbour not in parents:
+                    parents[neighbour] = (node, hop)
+                    frontier.append((neighbour, depth + 1))
+        
+        self._bfs_cache[source] = parents
+        return parents
+    
+    def shortest_path(self, source: str, target: str) -> Optional[List[JoinHop]]:
+        """
+        Shortest chain of foreign keys joining source to target.
+        
+        Returns:
+            Hops from target back towards source, or None if the tables are
+            not connected within max_depth hops
+        """
+        parents = self._bfs(source)
+        if target not in parents:
+            return None
+        path = []
+        node = target
+        while parents[node] is not None:
+            node, hop = parents[node]
+            path.append(hop)
+        return path
+    
+    def connect(self, tables: List[str]) -> Tuple[List[str], List[JoinHop]]:
+        """
+        Join the given tables with as few extra (bridge) tables as possible.
+        
+        Grows a tree from the first table, attaching each further table via
+        its shortest path to any table already in the tree. Tables that
+        cannot be reached are left unconnected.
+        
+        Returns:
+            (bridge tables to add, join hops), both in discovery order
+        """
+        if not tables:
+            return [], []
+        
+        tree_nodes = [tables[0]]
+        in_tree = {tables[0]}
+        bridges: List[str] = []
+        hops: List[JoinHop] = []
+        for table in tables[1:]:
+            if table in in_tree:
+                continue
+            parents = self._bfs(table)
+            best: Optional[List[JoinHop]] = None
+            for member in tree_nodes:
+                if member in parents:
+                    path = self.shortest_path(table, member)
+                    if best is None or len(path) < len(best):
+                        best = path
+            tree_nodes.append(table)
+            in_tree.add(table)
+            if best is None:
+                continue
+            
+            for hop in best:
+                for node in (hop[0].table, hop[0].references_table):
+                    if node not in in_tree:
+                        tree_nodes.append(node)
+                        in_tree.add(node)
+                        bridges.append(node)
+                if hop not in hops:
+                    hops.append(hop)
+        
+        return [b for b in bridges if b not in tables], hops
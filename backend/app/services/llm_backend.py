@@ -0,0 +1,67 @@
+"""Interface of the LLM backends behind LLMService."""
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+
+
+class LLMTimeoutError(Exception):
+    """An LLM call did not finish before the request deadline."""
+    pass
+
+
+class LLMBackend(ABC):
+    """
+    One way of answering SQL generation and summary requests.
+    
+    LLMService builds the schema context and hands it to the configured
+    backend; backends only talk to the model (or pretend to). Implementations
+    must override the three abstract methods, so an incomplete backend fails
+    when it is created at startup rather than mid-request.
+    """
+    
+    # Model name, part of generation cache keys
+    model: str = ""
+    
+    @abstractmethod
+    async def generate_sql(self, user_query: str, schema_context: str) -> Dict:
+        """
+        Generate a SQL query for a question.
+        
+        Args:
+            user_query: User's natural language question
+            schema_context: Formatted schema context string
+        
+        Returns:
+            Dict with keys: sql, params, and explanation unless
+            settings.sql_explanation_mode is "local"
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    async def summarize_results(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None
+    ) -> str:
+        """Conversational summary of query results."""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def stream_summary(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """Conversational summary of query results, as text fragments."""
+        raise NotImplementedError
+    
+    async def warm_up(self):
+        """Prepare connections before the first call (optional)."""
+        pass
+    
+    async def close(self):
+        """Release connections (optional)."""
+        pass
@@ -0,0 +1,116 @@
+"""Model cascade: easy questions to a fast model, the rest to the strong one."""
+import logging
+import re
+from typing import Any, Dict
+
+from app.config import settings
+from app.services.llm_hedging import LatencyWindow
+from app.services.schema_loader import RELATION_HEADER
+
+logger = logging.getLogger(__name__)
+
+TIER_FAST = "fast"
+TIER_STRONG = "strong"
+
+# Question features and what they add to the complexity score. Grouping
+# needs a GROUP BY; comparisons, rankings and trends need window functions,
+# subqueries or self-joins; negations need anti-joins
+_FEATURES = (
+    (re.compile(r"\b(per|each|by|group(ed)?|breakdown|distribution)\b", re.IGNORECASE), 1.0),
+    (re.compile(
+        r"\b(compare[ds]?|comparison|versus|vs|rank(ed|ing)?|ratio|percent(age)?|share|growth|"
+        r"trend|over time|cumulative|running|median|percentile|previous|year over year|month over month)\b",
+        re.IGNORECASE
+    ), 2.0),
+    (re.compile(r"\b(above|below|more than|less than) (the )?average\b", re.IGNORECASE), 1.5),
+    (re.compile(r"\b(without|never|not|no|except|neither|nor|both|either)\b", re.IGNORECASE), 1.5),
+)
+_CONJUNCTION = re.compile(r"\b(and|or|but|while|whose|which|that)\b", re.IGNORECASE)
+_LONG_QUESTION_WORDS = 20
+
+
+def question_complexity(question: str, schema_context: str) -> float:
+    """
+    Score how hard a question is to answer in SQL.
+    
+    0 is a plain lookup on one table. Each table beyond the first in the
+    pruned schema context adds a point (likely a join), and so do question
+    features that call for grouping, window functions, subqueries or
+    anti-joins, extra conditions and long questions.
+    
+    Args:
+        question: User's natural language question
+        schema_context: Schema context selected for the question
+    
+    Returns:
+        Complexity score
+    """
+    tables = len(RELATION_HEADER.findall(schema_context))
+    score = float(max(0, tables - 1))
+    for pattern, weight in _FEATURES:
+        if pattern.search(question):
+            score += weight
+    score += 0.5 * len(_CONJUNCTION.findall(question))
+    if len(question.split()) > _LONG_QUESTION_WORDS:
+        score += 1.0
+    return score
+
+
+class ModelCascade:
+    """
+    Routes SQL generation between a fast, cheap model and the strong model.
+    
+    Questions scoring at most max_complexity (see question_complexity) go
+    to the fast model. The caller escalates to the strong model when SQL
+    from the fast model fails validation (after repair) or execution, and
+    reports it with record_escalation. Latencies are kept per tier.
+    """
+    
+    def __init__(self, max_complexity: float = settings.llm_fast_max_complexity):
+        self.max_complexity = max_complexity
+        self.routed: Dict[str, int] = {TIER_FAST: 0, TIER_STRONG: 0}
+        self.escalations: Dict[str, int] = {"validation": 0, "execution": 0}
+        self.latencies: Dict[str, LatencyWindow] = {TIER_FAST: LatencyWindow(), TIER_STRONG: LatencyWindow()}
+    
+    def route(self, question: str, schema_context: str) -> str:
+        """The tier that should answer the question: TIER_FAST or TIER_STRONG."""
+        score = question_complexity(question, schema_context)
+        tier = TIER_FAST if score <= self.max_complexity else TIER_STRONG
+        self.routed[tier] += 1
+        logger.debug(f"Question complexity {score:.1f}: {tier} model")
+        return tier
+    
+    def record_latency(self, tier: str, seconds: float):
+        """Record the latency of a successful SQL generation."""
+        self.latencies[tier].add(seconds)
+    
+    def record_escalation(self, stage: str):
+        """
+        Count a request escalated to the strong model.
+        
+        Args:
+            stage: "validation" or "execution", where the fast model's SQL
+                failed
+        """
+        self.escalations[stage] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Routing counts, escalation rate and latency percentiles per tier."""
+        escalated = sum(self.escalations.values())
+        tiers = {}
+        for tier, window in self.latencies.items():
+            p50 = window.percentile(0.5)
+            p99 = window.percentile(0.99)
+            tiers[tier] = {
+                "routed": self.routed[tier],
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p99_ms": round(p99 * 1000, 1) if p99 is not None else None
+            }
+        return {
+            "max_complexity": self.max_complexity,
+            "tiers": tiers,
+            "escalations": dict(self.escalations),
+            "escalation_rate": (
+                round(escalated / self.routed[TIER_FAST], 3) if self.routed[TIER_FAST] else None
+            )
+        }
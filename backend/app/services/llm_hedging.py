@@ -0,0 +1,161 @@
+"""Hedged LLM calls: a duplicate request when the first one is slow."""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from app.config import settings
+from app.services.llm_backend import LLMTimeoutError
+from app.services.llm_scheduler import LLMOverloadedError
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept for the adaptive threshold
+_WINDOW = 500
+
+
+class LatencyWindow:
+    """Sliding window of recent call latencies."""
+    
+    def __init__(self, size: int = _WINDOW):
+        self._samples: "deque[float]" = deque(maxlen=size)
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+    
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+    
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None if it is empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+        return ordered[index]
+
+
+class Hedger:
+    """
+    Runs a call and, if it is slower than usual, a duplicate of it.
+    
+    The hedge fires once the first attempt has taken longer than the given
+    percentile of recent latencies; whichever attempt finishes first wins
+    and the other is cancelled. Hedges are capped at a fraction of all
+    calls, so a provider that is slow across the board doesn't double the
+    load on it. The whole call is bounded by the caller's deadline.
+    """
+    
+    def __init__(
+        self,
+        percentile: float = settings.llm_hedge_percentile,
+        budget: float = settings.llm_hedge_budget,
+        min_samples: int = settings.llm_hedge_min_samples
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.latencies = LatencyWindow()
+        self.calls = 0
+        self.fired = 0
+        self.won = 0
+        self.timeouts = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.percentile < 1 and self.budget > 0
+    
+    def threshold(self) -> Optional[float]:
+        """Seconds after which a hedge fires, or None while hedging is off or warming up."""
+        if not self.enabled or len(self.latencies) < self.min_samples:
+            return None
+        return self.latencies.percentile(self.percentile)
+    
+    async def run(
+        self,
+        attempt: Callable[[bool], Awaitable[Any]],
+        deadline: Optional[float] = None
+    ) -> Any:
+        """
+        Run attempt(False), hedged with attempt(True) if it is slow.
+        
+        Args:
+            attempt: Starts one attempt; the argument tells whether it is
+                the hedge. A hedge that can't be admitted right away should
+                raise LLMOverloadedError, and is then dropped.
+            deadline: time.monotonic() by which the call must finish
+        
+        Raises:
+            LLMTimeoutError: If no attempt finished before the deadline
+        """
+        self.calls += 1
+        started = time.monotonic()
+        threshold = self.threshold()
+        primary = asyncio.ensure_future(attempt(False))
+        pending: Set["asyncio.Future"] = {primary}
+        hedge: Optional["asyncio.Future"] = None
+        hedge_started = started
+        failure: Optional[BaseException] = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if hedge is None and threshold is not None:
+                    until_hedge = max(0.0, started + threshold - time.monotonic())
+                    if timeout is None or until_hedge < timeout:
+                        timeout = until_hedge
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    if task.exception() is None:
+                        won_by_hedge = task is hedge
+                        self.won += won_by_hedge
+                        self.latencies.add(
+                            time.monotonic() - (hedge_started if won_by_hedge else started)
+                        )
+                        return task.result()
+                    if task is hedge and isinstance(task.exception(), LLMOverloadedError):
+                        logger.debug("Hedge not admitted by the LLM scheduler")
+                    else:
+                        failure = task.exception()
+                
+                # A failed attempt is not retried, but the other one may
+                # still succeed
+                if done:
+                    if not pending:
+                        raise failure
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.timeouts += 1
+                    raise LLMTimeoutError("LLM call did not finish before the request deadline")
+                if hedge is None and threshold is not None:
+                    threshold = None
+                    if self.fired < self.budget * self.calls:
+                        self.fired += 1
+                        hedge_started = time.monotonic()
+                        hedge = asyncio.ensure_future(attempt(True))
+                        pending.add(hedge)
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def stats(self) -> Dict[str, Any]:
+        """How often hedges fire and win, and the current threshold."""
+        threshold = self.threshold()
+        p50 = self.latencies.percentile(0.5)
+        p99 = self.latencies.percentile(0.99)
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedges_fired": self.fired,
+            "hedges_won": self.won,
+            "hedge_rate": round(self.fired / self.calls, 3) if self.calls else None,
+            "hedge_win_rate": round(self.won / self.fired, 3) if self.fired else None,
+            "timeouts": self.timeouts,
+            "threshold_ms": round(threshold * 1000, 1) if threshold is not None else None,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None
+        }
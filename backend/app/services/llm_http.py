@@ -0,0 +1,125 @@
+"""Shared HTTP connection pool for the LLM provider."""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMHttpPool:
+    """
+    One tuned httpx client for all calls to the LLM provider.
+    
+    Connections are kept alive between calls up to explicit pool limits,
+    optionally over HTTP/2 (which multiplexes calls over few connections),
+    and can be opened at startup so that the first requests after a deploy
+    don't pay for DNS, TCP and TLS setup.
+    """
+    
+    def __init__(
+        self,
+        max_connections: int = settings.llm_http_max_connections,
+        max_keepalive: int = settings.llm_http_max_keepalive,
+        keepalive_expiry: float = settings.llm_http_keepalive_expiry,
+        http2: bool = settings.llm_http2
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("LLM_HTTP2 needs the h2 package (pip install httpx[http2]); using HTTP/1.1")
+                self.http2 = False
+        self._client: Optional[httpx.AsyncClient] = None
+        self.warmed = 0
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client, created on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, http2=self.http2)
+        return self._client
+    
+    async def warm_up(self, url: str, connections: int):
+        """
+        Open connections to the provider ahead of the first call.
+        
+        Sends concurrent HEAD requests, one per connection; the responses
+        don't matter, the connections stay in the keep-alive pool. Failures
+        are logged and otherwise ignored.
+        
+        Args:
+            url: Provider base URL
+            connections: Connections to open (HTTP/2 needs only one)
+        """
+        if connections <= 0:
+            return
+        if self.http2:
+            connections = 1
+        connections = min(connections, self.limits.max_keepalive_connections or connections)
+        
+        async def open_connection() -> bool:
+            try:
+                await self.client.head(url, timeout=10)
+                return True
+            except httpx.HTTPError as e:
+                logger.warning(f"LLM connection warm-up failed: {str(e)}")
+                return False
+        
+        results = await asyncio.gather(*(open_connection() for _ in range(connections)))
+        self.warmed += sum(results)
+        logger.info(f"Warmed {sum(results)} LLM connection(s) to {url}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Connection pool utilization.
+        
+        Read from the transport's connection pool; counts are None when the
+        client hasn't been created yet.
+        """
+        stats: Dict[str, Any] = {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "warmed": self.warmed,
+            "connections": None,
+            "active": None,
+            "idle": None,
+            "requests": None,
+            "utilization": None
+        }
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        if pool is None:
+            return stats
+        
+        connections = [connection for connection in pool.connections if not connection.is_closed()]
+        idle = sum(1 for connection in connections if connection.is_idle())
+        active = len(connections) - idle
+        stats.update(
+            connections=len(connections),
+            active=active,
+            idle=idle,
+            # In-flight and queued requests
+            requests=len(getattr(pool, "_requests", [])),
+            utilization=round(active / self.limits.max_connections, 3) if self.limits.max_connections else None
+        )
+        return stats
+    
+    async def close(self):
+        """Close every pooled connection."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global LLM HTTP pool
+llm_http_pool = LLMHttpPool()
@@ -0,0 +1,276 @@
+"""Rate limiting and prioritization of outbound LLM calls."""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_SQL = 0
+PRIORITY_SUMMARY = 1
+
+
+class LLMOverloadedError(Exception):
+    """An LLM call could not be scheduled before its deadline."""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Per-minute budget that refills continuously.
+    
+    Takes may overdraw the bucket (a call larger than the whole budget must
+    still be able to run); the debt is paid back by the refill.
+    """
+    
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self._updated = time.monotonic()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+    
+    def refill(self, now: float):
+        """Add what accrued since the last refill, up to capacity."""
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def time_for(self, amount: float, ahead: float = 0) -> float:
+        """
+        Seconds until a take of amount can start.
+        
+        Args:
+            amount: Size of the take; amounts above capacity wait for a
+                full bucket
+            ahead: Total of the takes that must happen first
+        """
+        if not self.enabled:
+            return 0.0
+        missing = ahead + min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.rate)
+    
+    def take(self, amount: float):
+        """Spend amount from the bucket."""
+        if self.enabled:
+            self.available -= amount
+
+
+class _Waiter:
+    """A call waiting for its turn."""
+    
+    __slots__ = ("priority", "sequence", "tokens", "future")
+    
+    def __init__(self, priority: int, sequence: int, tokens: int, future: "asyncio.Future"):
+        self.priority = priority
+        self.sequence = sequence
+        self.tokens = tokens
+        self.future = future
+    
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls within the provider's request and token rate limits.
+    
+    Calls wait in a priority queue (SQL generation ahead of summaries,
+    first come first served within a priority) until both token buckets
+    can cover them and a concurrency slot is free. The head of the queue
+    blocks everything behind it, so a large call is not starved by smaller
+    ones. A call whose estimated wait exceeds its deadline is rejected
+    immediately with LLMOverloadedError instead of queueing, and so is a
+    call still waiting when its deadline passes. When the provider answers
+    429 anyway (other clients share the quota), pause holds every call
+    back for the time the provider asked for.
+    """
+    
+    def __init__(
+        self,
+        requests_per_minute: int = settings.llm_requests_per_minute,
+        tokens_per_minute: int = settings.llm_tokens_per_minute,
+        max_concurrency: int = settings.llm_max_concurrency,
+        queue_timeout: float = settings.llm_queue_timeout
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._queue: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # time.monotonic() until which no call is admitted
+        self._paused_until = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+    
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: int,
+        tokens: int,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """
+        Hold an admission for one LLM call.
+        
+        Args:
+            priority: PRIORITY_SQL or PRIORITY_SUMMARY
+            tokens: Estimated prompt plus completion tokens of the call
+            deadline: time.monotonic() by which the call must have started;
+                capped at queue_timeout from now
+        
+        Raises:
+            LLMOverloadedError: If the call can't start before its deadline
+        """
+        now = time.monotonic()
+        budget = self.queue_timeout if self.queue_timeout > 0 else float("inf")
+        if deadline is not None:
+            budget = min(budget, deadline - now)
+        
+        estimate = self._estimated_wait(priority, tokens, now)
+        if estimate > budget:
+            self.rejected += 1
+            raise LLMOverloadedError(
+                f"LLM rate limit reached: estimated wait {estimate:.1f}s exceeds the deadline",
+                retry_after=estimate
+            )
+        
+        waiter = _Waiter(priority, next(self._sequence), tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        self._dispatch()
+        try:
+            timeout = max(budget, 0.0) if budget != float("inf") else None
+            await asyncio.wait_for(waiter.future, timeout=timeout)
+        except asyncio.TimeoutError:
+            if not self._admitted(waiter):
+                self.timed_out += 1
+                raise LLMOverloadedError(
+                    "LLM rate limit reached: call not admitted before the deadline",
+                    retry_after=self._estimated_wait(priority, tokens, time.monotonic())
+                )
+        except asyncio.CancelledError:
+            if self._admitted(waiter):
+                self._release()
+            raise
+        
+        self.admitted += 1
+        self.total_wait += time.monotonic() - now
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def pause(self, seconds: float):
+        """
+        Admit no calls for the given time, after the provider rate limited one.
+        
+        The buckets are emptied too, so admissions resume gradually once
+        the pause is over instead of all at once.
+        """
+        self.rate_limited += 1
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        for bucket in (self.requests, self.tokens):
+            bucket.refill(now)
+            bucket.available = min(bucket.available, 0)
+        logger.warning(f"LLM provider rate limit hit, pausing calls for {seconds:.1f}s")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue length, budget left and admission counters."""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return {
+            "queued": sum(1 for waiter in self._queue if not waiter.future.done()),
+            "in_flight": self._in_flight,
+            "requests_available": round(self.requests.available) if self.requests.enabled else None,
+            "tokens_available": round(self.tokens.available) if self.tokens.enabled else None,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "rate_limited": self.rate_limited,
+            "paused_for_s": round(max(0.0, self._paused_until - now), 1),
+            "mean_wait_ms": round(self.total_wait / self.admitted * 1000, 1) if self.admitted else None
+        }
+    
+    @staticmethod
+    def _admitted(waiter: _Waiter) -> bool:
+        """Whether the dispatcher granted the waiter a slot."""
+        return waiter.future.done() and not waiter.future.cancelled()
+    
+    def _estimated_wait(self, priority: int, tokens: int, now: float) -> float:
+        """Seconds until the rate limits cover this call and the calls ahead of it."""
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        ahead = [
+            waiter for waiter in self._queue
+            if waiter.priority <= priority and not waiter.future.done()
+        ]
+        return max(
+            self._paused_until - now,
+            self.requests.time_for(1, ahead=len(ahead)),
+            self.tokens.time_for(tokens, ahead=sum(waiter.tokens for waiter in ahead))
+        )
+    
+    def _dispatch(self):
+        """Admit queued calls, in priority order, while the limits allow."""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        while self._queue:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(self._queue)
+                continue
+            if self.max_concurrency > 0 and self._in_flight >= self.max_concurrency:
+                return
+            wait = max(
+                self._paused_until - now,
+                self.requests.time_for(1),
+                self.tokens.time_for(waiter.tokens)
+            )
+            if wait > 0:
+                self._wake_in(wait)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self._in_flight += 1
+            waiter.future.set_result(None)
+    
+    def _wake_in(self, delay: float):
+        """Run the dispatcher again once the buckets have refilled."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+    
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+    
+    def _release(self):
+        """Free a concurrency slot and admit whoever is next."""
+        self._in_flight -= 1
+        self._dispatch()
+
+
+# Global LLM call scheduler
+llm_scheduler = LLMScheduler()
@@ -1,45 +1,38 @@
 """LLM service for SQL generation and result summarization."""
+import asyncio
 import json
-from typing import Dict, List, Optional
-from openai import AsyncOpenAI
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional
+from openai import AsyncOpenAI, RateLimitError
 
 from app.config import settings
-from app.services.schema_loader import schema_loader
+from app.services.fake_llm_backend import FakeLLMBackend
+from app.services.llm_backend import LLMBackend, LLMTimeoutError
+from app.services.llm_cascade import TIER_FAST, TIER_STRONG, ModelCascade
+from app.services.llm_hedging import Hedger
+from app.services.llm_http import llm_http_pool
+from app.services.llm_scheduler import PRIORITY_SQL, PRIORITY_SUMMARY, LLMOverloadedError, llm_scheduler
+from app.services.result_summarizer import compact_results, profile_rows
+from app.services.schema_loader import CHARS_PER_TOKEN, schema_loader
 
+logger = logging.getLogger(__name__)
 
-class LLMService:
-    """OpenAI client wrapper for SQL generation and summarization."""
-    
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-        self.model = settings.openai_model
-    
-    async def generate_sql(
-        self,
-        user_query: str,
-        schema_context: Optional[str] = None
-    ) -> Dict[str, str]:
-        """
-        Generate SQL query from natural language question.
-        
-        Args:
-            user_query: User's natural language question
-            schema_context: Formatted schema context string
-            
-        Returns:
-            Dict with keys: sql, params (JSON string), explanation
-        """
-        if schema_context is None:
-            schema_context = schema_loader.get_schema_context()
-        
-        system_prompt = """You are a SQL expert. Given a database schema and a user's question, 
+
+_SQL_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """You are a SQL expert. Given a database schema and a user's question, 
 generate a safe, valid PostgreSQL SELECT query.
 
 Rules:
 1. Only generate SELECT queries (or WITH ... SELECT)
 2. Use parameterized queries for any user input (use $1, $2, etc. for parameters)
 3. Always include a LIMIT clause (max 100 rows)
-4. Return your response as JSON with these keys:
+4. Join tables only on the foreign keys given in the schema (see "Join hints" when present)
+5. Tables marked with a large row estimate (e.g. "~40M rows") must be filtered or aggregated, never scanned whole
+6. Prefer filtering and sorting on indexed columns (marked PK, unique or indexed, or leading an entry under "Indexes"); a partial index only helps when the query repeats its WHERE condition
+7. When "Value hints" are given, use those exact values (case included) for the matching columns
+8. Return your response as JSON with these keys:
    - "sql": The SQL query string
    - "params": JSON array of parameter values (empty array if no parameters)
    - "explanation": Brief explanation of what the query does
@@ -50,33 +43,107 @@ Example response:
   "params": [18],
   "explanation": "Finds users older than 18, returning name and email"
 }"""
+}
 
-        user_prompt = f"""Database Schema:
-{schema_context}
+# The same without the explanation, which is then rendered from the SQL
+# (sql_explanation_mode "local"); the model writes fewer output tokens
+_SQL_ONLY_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": _SQL_SYSTEM_MESSAGE["content"].replace(
+        """   - "params": JSON array of parameter values (empty array if no parameters)
+   - "explanation": Brief explanation of what the query does""",
+        """   - "params": JSON array of parameter values (empty array if no parameters)
+   Do not add an explanation."""
+    ).replace(
+        """  "params": [18],
+  "explanation": "Finds users older than 18, returning name and email"
+}""",
+        """  "params": [18]
+}"""
+    )
+}
 
-User Question: {user_query}
+_SQL_USER_PROMPT_SUFFIX = (
+    "Generate a SQL query to answer this question. "
+    "Remember to use parameterized queries and include a LIMIT clause."
+)
+
+# Token estimates for the scheduler's rate limits
+_SQL_PROMPT_TOKENS = (len(_SQL_SYSTEM_MESSAGE["content"]) + len(_SQL_USER_PROMPT_SUFFIX)) // CHARS_PER_TOKEN
+_SQL_COMPLETION_TOKENS = 300
+_SUMMARY_PROMPT_TOKENS = 100
+_SUMMARY_COMPLETION_TOKENS = 500  # max_tokens of summary calls
 
-Generate a SQL query to answer this question. Remember to use parameterized queries and include a LIMIT clause."""
+# Wait after a 429 without a usable retry-after header
+_DEFAULT_RETRY_AFTER = 1.0
 
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI client wrapper for SQL generation and summarization."""
+    
+    def __init__(self, model: Optional[str] = None, explain: Optional[bool] = None):
+        if not settings.openai_api_key:
+            raise ValueError("OPENAI_API_KEY is required with the openai LLM backend")
+        # Calls share one tuned connection pool (see LLMHttpPool). The client
+        # doesn't retry on its own: retries would bypass the LLM scheduler
+        # and the request deadline, and a 429 pauses the scheduler instead
+        self.client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=llm_http_pool.client,
+            max_retries=0
+        )
+        self.model = model or settings.openai_model
+        # Without explanations, results have no "explanation" key and the
+        # caller renders one from the SQL
+        self.explain = settings.sql_explanation_mode != "local" if explain is None else explain
+        self._sql_system_message = _SQL_SYSTEM_MESSAGE if self.explain else _SQL_ONLY_SYSTEM_MESSAGE
+        
         # Only use response_format for models that support it (gpt-4-turbo-preview, gpt-4-1106-preview, etc.)
         # Regular gpt-4 and gpt-3.5-turbo don't support json_object response_format
         supports_json_format = any(model_name in self.model.lower() for model_name in [
             'gpt-4-turbo', 'gpt-4-1106', 'gpt-4-0125', 'gpt-3.5-turbo-1106', 'o1'
         ])
+        # Request arguments that are the same for every SQL generation call
+        self._sql_request_template = {"model": self.model, "temperature": 0.1}
+        if supports_json_format:
+            self._sql_request_template["response_format"] = {"type": "json_object"}
+    
+    async def warm_up(self):
+        """Open pooled connections to the API before the first call."""
+        await llm_http_pool.warm_up(str(self.client.base_url), settings.llm_http_warmup_connections)
+    
+    async def close(self):
+        """Close the pooled connections."""
+        await llm_http_pool.close()
+    
+    async def generate_sql(self, user_query: str, schema_context: str) -> Dict[str, str]:
+        """
+        Generate SQL query from natural language question.
         
+        Args:
+            user_query: User's natural language question
+            schema_context: Formatted schema context string
+        
+        Returns:
+            Dict with keys: sql, params (JSON string), explanation (unless
+            explanations are rendered locally)
+        """
+        user_prompt = f"""Database Schema:
+{schema_context}
+
+User Question: {user_query}
+
+{_SQL_USER_PROMPT_SUFFIX}"""
+
         create_kwargs = {
-            "model": self.model,
+            **self._sql_request_template,
             "messages": [
-                {"role": "system", "content": system_prompt},
+                self._sql_system_message,
                 {"role": "user", "content": user_prompt}
-            ],
-            "temperature": 0.1
+            ]
         }
         
-        if supports_json_format:
-            create_kwargs["response_format"] = {"type": "json_object"}
-        
-        response = await self.client.chat.completions.create(**create_kwargs)
+        response = await self._create(**create_kwargs)
         
         content = response.choices[0].message.content
         if not content:
@@ -102,7 +169,9 @@ Generate a SQL query to answer this question. Remember to use parameterized quer
             raise ValueError("LLM response missing 'sql' key")
         if "params" not in result:
             result["params"] = []
-        if "explanation" not in result:
+        if not self.explain:
+            result.pop("explanation", None)
+        elif "explanation" not in result:
             result["explanation"] = "Generated SQL query"
         
         return result
@@ -111,7 +180,8 @@ Generate a SQL query to answer this question. Remember to use parameterized quer
         self,
         user_query: str,
         rows: List[Dict],
-        sql: str
+        sql: str,
+        profile: Optional[Dict] = None
     ) -> str:
         """
         Generate conversational summary of query results.
@@ -120,12 +190,94 @@ Generate a SQL query to answer this question. Remember to use parameterized quer
             user_query: Original user question
             rows: Query result rows
             sql: SQL query that was executed
-            
+            profile: Column profile of the rows (see result_summarizer),
+                computed if not given
+        
         Returns:
             Conversational summary string
         """
-        # Limit rows for summarization to avoid token limits
-        rows_for_summary = rows[:20] if len(rows) > 20 else rows
+        response = await self._create(
+            model=self.model,
+            messages=self._summary_messages(user_query, rows, sql, profile),
+            temperature=0.3,
+            max_tokens=_SUMMARY_COMPLETION_TOKENS
+        )
+        
+        content = response.choices[0].message.content
+        if not content:
+            return f"Query returned {len(rows)} row(s)."
+        
+        return content
+    
+    async def stream_summary(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the conversational summary of query results as it is generated.
+        
+        Args:
+            user_query: Original user question
+            rows: Query result rows
+            sql: SQL query that was executed
+            profile: Column profile of the rows, computed if not given
+        
+        Yields:
+            Summary text fragments, in order
+        """
+        stream = await self._create(
+            model=self.model,
+            messages=self._summary_messages(user_query, rows, sql, profile),
+            temperature=0.3,
+            max_tokens=_SUMMARY_COMPLETION_TOKENS,
+            stream=True
+        )
+        
+        produced = False
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                produced = True
+                yield content
+        
+        if not produced:
+            yield f"Query returned {len(rows)} row(s)."
+    
+    async def _create(self, **kwargs):
+        """
+        Create a chat completion.
+        
+        Raises:
+            LLMOverloadedError: If the provider rate limited the call; the
+                LLM scheduler is paused for the time the provider asked for
+        """
+        try:
+            return await self.client.chat.completions.create(**kwargs)
+        except RateLimitError as e:
+            retry_after = _retry_after(e)
+            llm_scheduler.pause(retry_after)
+            raise LLMOverloadedError(f"LLM provider rate limit reached: {str(e)}", retry_after=retry_after)
+    
+    def _summary_messages(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Build the chat messages asking for a summary of query results.
+        
+        Large results are described by column statistics over every row
+        and a few sample rows, instead of the rows themselves.
+        """
+        if profile is None:
+            profile = profile_rows(rows)
         
         system_prompt = """You are a helpful assistant that explains database query results 
 in a clear, conversational way. Summarize the results naturally, highlighting key findings."""
@@ -135,26 +287,235 @@ in a clear, conversational way. Summarize the results naturally, highlighting ke
 Query executed: {sql}
 
 Results ({len(rows)} row{'s' if len(rows) != 1 else ''}):
-{json.dumps(rows_for_summary, indent=2)}
+{compact_results(profile, rows)}
 
-Provide a clear, conversational summary of these results. If there are more than 20 rows, 
-mention that only a sample is shown."""
+Provide a clear, conversational summary of these results. Base totals, ranges and trends on 
+the column statistics, which cover every row."""
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+
+def create_backend(name: str, model: Optional[str] = None) -> LLMBackend:
+    """
+    Build the LLM backend selected by name.
+    
+    Args:
+        name: "openai", or "fake" for the local backend used in load tests
+        model: Model to use instead of the backend's default
+    
+    Raises:
+        ValueError: If the name is unknown
+    """
+    if name == "openai":
+        return OpenAIBackend(model)
+    if name == "fake":
+        return FakeLLMBackend(model=model or "fake")
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+class LLMService:
+    """
+    SQL generation and summarization through the configured LLM backend.
+    
+    Every call is admitted by the LLM scheduler first, which keeps calls
+    within the provider's rate limits and serves SQL generation ahead of
+    summaries. Calls must finish by the caller's deadline, and slow SQL
+    generations are hedged (see Hedger).
+    
+    With a fast model configured, SQL generation is a cascade: easy
+    questions go to the fast backend, the rest to the strong one (see
+    ModelCascade). Summaries always use the strong backend.
+    """
+    
+    def __init__(self, backend: Optional[LLMBackend] = None, fast_backend: Optional[LLMBackend] = None):
+        self.backend = backend or create_backend(settings.llm_backend)
+        if fast_backend is None and settings.llm_fast_model:
+            fast_backend = create_backend(settings.llm_backend, settings.llm_fast_model)
+        self.fast_backend = fast_backend
+        self.hedger = Hedger()
+        # Latencies of the fast model are tracked separately
+        self.fast_hedger = Hedger()
+        self.cascade = ModelCascade()
+    
+    @property
+    def model(self) -> str:
+        """Model name of the backend (both tiers with a cascade), part of generation cache keys."""
+        if self.fast_backend is not None:
+            return f"{self.fast_backend.model}>{self.backend.model}"
+        return self.backend.model
+    
+    async def warm_up(self):
+        """Prepare the backends' connections; failures are logged, not raised."""
+        for backend in self._backends():
+            try:
+                await backend.warm_up()
+            except Exception as e:
+                logger.warning(f"LLM warm-up failed: {str(e)}")
+    
+    async def close(self):
+        """Release the backends' connections."""
+        for backend in self._backends():
+            await backend.close()
+    
+    def route(self, user_query: str, schema_context: str) -> str:
+        """
+        The tier that should generate SQL for the question.
+        
+        Returns:
+            TIER_FAST or TIER_STRONG (always TIER_STRONG without a fast model)
+        """
+        if self.fast_backend is None:
+            return TIER_STRONG
+        return self.cascade.route(user_query, schema_context)
+    
+    def cascade_stats(self) -> Dict:
+        """Models of both tiers and the cascade's routing and escalation counters."""
+        stats = self.cascade.stats()
+        stats["enabled"] = self.fast_backend is not None
+        stats["tiers"][TIER_FAST]["model"] = self.fast_backend.model if self.fast_backend else None
+        stats["tiers"][TIER_FAST]["hedging"] = self.fast_hedger.stats()
+        stats["tiers"][TIER_STRONG]["model"] = self.backend.model
+        return stats
+    
+    def _backends(self) -> List[LLMBackend]:
+        return [self.backend] + ([self.fast_backend] if self.fast_backend is not None else [])
+    
+    async def generate_sql(
+        self,
+        user_query: str,
+        schema_context: Optional[str] = None,
+        deadline: Optional[float] = None,
+        tier: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Generate SQL query from natural language question.
+        
+        Args:
+            user_query: User's natural language question
+            schema_context: Formatted schema context string, selected for
+                the question if not given
+            deadline: time.monotonic() by which the call must finish
+            tier: TIER_FAST or TIER_STRONG, routed by question complexity
+                if not given (see route)
+        
+        Returns:
+            Dict with keys: sql, params, explanation
+        
+        Raises:
+            LLMOverloadedError: If the rate limits don't allow the call
+                before the deadline
+            LLMTimeoutError: If the call doesn't finish before the deadline
+        """
+        if schema_context is None:
+            schema_context = await schema_loader.get_schema_context(question=user_query)
+        
+        tokens = (
+            (len(schema_context) + len(user_query)) // CHARS_PER_TOKEN
+            + _SQL_PROMPT_TOKENS + _SQL_COMPLETION_TOKENS
         )
         
-        content = response.choices[0].message.content
-        if not content:
-            return f"Query returned {len(rows)} row(s)."
+        if tier is None:
+            tier = self.route(user_query, schema_context)
+        fast = tier == TIER_FAST and self.fast_backend is not None
+        backend = self.fast_backend if fast else self.backend
         
-        return content
+        async def attempt(hedge: bool) -> Dict[str, str]:
+            # A hedge only runs if the rate limits admit it right away
+            admit_by = time.monotonic() if hedge else deadline
+            async with llm_scheduler.slot(PRIORITY_SQL, tokens, admit_by):
+                return await backend.generate_sql(user_query, schema_context)
+        
+        started = time.monotonic()
+        result = await (self.fast_hedger if fast else self.hedger).run(attempt, deadline)
+        self.cascade.record_latency(TIER_FAST if fast else TIER_STRONG, time.monotonic() - started)
+        return result
+    
+    async def summarize_results(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None,
+        deadline: Optional[float] = None
+    ) -> str:
+        """
+        Conversational summary of query results (see OpenAIBackend).
+        
+        Raises:
+            LLMOverloadedError: If the rate limits don't allow the call
+                before the deadline
+            LLMTimeoutError: If the call doesn't finish before the deadline
+        """
+        if profile is None:
+            profile = profile_rows(rows)
+        tokens = _summary_tokens(user_query, rows, sql, profile)
+        async with llm_scheduler.slot(PRIORITY_SUMMARY, tokens, deadline):
+            try:
+                return await asyncio.wait_for(
+                    self.backend.summarize_results(user_query, rows, sql, profile),
+                    timeout=_remaining(deadline)
+                )
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError("LLM summary did not finish before the request deadline")
+    
+    async def stream_summary(
+        self,
+        user_query: str,
+        rows: List[Dict],
+        sql: str,
+        profile: Optional[Dict] = None,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Conversational summary of query results, streamed as it is generated."""
+        if profile is None:
+            profile = profile_rows(rows)
+        tokens = _summary_tokens(user_query, rows, sql, profile)
+        # The admission is held until the stream ends
+        async with llm_scheduler.slot(PRIORITY_SUMMARY, tokens, deadline):
+            stream = self.backend.stream_summary(user_query, rows, sql, profile)
+            try:
+                while True:
+                    try:
+                        fragment = await asyncio.wait_for(
+                            stream.__anext__(), timeout=_remaining(deadline)
+                        )
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMTimeoutError("LLM summary did not finish before the request deadline")
+                    yield fragment
+            finally:
+                await stream.aclose()
+
+
+def _retry_after(error: RateLimitError) -> float:
+    """Seconds to wait after a 429, from the provider's retry-after headers."""
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        # retry-after may also be an HTTP date
+        pass
+    return _DEFAULT_RETRY_AFTER
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until a time.monotonic() deadline (None = no deadline)."""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def _summary_tokens(user_query: str, rows: List[Dict], sql: str, profile: Dict) -> int:
+    """Estimated prompt plus completion tokens of a summary call."""
+    prompt_chars = len(user_query) + len(sql) + len(compact_results(profile, rows))
+    return prompt_chars // CHARS_PER_TOKEN + _SUMMARY_PROMPT_TOKENS + _SUMMARY_COMPLETION_TOKENS
 
 
 # Global LLM service instance
@@ -0,0 +1,99 @@
+"""Fuzzy lookup of schema names for repairing near-miss identifiers."""
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# A match must be this similar (difflib ratio) and clearly better than the
+# runner-up, or the name is left alone
+_MIN_SIMILARITY = 0.75
+_MIN_MARGIN = 0.05
+
+
+def name_trigrams(name: str) -> Set[str]:
+    """Trigrams of a whole identifier, lowercase and padded like pg_trgm."""
+    padded = f"  {name.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def best_match(name: str, candidates: Iterable[str]) -> Optional[Tuple[str, str]]:
+    """
+    The candidate a misspelled or mis-cased name most likely meant.
+    
+    A candidate equal to the name up to case wins outright ("case"), as
+    long as it is the only one. Otherwise the most similar candidate is
+    returned ("fuzzy") if it is similar enough and unambiguous.
+    
+    Returns:
+        (candidate, "case" or "fuzzy"), or None
+    """
+    candidates = list(dict.fromkeys(candidates))
+    folded = name.lower()
+    same_case = [candidate for candidate in candidates if candidate.lower() == folded]
+    if len(same_case) == 1 and same_case[0] != name:
+        return same_case[0], "case"
+    if same_case:
+        return None
+    
+    scored = sorted(
+        (
+            (SequenceMatcher(None, folded, candidate.lower()).ratio(), candidate)
+            for candidate in candidates
+        ),
+        reverse=True
+    )
+    if not scored or scored[0][0] < _MIN_SIMILARITY:
+        return None
+    if len(scored) > 1 and scored[0][0] - scored[1][0] < _MIN_MARGIN:
+        return None
+    return scored[0][1], "fuzzy"
+
+
+class FuzzyNameIndex:
+    """
+    Trigram index over table names.
+    
+    Catalogs can hold thousands of tables, so the trigram postings narrow
+    the candidates down before best_match compares them. Schema-qualified
+    tables are also indexed under their bare name, so "ordrs" finds
+    "sales.orders".
+    """
+    
+    def __init__(self, names: Iterable[str]):
+        self._keys: List[Tuple[str, str]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for name in names:
+            keys = {name, name.rsplit(".", 1)[-1]}
+            for key in keys:
+                key_id = len(self._keys)
+                self._keys.append((key, name))
+                for gram in name_trigrams(key):
+                    self._postings[gram].append(key_id)
+    
+    def lookup(self, name: str) -> Optional[Tuple[str, str]]:
+        """
+        The indexed name a misspelled or mis-cased name most likely meant.
+        
+        Qualified names are compared with qualified names, bare names with
+        the bare names of every table.
+        
+        Returns:
+            (name, "case" or "fuzzy"), or None (see best_match)
+        """
+        qualified = "." in name
+        key_ids: Set[int] = set()
+        for gram in name_trigrams(name):
+            key_ids.update(self._postings.get(gram, ()))
+        
+        targets: Dict[str, Set[str]] = defaultdict(set)
+        for key_id in key_ids:
+            key, target = self._keys[key_id]
+            if ("." in key) == qualified:
+                targets[key].add(target)
+        match = best_match(name, targets)
+        if match is None:
+            return None
+        key, how = match
+        # The same bare name in two schemas
+        if len(targets[key]) != 1:
+            return None
+        return next(iter(targets[key])), how
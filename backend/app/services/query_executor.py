@@ -1,31 +1,50 @@
 """Safe SQL query execution with parameter binding."""
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional
 import asyncpg
 import json
 
-from app.database import db
+from app.database import db, Database
 from app.config import settings
+from app.services.schema_loader import schema_loader, SchemaLoader, SchemaSnapshot
 
 
 class QueryExecutionError(Exception):
     """Raised when query execution fails."""
-    pass
+    
+    def __init__(self, message: str, sqlstate: Optional[str] = None, position: Optional[str] = None):
+        super().__init__(message)
+        # Postgres error code and 1-based position in the query, when known
+        self.sqlstate = sqlstate
+        self.position = position
 
 
 class QueryExecutor:
     """Executes validated SQL queries safely."""
     
+    def __init__(self, database: Database = db, loader: SchemaLoader = schema_loader):
+        self._database = database
+        self._loader = loader
+    
     async def execute(
         self,
         sql: str,
-        params: Optional[List[Any]] = None
+        params: Optional[List[Any]] = None,
+        tables: Optional[Iterable[str]] = None,
+        snapshot: Optional[SchemaSnapshot] = None
     ) -> List[Dict[str, Any]]:
         """
         Execute SQL query with parameter binding.
         
+        Queries that read from a large table (settings.large_table_rows,
+        from the snapshot's statistics) are planned first and rejected if
+        the planner's cost estimate exceeds settings.max_query_cost.
+        
         Args:
             sql: Validated SQL query string
             params: Optional list of parameter values
+            tables: Tables the query reads from, for the cost check
+            snapshot: Schema snapshot with table statistics (defaults to
+                the current one)
             
         Returns:
             List of dictionaries representing rows
@@ -37,7 +56,10 @@ class QueryExecutor:
             params = []
         
         try:
-            async with db.acquire() as conn:
+            async with self._database.acquire() as conn:
+                if tables and self._reads_large_table(tables, snapshot):
+                    await self._check_cost(conn, sql, params, tables, snapshot)
+                
                 # Execute query with parameters
                 rows = await conn.fetch(sql, *params)
                 
@@ -65,10 +87,67 @@ class QueryExecutor:
                 
                 return result
                 
+        except QueryExecutionError:
+            raise
         except asyncpg.PostgresError as e:
-            raise QueryExecutionError(f"Database error: {str(e)}")
+            raise QueryExecutionError(
+                f"Database error: {str(e)}",
+                sqlstate=getattr(e, "sqlstate", None),
+                position=getattr(e, "position", None)
+            )
         except Exception as e:
             raise QueryExecutionError(f"Query execution failed: {str(e)}")
+    
+    def _reads_large_table(
+        self,
+        tables: Iterable[str],
+        snapshot: Optional[SchemaSnapshot] = None
+    ) -> bool:
+        """Whether the cost check applies to a query reading these tables."""
+        if settings.max_query_cost <= 0:
+            return False
+        stats = (snapshot or self._loader.snapshot).stats
+        return any(
+            table in stats and stats[table].row_estimate >= settings.large_table_rows
+            for table in tables
+        )
+    
+    def _index_hint(
+        self,
+        tables: Iterable[str],
+        snapshot: Optional[SchemaSnapshot] = None
+    ) -> str:
+        """Name the indexed columns of the given tables, for error messages."""
+        snapshot = snapshot or self._loader.snapshot
+        parts = []
+        for table_name in tables:
+            if table_name not in snapshot.tables:
+                continue
+            columns = sorted(snapshot.get_table(table_name).indexed_columns())
+            if columns:
+                parts.append(f"{table_name}({', '.join(columns)})")
+        return f" Indexed columns: {'; '.join(parts)}." if parts else ""
+    
+    async def _check_cost(
+        self,
+        conn: asyncpg.Connection,
+        sql: str,
+        params: List[Any],
+        tables: Iterable[str] = (),
+        snapshot: Optional[SchemaSnapshot] = None
+    ):
+        """Reject a query whose estimated plan cost is above the limit."""
+        plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *params)
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        total_cost = plan[0]["Plan"]["Total Cost"]
+        if total_cost > settings.max_query_cost:
+            raise QueryExecutionError(
+                f"Query is too expensive (estimated cost {total_cost:.0f}, "
+                f"limit {settings.max_query_cost:.0f}). Add filters on indexed "
+                f"columns or aggregate instead of scanning large tables."
+                + self._index_hint(tables, snapshot)
+            )
 
 
 # Global query executor instance
@@ -0,0 +1,203 @@
+"""Literal-free question templates for sharing generated SQL between questions."""
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Union
+
+# Quoted strings, ISO dates and plain numbers (not parts of identifiers)
+_LITERAL = re.compile(
+    r"""(?P<text>"[^"]+"|'[^']+'|“[^”]+”)"""
+    r"|(?P<date>(?<![\w-])\d{4}-\d{2}-\d{2}(?![\w-]))"
+    r"|(?P<number>(?<![\w.])\d{1,3}(?:,\d{3})+(?:\.\d+)?(?![\w.])"
+    r"|(?<![\w.])\d+(?:\.\d+)?(?![\w.]))"
+)
+
+# LIMIT clauses are ignored when looking for inlined literals: a literal that
+# was inlined as the limit is never bound to a parameter, so it is already
+# rejected, and the default row limit must not block unrelated literals
+_LIMIT_CLAUSE = re.compile(r"\bLIMIT\s+\d+", re.IGNORECASE)
+
+_PLACEHOLDERS = {"text": "{text}", "date": "{date}", "number": "{number}"}
+
+Value = Union[int, float, str]
+
+
+class Literal:
+    """One literal pulled out of a question."""
+    
+    __slots__ = ("kind", "raw", "value")
+    
+    def __init__(self, kind: str, raw: str, value: Value):
+        self.kind = kind
+        self.raw = raw
+        self.value = value
+    
+    def matches(self, param: Any) -> Optional[Dict[str, Any]]:
+        """
+        How a query parameter uses this literal, if it does.
+        
+        Returns:
+            A binding for QuestionTemplate.bind, or None if the parameter
+            is unrelated to the literal
+        """
+        if self.kind == "number":
+            if isinstance(param, (int, float)) and not isinstance(param, bool):
+                if param != self.value:
+                    return None
+                return {"literal": None, "as": "number", "integer": isinstance(param, int)}
+            if isinstance(param, str) and param == str(self.value):
+                return {"literal": None, "as": "string"}
+            return None
+        if not isinstance(param, str):
+            return None
+        # Strings may be wrapped in LIKE wildcards, e.g. '%widget%'
+        prefix, found, suffix = param.partition(str(self.value))
+        if found and not prefix.strip("%") and not suffix.strip("%"):
+            return {"literal": None, "as": "string", "prefix": prefix, "suffix": suffix}
+        return None
+
+
+def _parse(match: "re.Match") -> Literal:
+    """Build a literal from a regex match."""
+    raw = match.group(0)
+    if match.group("text"):
+        return Literal("text", raw, raw[1:-1])
+    if match.group("date"):
+        try:
+            return Literal("date", raw, date.fromisoformat(raw).isoformat())
+        except ValueError:
+            return Literal("text", raw, raw)
+    digits = raw.replace(",", "")
+    return Literal("number", raw, float(digits) if "." in digits else int(digits))
+
+
+class QuestionTemplate:
+    """
+    A question with its literals replaced by typed placeholders.
+    
+    "orders over 100 dollars" and "orders over 500 dollars" share the
+    template "orders over {number} dollars". SQL generated for one of them
+    can be reused for the other if every literal of the question maps to
+    exactly one query parameter; the new literals are then bound in place
+    of the old ones.
+    """
+    
+    def __init__(self, question: str):
+        self.literals: List[Literal] = []
+        
+        def replace(match: "re.Match") -> str:
+            literal = _parse(match)
+            self.literals.append(literal)
+            return _PLACEHOLDERS[literal.kind]
+        
+        self.text = _LITERAL.sub(replace, question)
+    
+    def parameterize(self, generation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Turn a generation for this question into a reusable template entry.
+        
+        Returns None when the mapping from literals to parameters is
+        ambiguous: two literals with the same value, a literal that no
+        parameter uses (e.g. inlined as LIMIT 10), or a literal that also
+        appears inline in the SQL. The explanation is kept split around the
+        literals, and dropped unless each literal appears in it exactly once.
+        
+        Args:
+            generation: LLM result with sql, params and explanation
+        
+        Returns:
+            The generation with each parameter replaced by a binding
+        """
+        values = [literal.value for literal in self.literals]
+        if not self.literals or len(set(map(str, values))) != len(values):
+            return None
+        
+        sql = generation["sql"]
+        bindings: List[Dict[str, Any]] = []
+        used = set()
+        for param in generation.get("params") or []:
+            binding = None
+            for position, literal in enumerate(self.literals):
+                binding = literal.matches(param)
+                if binding is not None:
+                    binding["literal"] = position
+                    used.add(position)
+                    break
+            bindings.append(binding if binding is not None else {"value": param})
+        
+        if len(used) != len(self.literals):
+            return None
+        inline_sql = _LIMIT_CLAUSE.sub("", sql)
+        for literal in self.literals:
+            if re.search(rf"(?<![\w$]){re.escape(str(literal.value))}(?!\w)", inline_sql):
+                return None
+        
+        explanation = generation.get("explanation")
+        return {
+            "sql": sql,
+            "bindings": bindings,
+            "explanation_parts": _split_explanation(explanation, self.literals) if explanation else None,
+            "literals": [str(literal.value) for literal in self.literals]
+        }
+    
+    def bind(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Build a generation for this question from a template entry.
+        
+        Returns:
+            sql, params and explanation with this question's literals, or
+            None if the entry does not fit this question
+        """
+        if len(entry["literals"]) != len(self.literals):
+            return None
+        
+        params = []
+        for binding in entry["bindings"]:
+            if "value" in binding:
+                params.append(binding["value"])
+                continue
+            value = self.literals[binding["literal"]].value
+            if binding["as"] == "number":
+                # An integer parameter can't take a fractional value
+                if binding["integer"] and not isinstance(value, int):
+                    return None
+                value = value if binding["integer"] else float(value)
+            else:
+                value = f"{binding.get('prefix', '')}{value}{binding.get('suffix', '')}"
+            params.append(value)
+        
+        # Without an explanation, the caller renders one from the SQL
+        explanation = None
+        parts = entry.get("explanation_parts")
+        if parts:
+            explanation = "".join(
+                part if isinstance(part, str) else str(self.literals[part].value)
+                for part in parts
+            )
+        return {"sql": entry["sql"], "params": params, "explanation": explanation}
+
+
+def _split_explanation(explanation: str, literals: List[Literal]) -> Optional[List[Union[str, int]]]:
+    """
+    The explanation as text parts and literal positions, in order.
+    
+    Returns None unless each literal appears exactly once, since another
+    occurrence ("limited to 100 rows") may be unrelated to the literal.
+    """
+    spans = []
+    for position, literal in enumerate(literals):
+        found = list(re.finditer(
+            rf"(?<![\w.]){re.escape(str(literal.value))}(?!\w|\.\d)", explanation
+        ))
+        if len(found) != 1:
+            return None
+        spans.append((found[0].start(), found[0].end(), position))
+    
+    parts: List[Union[str, int]] = []
+    end = 0
+    for start, stop, position in sorted(spans):
+        if start < end:
+            return None
+        parts.extend([explanation[end:start], position])
+        end = stop
+    parts.append(explanation[end:])
+    return parts
@@ -0,0 +1,182 @@
+"""Local statistical summaries of query results."""
+import json
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Executor output: numeric and date values may arrive as strings
+_NUMERIC_TEXT = re.compile(r"^-?\d+(\.\d+)?([eE][-+]?\d+)?$")
+_DATE_TEXT = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+_TOP_K = 5
+_SAMPLE_ROWS = 3
+
+
+def _number(value: Any) -> Optional[float]:
+    """Numeric value of a result cell, or None if it isn't numeric."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and _NUMERIC_TEXT.match(value):
+        return float(value)
+    return None
+
+
+def _format_number(value: float) -> str:
+    """Compact rendering: integers without decimals, others with two."""
+    if value == int(value) and abs(value) < 1e15:
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+
+def _profile_column(name: str, values: List[Any]) -> Dict[str, Any]:
+    """Profile one column: numeric, temporal or categorical."""
+    present = [value for value in values if value is not None]
+    profile: Dict[str, Any] = {"column": name, "nulls": len(values) - len(present)}
+    if not present:
+        profile["kind"] = "empty"
+        return profile
+    
+    numbers = [_number(value) for value in present]
+    if all(number is not None for number in numbers):
+        profile.update(
+            kind="numeric",
+            min=min(numbers),
+            max=max(numbers),
+            mean=round(sum(numbers) / len(numbers), 4),
+            sum=sum(numbers)
+        )
+        return profile
+    
+    if all(isinstance(value, str) and _DATE_TEXT.match(value) for value in present):
+        # ISO timestamps sort chronologically as text
+        profile.update(kind="temporal", min=min(present), max=max(present))
+        return profile
+    
+    counts = Counter(
+        value if isinstance(value, (str, int, float, bool)) else json.dumps(value, default=str)
+        for value in present
+    )
+    profile.update(
+        kind="categorical",
+        distinct=len(counts),
+        top=[[value, count] for value, count in counts.most_common(_TOP_K)]
+    )
+    return profile
+
+
+def _trend(
+    rows: List[Dict[str, Any]],
+    date_column: str,
+    value_column: str
+) -> Optional[Dict[str, Any]]:
+    """Change of a numeric column between the first and second half of the period."""
+    points = sorted(
+        (row[date_column], _number(row[value_column]))
+        for row in rows
+        if row.get(date_column) is not None and _number(row.get(value_column)) is not None
+    )
+    if len(points) < 4:
+        return None
+    half = len(points) // 2
+    first = sum(value for _, value in points[:half]) / half
+    second = sum(value for _, value in points[half:]) / (len(points) - half)
+    change = (second - first) / abs(first) if first else None
+    return {
+        "column": value_column,
+        "over": date_column,
+        "first_half_mean": round(first, 4),
+        "second_half_mean": round(second, 4),
+        "change": round(change, 4) if change is not None else None
+    }
+
+
+def profile_rows(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compute column profiles over the full result set.
+    
+    Numeric columns get min/max/mean/sum, temporal columns their range,
+    other columns their distinct count and most frequent values. When the
+    result has a temporal column, the trend of each numeric column over it
+    is included.
+    
+    Returns:
+        {"row_count": int, "columns": [...], "trends": [...]}
+    """
+    if not rows:
+        return {"row_count": 0, "columns": [], "trends": []}
+    
+    names = list(rows[0])
+    columns = [
+        _profile_column(name, [row.get(name) for row in rows])
+        for name in names
+    ]
+    
+    temporal = [profile["column"] for profile in columns if profile["kind"] == "temporal"]
+    numeric = [profile["column"] for profile in columns if profile["kind"] == "numeric"]
+    trends = []
+    if temporal:
+        for value_column in numeric:
+            trend = _trend(rows, temporal[0], value_column)
+            if trend is not None:
+                trends.append(trend)
+    
+    return {"row_count": len(rows), "columns": columns, "trends": trends}
+
+
+def render_summary(profile: Dict[str, Any], rows: List[Dict[str, Any]]) -> str:
+    """Deterministic plain-text summary of a result profile."""
+    row_count = profile["row_count"]
+    if row_count == 0:
+        return "The query returned no rows."
+    if row_count == 1 and len(rows[0]) <= 3:
+        values = ", ".join(f"{name} = {value}" for name, value in rows[0].items())
+        return f"Result: {values}."
+    
+    lines = [f"The query returned {row_count:,} row{'s' if row_count != 1 else ''}."]
+    for column in profile["columns"]:
+        name = column["column"]
+        kind = column["kind"]
+        if kind == "numeric":
+            line = (
+                f"{name}: from {_format_number(column['min'])} to {_format_number(column['max'])}, "
+                f"average {_format_number(column['mean'])}, total {_format_number(column['sum'])}"
+            )
+        elif kind == "temporal":
+            line = f"{name}: from {column['min']} to {column['max']}"
+        elif kind == "categorical":
+            top = ", ".join(f"{value} ({count})" for value, count in column["top"])
+            line = f"{name}: {column['distinct']:,} distinct values; most common: {top}"
+        else:
+            line = f"{name}: no values"
+        if column["nulls"]:
+            line += f"; {column['nulls']:,} missing"
+        lines.append(f"- {line}")
+    
+    for trend in profile["trends"]:
+        if trend["change"] is None:
+            continue
+        direction = "rose" if trend["change"] > 0 else "fell" if trend["change"] < 0 else "held steady"
+        lines.append(
+            f"- {trend['column']} {direction} {abs(trend['change']):.0%} from the first half "
+            f"of the {trend['over']} range to the second"
+        )
+    return "\n".join(lines)
+
+
+def compact_results(profile: Dict[str, Any], rows: List[Dict[str, Any]]) -> str:
+    """
+    Compact text of a result for an LLM prompt: the profile plus a few rows.
+    
+    Small results are sent whole; larger ones as statistics and a sample.
+    """
+    if len(rows) <= _SAMPLE_ROWS * 2:
+        return "Rows: " + json.dumps(rows, default=str, separators=(",", ":"))
+    sample = json.dumps(rows[:_SAMPLE_ROWS], default=str, separators=(",", ":"))
+    stats = json.dumps(
+        {"columns": profile["columns"], "trends": profile["trends"]},
+        default=str,
+        separators=(",", ":")
+    )
+    return f"Column statistics over all {len(rows)} rows: {stats}\nFirst rows: {sample}"
@@ -0,0 +1,281 @@
+"""Deterministic SQL for common question shapes, ahead of the LLM."""
+import logging
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.services.schema_index import tokenize
+from app.services.schema_loader import SchemaLoader, SchemaSnapshot
+from app.services.schema_model import Column, Table
+from app.services.sql_ast import quote_ident, quote_table
+from app.services.value_dictionary import ValueDictionary
+
+logger = logging.getLogger(__name__)
+
+# Tier of SQL that came from the rules instead of a model
+TIER_RULES = "rules"
+
+# Question shapes. Conditions ("where status is 'shipped'") are optional
+_CONDITION = r"(?:\s+(?:where|with|whose|that have|having)\s+(?P<condition>.+?))?"
+_FILLER = r"(?:\s+(?:are there|do we have|exist|in total|are in the database))?"
+_SHAPES = (
+    ("count", re.compile(
+        rf"^(?:how many|count(?: of)?(?: the)?|(?:what is )?the number of|number of)\s+(?:all\s+)?"
+        rf"(?P<noun>[\w ]+?){_FILLER}{_CONDITION}{_FILLER}\s*\??$",
+        re.IGNORECASE
+    )),
+    ("top", re.compile(
+        rf"^(?:(?:show|list|get|find|give)(?: me)?\s+|what are\s+|which are\s+)?(?:the\s+)?"
+        rf"(?P<direction>top|bottom)\s+(?P<limit>\d+)\s+(?P<noun>[\w ]+?)\s+by\s+(?P<order>[\w ]+?)"
+        rf"{_CONDITION}\s*\??$",
+        re.IGNORECASE
+    )),
+    ("list", re.compile(
+        rf"^(?:list|show(?: me)?|find|get|give me|which|what are)\s+(?:all\s+)?(?:the\s+)?"
+        rf"(?P<noun>[\w ]+?){_CONDITION}\s*\??$",
+        re.IGNORECASE
+    )),
+)
+
+# Words between a condition's column and its value
+_OPERATOR = re.compile(r"^(?:=|==|is equal to|equals|equal to|is|of)\s+", re.IGNORECASE)
+_QUOTED_VALUE = re.compile(r"""^(["'‘“])(.+)(["'’”])$""")
+_NUMBER = re.compile(r"^-?\d+(?:\.\d+)?$")
+
+_TEXT_TYPES = ("text", "character varying", "character(", "citext", "varchar")
+_NUMERIC_TYPES = (
+    "smallint", "integer", "bigint", "numeric", "decimal", "real", "double precision"
+)
+_TEMPORAL_TYPES = ("date", "timestamp")
+
+
+def _is_text(column: Column) -> bool:
+    return column.type.startswith(_TEXT_TYPES)
+
+
+def _is_numeric(column: Column) -> bool:
+    return column.type.startswith(_NUMERIC_TYPES)
+
+
+def _is_orderable(column: Column) -> bool:
+    return _is_numeric(column) or column.type.startswith(_TEMPORAL_TYPES)
+
+
+class RuleBasedGenerator:
+    """
+    Answers "how many X", "top N X by Y" and "list X where col = value"
+    without a model.
+    
+    A question is only answered when every part of it resolves without
+    guessing: the noun names exactly one table (same terms as the table
+    name, found through the schema index), the column names exactly one of
+    its columns, and the value is quoted, numeric for a numeric column, or
+    a stored value found in the value dictionary. Anything else returns
+    None and the question goes to the LLM. Values are always bound as
+    parameters, and the SQL goes through the validator like generated SQL.
+    """
+    
+    def __init__(self, enabled: bool = settings.rule_sql_enabled):
+        self.enabled = enabled
+        self.matched: Dict[str, int] = {shape: 0 for shape, _ in _SHAPES}
+        self.unmatched = 0
+        self.failed: Dict[str, int] = {"validation": 0, "execution": 0}
+        self.total_seconds = 0.0
+    
+    async def generate(
+        self,
+        question: str,
+        snapshot: SchemaSnapshot,
+        loader: SchemaLoader,
+        values: ValueDictionary
+    ) -> Optional[Dict[str, Any]]:
+        """
+        SQL for a question of a known shape.
+        
+        Args:
+            question: User's natural language question
+            snapshot: Schema snapshot of the request
+            loader: Schema loader (lazy mode loads the matched table)
+            values: Value dictionary of the database
+        
+        Returns:
+            Dict with keys: sql, params, explanation, or None to ask the LLM
+        """
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        result = None
+        for shape, pattern in _SHAPES:
+            found = pattern.match(question.strip())
+            if found is None:
+                continue
+            result = await self._build(shape, found, snapshot, loader, values)
+            if result is not None:
+                self.matched[shape] += 1
+                logger.info(f"Rule-based SQL ({shape}) for query: {question}")
+            break
+        if result is None:
+            self.unmatched += 1
+        self.total_seconds += time.perf_counter() - started
+        return result
+    
+    def record_failure(self, stage: str):
+        """
+        Count rule-based SQL that failed and went to the LLM after all.
+        
+        Args:
+            stage: "validation" or "execution"
+        """
+        self.failed[stage] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Questions answered per shape, fallbacks to the LLM and time spent matching."""
+        matched = sum(self.matched.values())
+        attempts = matched + self.unmatched
+        return {
+            "enabled": self.enabled,
+            "matched": dict(self.matched),
+            "unmatched": self.unmatched,
+            "failed": dict(self.failed),
+            "match_rate": round(matched / attempts, 3) if attempts else None,
+            "mean_match_ms": round(self.total_seconds / attempts * 1000, 3) if attempts else None
+        }
+    
+    async def _build(
+        self,
+        shape: str,
+        found: "re.Match",
+        snapshot: SchemaSnapshot,
+        loader: SchemaLoader,
+        values: ValueDictionary
+    ) -> Optional[Dict[str, Any]]:
+        """SQL for a matched shape, or None if a part of it doesn't resolve."""
+        table_name = _resolve_table(found.group("noun"), snapshot)
+        if table_name is None:
+            return None
+        await loader.load_tables([table_name], snapshot)
+        table = snapshot.get_table(table_name)
+        
+        where, params, described = "", [], ""
+        if found.group("condition"):
+            condition = _resolve_condition(found.group("condition"), table_name, table, snapshot, values)
+            if condition is None:
+                return None
+            column, value = condition
+            where = f" WHERE {quote_ident(column.name)} = $1"
+            params = [value]
+            described = f" where {column.name} = {value!r}"
+        source = quote_table(table_name)
+        
+        if shape == "count":
+            return {
+                "sql": f"SELECT COUNT(*) AS count FROM {source}{where}",
+                "params": params,
+                "explanation": f"Counts the rows of {table_name}{described}"
+            }
+        if shape == "top":
+            order = _resolve_column(found.group("order"), table)
+            if order is None or not _is_orderable(order):
+                return None
+            limit = min(int(found.group("limit")), settings.max_query_limit)
+            if limit <= 0:
+                return None
+            descending = found.group("direction").lower() == "top"
+            direction = "DESC NULLS LAST" if descending else "ASC NULLS LAST"
+            return {
+                "sql": (
+                    f"SELECT * FROM {source}{where} "
+                    f"ORDER BY {quote_ident(order.name)} {direction} LIMIT {limit}"
+                ),
+                "params": params,
+                "explanation": (
+                    f"Returns the {limit} rows of {table_name}{described} with the "
+                    f"{'highest' if descending else 'lowest'} {order.name}"
+                )
+            }
+        return {
+            "sql": f"SELECT * FROM {source}{where}",
+            "params": params,
+            "explanation": f"Lists the rows of {table_name}{described}"
+        }
+
+
+def _resolve_table(noun: str, snapshot: SchemaSnapshot) -> Optional[str]:
+    """The one table whose name has the same terms as the noun."""
+    terms = tokenize(noun)
+    if not terms:
+        return None
+    matches = [
+        table_name for table_name, _ in snapshot.index.search(noun)
+        if tokenize(table_name.rsplit(".", 1)[-1]) == terms
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _resolve_column(phrase: str, table: Table) -> Optional[Column]:
+    """The one column of the table whose name has the same terms as the phrase."""
+    terms = tokenize(phrase)
+    if not terms:
+        return None
+    matches = [column for column in table.columns if tokenize(column.name) == terms]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _resolve_condition(
+    condition: str,
+    table_name: str,
+    table: Table,
+    snapshot: SchemaSnapshot,
+    values: ValueDictionary
+) -> Optional[Tuple[Column, Any]]:
+    """
+    The column and value of a condition such as "status is 'shipped'".
+    
+    The condition is split after each word; the split whose left side
+    names exactly one column and whose right side is a value of that
+    column wins. Splits that only differ in stopwords ("status is" and
+    "status") resolve to the same condition.
+    """
+    words = list(re.finditer(r"\S+", condition))
+    resolved: Dict[Tuple[str, str], Tuple[Column, Any]] = {}
+    for split in range(1, len(words)):
+        column = _resolve_column(condition[:words[split - 1].end()], table)
+        if column is None:
+            continue
+        raw = _OPERATOR.sub("", condition[words[split].start():].strip())
+        value = _resolve_value(raw, column, table_name, snapshot, values)
+        if value is not None:
+            resolved[(column.name, repr(value))] = (column, value)
+    return next(iter(resolved.values())) if len(resolved) == 1 else None
+
+
+def _resolve_value(
+    raw: str,
+    column: Column,
+    table_name: str,
+    snapshot: SchemaSnapshot,
+    values: ValueDictionary
+) -> Optional[Any]:
+    """A parameter for the column from the question's wording of the value."""
+    quoted = _QUOTED_VALUE.match(raw)
+    if _is_numeric(column):
+        if quoted or not _NUMBER.match(raw):
+            return None
+        return float(raw) if "." in raw else int(raw)
+    if not _is_text(column):
+        return None
+    if quoted:
+        return quoted.group(2)
+    # Unquoted text must be a stored value (its stored case is used)
+    for match in values.match(raw, snapshot):
+        if (
+            match.table == table_name and match.column == column.name
+            and match.value.lower() == raw.lower()
+        ):
+            return match.value
+    return None
+
+
+# Global rule-based SQL generator
+rule_generator = RuleBasedGenerator()
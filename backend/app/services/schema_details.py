@@ -0,0 +1,58 @@
+"""Bounded cache of table details for lazy schema loading."""
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+
+from app.services.schema_model import Table
+
+
+class TableDetailCache:
+    """
+    LRU of fully loaded tables, keyed by relation oid.
+    
+    In lazy mode snapshots only hold relation names and comments; columns,
+    foreign keys and indexes are loaded when a table is first needed and kept
+    here. Each entry remembers the catalog fingerprint it was loaded at, so
+    an entry is only used by snapshots that agree on that fingerprint and a
+    changed table is reloaded instead of served stale. The cache is shared by
+    all snapshots of a loader, so unchanged tables survive a refresh.
+    """
+    
+    def __init__(self, max_tables: int):
+        self.max_tables = max(1, max_tables)
+        self._entries: "OrderedDict[int, Tuple[str, Table]]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, oid: int, fingerprint: str) -> Optional[Table]:
+        """Cached table for a relation at the given fingerprint, if any."""
+        entry = self._entries.get(oid)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        self._entries.move_to_end(oid)
+        return entry[1]
+    
+    def put(self, oid: int, fingerprint: str, table: Table):
+        """Cache a loaded table, evicting the least recently used ones."""
+        self._entries[oid] = (fingerprint, table)
+        self._entries.move_to_end(oid)
+        while len(self._entries) > self.max_tables:
+            self._entries.popitem(last=False)
+    
+    def discard_referencing(self, table_names: Set[str]):
+        """Drop tables whose foreign keys point at any of the given tables."""
+        stale = [
+            oid for oid, (_, table) in self._entries.items()
+            if any(fk.references_table in table_names for fk in table.foreign_keys)
+        ]
+        for oid in stale:
+            del self._entries[oid]
+    
+    def discard(self, oids: Iterable[int]):
+        """Drop the given relations."""
+        for oid in oids:
+            self._entries.pop(oid, None)
+    
+    def oids(self) -> List[int]:
+        """Oids of the cached relations."""
+        return list(self._entries)
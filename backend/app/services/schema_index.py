@@ -0,0 +1,145 @@
+"""BM25 relevance index over schema metadata for prompt pruning."""
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.services.schema_model import Table
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+# Term weights per field: a match on a table name says more than one in a comment
+_TABLE_NAME_WEIGHT = 3.0
+_COLUMN_NAME_WEIGHT = 2.0
+_COMMENT_WEIGHT = 1.0
+
+_STOPWORDS = frozenset("""
+    a an and are as at be by can do does for from get give has have how i in is it
+    its list me my of on or our per show that the their them there these this to
+    was were what when where which who whose why will with would you all any each
+""".split())
+
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    """Very light plural stemming so 'orders' matches 'order'."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split identifiers and prose into lowercase, stemmed terms."""
+    if not text:
+        return []
+    text = _CAMEL_BOUNDARY.sub(" ", text).lower()
+    return [
+        _stem(token)
+        for token in _NON_WORD.split(text)
+        if token and token not in _STOPWORDS
+    ]
+
+
+class SchemaIndex:
+    """
+    Inverted index over table names, column names and comments.
+    
+    Each table is one document. Questions are scored against it with BM25,
+    and the best tables are packed into a token budget using per-table token
+    estimates supplied when the index is built.
+    """
+    
+    def __init__(self, tables: Dict[str, Table], token_estimates: Dict[str, int]):
+        self._table_names: List[str] = list(tables)
+        self.token_estimates = token_estimates
+        self._postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        self._doc_lengths: List[float] = []
+        
+        for doc_id, table in enumerate(tables.values()):
+            term_weights: Dict[str, float] = defaultdict(float)
+            for term in tokenize(table.name):
+                term_weights[term] += _TABLE_NAME_WEIGHT
+            for term in tokenize(table.comment):
+                term_weights[term] += _COMMENT_WEIGHT
+            for col in table.columns:
+                for term in tokenize(col.name):
+                    term_weights[term] += _COLUMN_NAME_WEIGHT
+                for term in tokenize(col.comment):
+                    term_weights[term] += _COMMENT_WEIGHT
+            
+            for term, weight in term_weights.items():
+                self._postings[term].append((doc_id, weight))
+            self._doc_lengths.append(sum(term_weights.values()))
+        
+        num_docs = len(self._table_names)
+        self._avg_doc_length = (sum(self._doc_lengths) / num_docs) if num_docs else 0.0
+        self._idf = {
+            term: math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+    
+    def search(self, question: str) -> List[Tuple[str, float]]:
+        """
+        Rank tables by BM25 relevance to the question.
+        
+        Returns:
+            (table name, score) pairs with a positive score, best first
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(question)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for doc_id, tf in postings:
+                norm = _K1 * (1 - _B + _B * self._doc_lengths[doc_id] / self._avg_doc_length)
+                scores[doc_id] += idf * tf * (_K1 + 1) / (tf + norm)
+        
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(self._table_names[doc_id], score) for doc_id, score in ranked]
+    
+    def select_tables(
+        self,
+        question: str,
+        token_budget: int = 0,
+        max_tables: Optional[int] = None,
+        required: Sequence[str] = ()
+    ) -> List[str]:
+        """
+        Pick the tables most relevant to the question that fit the budget.
+        
+        Required tables come first, then tables in relevance order. Tables
+        are skipped when they would overflow the budget, but the first one is
+        always included. If nothing in the schema matches the question,
+        tables are taken in catalog order instead.
+        
+        Args:
+            question: User's natural language question
+            token_budget: Maximum estimated tokens of schema context (0 = unlimited)
+            max_tables: Optional limit on number of tables
+            required: Tables that must be considered first (e.g. tables
+                whose values are mentioned in the question)
+            
+        Returns:
+            Selected table names, most relevant first
+        """
+        ranked = [name for name, _ in self.search(question)] or self._table_names
+        candidates = list(dict.fromkeys([*required, *ranked]))
+        
+        selected: List[str] = []
+        used = 0
+        for table_name in candidates:
+            if max_tables and len(selected) >= max_tables:
+                break
+            cost = self.token_estimates[table_name]
+            if token_budget and selected and used + cost > token_budget:
+                continue
+            selected.append(table_name)
+            used += cost
+        return selected
@@ -1,22 +1,623 @@
 """Postgres schema metadata loader and cache."""
-from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from functools import cached_property
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
 import asyncpg
 
-from app.database import db
+from app.config import settings
+from app.database import db, Database
+from app.services.join_graph import JoinGraph, JoinHop, describe_hop
+from app.services.name_index import FuzzyNameIndex
+from app.services.schema_details import TableDetailCache
+from app.services.schema_index import SchemaIndex
+from app.services.schema_model import (
+    RELATION_KINDS, Column, ColumnStats, ForeignKey, Index, SchemaView, Table, TableStats,
+    group_foreign_keys
+)
+from app.services.schema_store import SchemaSnapshotStore
+
+logger = logging.getLogger(__name__)
+
+# Assembled schema contexts kept per snapshot (keyed by table subset)
+_CONTEXT_CACHE_SIZE = 256
+
+# Rough characters-per-token ratio of rendered schema text, also used to
+# size prompts for the LLM rate limits
+CHARS_PER_TOKEN = 4
+
+# Relation headers of the schema context (see _render_table), e.g.
+# "## Table: public.orders (~2M rows)"; the group is the table name
+RELATION_HEADER = re.compile(r"^## [A-Z][a-z ]*: (\S+)", re.MULTILINE)
+
+# Estimated prompt tokens per column of a table whose details are not loaded
+_COLUMN_TOKENS = 10
+
+
+# Relation filter shared by the bulk queries: tables, views and materialized
+# views. Partitions and inheritance children are left out; their parent
+# stands for the whole hierarchy.
+_RELATION_FILTER = """
+    c.relkind IN ('r', 'p', 'v', 'm')
+    AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+    AND NOT EXISTS (
+        SELECT 1 FROM pg_catalog.pg_inherits i WHERE i.inhrelid = c.oid
+    )
+"""
+
+# One row per relation. The fingerprint changes whenever DDL touches the
+# relation's pg_class row, its columns, its comments, its foreign keys, its
+# indexes or its set of partitions, so comparing fingerprints finds changed tables without
+# loading their details.
+# $1 = optional oid[] filter
+_BULK_RELATIONS_QUERY = f"""
+    SELECT
+        c.oid,
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        d.description AS comment,
+        c.relkind,
+        c.relnatts AS column_count,
+        (SELECT count(*)
+           FROM pg_catalog.pg_inherits i
+          WHERE i.inhparent = c.oid)::int AS partitions,
+        concat_ws(
+            ':',
+            c.xmin::text,
+            c.relfilenode::text,
+            (SELECT md5(string_agg(a.xmin::text, ',' ORDER BY a.attnum))
+               FROM pg_catalog.pg_attribute a
+              WHERE a.attrelid = c.oid AND a.attnum > 0),
+            (SELECT md5(string_agg(cd.xmin::text, ',' ORDER BY cd.objsubid))
+               FROM pg_catalog.pg_description cd
+              WHERE cd.objoid = c.oid
+                AND cd.classoid = 'pg_catalog.pg_class'::regclass),
+            (SELECT md5(string_agg(con.xmin::text, ',' ORDER BY con.oid))
+               FROM pg_catalog.pg_constraint con
+              WHERE con.conrelid = c.oid AND con.contype = 'f'),
+            (SELECT md5(string_agg(ix.xmin::text, ',' ORDER BY ix.indexrelid))
+               FROM pg_catalog.pg_index ix
+              WHERE ix.indrelid = c.oid),
+            (SELECT md5(string_agg(i.inhrelid::text, ',' ORDER BY i.inhrelid))
+               FROM pg_catalog.pg_inherits i
+              WHERE i.inhparent = c.oid)
+        ) AS fingerprint
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+    LEFT JOIN pg_catalog.pg_description d
+      ON d.objoid = c.oid
+      AND d.classoid = 'pg_catalog.pg_class'::regclass
+      AND d.objsubid = 0
+    WHERE {_RELATION_FILTER}
+      AND ($1::oid[] IS NULL OR c.oid = ANY($1::oid[]))
+    ORDER BY n.nspname, c.relname
+"""
+
+# $1 = shard count, $2 = shard index, $3 = optional oid[] filter
+_BULK_COLUMNS_QUERY = f"""
+    SELECT
+        a.attrelid AS oid,
+        a.attname AS column_name,
+        pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+        a.attnotnull AS not_null,
+        d.description AS comment
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+    LEFT JOIN pg_catalog.pg_description d
+      ON d.objoid = a.attrelid
+      AND d.classoid = 'pg_catalog.pg_class'::regclass
+      AND d.objsubid = a.attnum
+    WHERE {_RELATION_FILTER}
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+      AND c.oid::bigint % $1::int = $2::int
+      AND ($3::oid[] IS NULL OR c.oid = ANY($3::oid[]))
+    ORDER BY a.attrelid, a.attnum
+"""
+
+# Constraints cloned onto partitions (conparentid <> 0) are skipped: the
+# parent's constraint already describes the relationship.
+# $1 = optional oid[] filter
+_BULK_FOREIGN_KEYS_QUERY = f"""
+    SELECT
+        con.conrelid AS oid,
+        con.conname AS constraint_name,
+        a.attname AS column_name,
+        fn.nspname AS foreign_table_schema,
+        fc.relname AS foreign_table_name,
+        fa.attname AS foreign_column_name
+    FROM pg_catalog.pg_constraint con
+    JOIN pg_catalog.pg_class c ON con.conrelid = c.oid
+    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+    JOIN pg_catalog.pg_class fc ON con.confrelid = fc.oid
+    JOIN pg_catalog.pg_namespace fn ON fc.relnamespace = fn.oid
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey)
+        WITH ORDINALITY AS k(attnum, foreign_attnum, position)
+    JOIN pg_catalog.pg_attribute a
+      ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+    JOIN pg_catalog.pg_attribute fa
+      ON fa.attrelid = con.confrelid AND fa.attnum = k.foreign_attnum
+    WHERE con.contype = 'f'
+      AND con.conparentid = 0
+      AND {_RELATION_FILTER}
+      AND ($1::oid[] IS NULL OR c.oid = ANY($1::oid[]))
+    ORDER BY con.conrelid, con.conname, k.position
+"""
+
+# Valid indexes of the loaded relations (partitioned indexes for partitioned
+# tables). Plain keys are returned as column names, expression keys as their
+# deparsed expression.
+# $1 = optional oid[] filter
+_BULK_INDEXES_QUERY = f"""
+    SELECT
+        i.indrelid AS oid,
+        ic.relname AS index_name,
+        ARRAY(
+            SELECT coalesce(
+                (SELECT a.attname::text
+                   FROM pg_catalog.pg_attribute a
+                  WHERE a.attrelid = i.indrelid AND a.attnum = i.indkey[k - 1]),
+                pg_catalog.pg_get_indexdef(i.indexrelid, k, true)
+            )
+            FROM generate_series(1, i.indnkeyatts) AS k
+            ORDER BY k
+        ) AS keys,
+        i.indisunique AS is_unique,
+        i.indisprimary AS is_primary,
+        am.amname AS method,
+        pg_catalog.pg_get_expr(i.indpred, i.indrelid, true) AS predicate
+    FROM pg_catalog.pg_index i
+    JOIN pg_catalog.pg_class c ON i.indrelid = c.oid
+    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+    JOIN pg_catalog.pg_class ic ON i.indexrelid = ic.oid
+    JOIN pg_catalog.pg_am am ON ic.relam = am.oid
+    WHERE i.indisvalid
+      AND {_RELATION_FILTER}
+      AND ($1::oid[] IS NULL OR c.oid = ANY($1::oid[]))
+    ORDER BY i.indrelid, NOT i.indisprimary, NOT i.indisunique, ic.relname
+"""
+
+
+# Partitioned tables have no storage of their own, so their row estimate and
+# size are summed over the leaf partitions
+_TABLE_STATS_QUERY = f"""
+    SELECT
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        CASE WHEN c.relkind = 'p' THEN (
+            SELECT coalesce(sum(greatest(pc.reltuples, 0)), 0)::bigint
+              FROM pg_catalog.pg_partition_tree(c.oid) pt
+              JOIN pg_catalog.pg_class pc ON pc.oid = pt.relid
+             WHERE pt.isleaf
+        ) ELSE c.reltuples::bigint END AS row_estimate,
+        CASE WHEN c.relkind = 'p' THEN (
+            SELECT coalesce(sum(pg_catalog.pg_total_relation_size(pt.relid)), 0)::bigint
+              FROM pg_catalog.pg_partition_tree(c.oid) pt
+             WHERE pt.isleaf
+        ) ELSE pg_catalog.pg_total_relation_size(c.oid) END AS total_bytes
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+    WHERE {_RELATION_FILTER}
+      AND ($1::oid[] IS NULL OR c.oid = ANY($1::oid[]))
+"""
+
+# Inherited rows (partitioned parents) sort last so they win for parents
+# $1 = optional oid[] filter
+_COLUMN_STATS_QUERY = """
+    SELECT
+        s.schemaname AS schema_name,
+        s.tablename AS table_name,
+        s.attname AS column_name,
+        s.avg_width,
+        s.n_distinct,
+        s.null_frac
+    FROM pg_catalog.pg_stats s
+    WHERE s.schemaname NOT IN ('pg_catalog', 'information_schema')
+      AND ($1::oid[] IS NULL OR (s.schemaname, s.tablename) IN (
+          SELECT n.nspname, c.relname
+            FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+           WHERE c.oid = ANY($1::oid[])
+      ))
+    ORDER BY s.inherited
+"""
+
+
+def qualified_name(schema_name: str, table_name: str) -> str:
+    """Table name as exposed to the LLM and validator (public schema unqualified)."""
+    return f"{schema_name}.{table_name}" if schema_name != 'public' else table_name
+
+
+def _render_table(table: Table, stats: Optional[TableStats] = None) -> str:
+    """Render one table's section of the schema context."""
+    details = []
+    if table.partitions:
+        details.append(f"{table.partitions} partitions")
+    size_hint = stats.size_hint() if stats else None
+    if size_hint:
+        details.append(size_hint)
+    header = f"\n## {table.kind.capitalize()}: {table.name}"
+    lines = [header + (f" ({', '.join(details)})" if details else "")]
+    
+    if table.comment:
+        lines.append(f"Description: {table.comment}")
+    
+    # Single-column btree indexes are marked on the column; composite,
+    # partial, expression and non-btree indexes are listed separately
+    markers: Dict[str, str] = {}
+    other_indexes: List[Index] = []
+    for index in table.indexes:
+        key = index.keys[0]
+        if (
+            len(index.keys) == 1 and index.method == "btree" and not index.predicate
+            and table.get_column(key) is not None
+        ):
+            marker = "PK" if index.primary else "unique" if index.unique else "indexed"
+            markers.setdefault(key, marker)
+        else:
+            other_indexes.append(index)
+    
+    lines.append("Columns:")
+    for col in table.columns:
+        nullable = "nullable" if col.nullable else "NOT NULL"
+        marker = f", {markers[col.name]}" if col.name in markers else ""
+        comment_str = f" -- {col.comment}" if col.comment else ""
+        lines.append(f"  - {col.name}: {col.type} ({nullable}{marker}){comment_str}")
+    
+    if other_indexes:
+        lines.append("Indexes:")
+        for index in other_indexes:
+            lines.append(f"  - {index.describe()}")
+    
+    if table.foreign_keys:
+        lines.append("Foreign Keys:")
+        for constraint in group_foreign_keys(table.foreign_keys):
+            fk = constraint[0]
+            if len(constraint) == 1:
+                lines.append(
+                    f"  - {fk.column} -> {fk.references_table}.{fk.references_column}"
+                )
+            else:
+                # Composite keys are only a join condition with all columns
+                columns = ", ".join(part.column for part in constraint)
+                references = ", ".join(part.references_column for part in constraint)
+                lines.append(f"  - ({columns}) -> {fk.references_table}({references})")
+    
+    return "\n".join(lines)
+
+
+def _fingerprints(relation_rows: List[asyncpg.Record]) -> Dict[int, Tuple[str, str]]:
+    """Map relation oid to (table name, fingerprint), in catalog order."""
+    return {
+        row['oid']: (qualified_name(row['schema_name'], row['table_name']), row['fingerprint'])
+        for row in relation_rows
+    }
+
+
+def _assemble_stubs(
+    relation_rows: List[asyncpg.Record]
+) -> Tuple[Dict[str, Table], Dict[str, int]]:
+    """
+    Build name-and-comment-only tables for lazy loading.
+    
+    Returns:
+        (tables, estimated prompt tokens of each table once fully loaded)
+    """
+    schema: Dict[str, Table] = {}
+    token_estimates: Dict[str, int] = {}
+    for row in relation_rows:
+        name = qualified_name(row['schema_name'], row['table_name'])
+        table = Table(
+            name, row['comment'], (), (), RELATION_KINDS[row['relkind']], row['partitions']
+        )
+        schema[name] = table
+        token_estimates[name] = (
+            len(_render_table(table)) // CHARS_PER_TOKEN + 1
+            + row['column_count'] * _COLUMN_TOKENS
+        )
+    return schema, token_estimates
+
+
+def _index_from_row(row: asyncpg.Record) -> Index:
+    """Build an Index record from a row of the index query."""
+    return Index(
+        row['index_name'],
+        tuple(row['keys']),
+        row['is_unique'],
+        row['is_primary'],
+        row['method'],
+        row['predicate']
+    )
+
+
+def _assemble_schema(
+    relation_rows: List[asyncpg.Record],
+    column_rows: List[asyncpg.Record],
+    fk_rows: List[asyncpg.Record],
+    index_rows: List[asyncpg.Record]
+) -> Dict[str, Table]:
+    """Group the rows of the bulk catalog queries into Table records."""
+    columns_by_oid: Dict[int, List[Column]] = {row['oid']: [] for row in relation_rows}
+    fks_by_oid: Dict[int, List[ForeignKey]] = {row['oid']: [] for row in relation_rows}
+    indexes_by_oid: Dict[int, List[Index]] = {row['oid']: [] for row in relation_rows}
+    
+    for row in column_rows:
+        columns = columns_by_oid.get(row['oid'])
+        if columns is not None:
+            columns.append(Column(
+                row['column_name'], row['data_type'], not row['not_null'], row['comment']
+            ))
+    
+    for row in fk_rows:
+        foreign_keys = fks_by_oid.get(row['oid'])
+        if foreign_keys is not None:
+            foreign_keys.append(ForeignKey(
+                row['column_name'],
+                qualified_name(row['foreign_table_schema'], row['foreign_table_name']),
+                row['foreign_column_name'],
+                row['constraint_name']
+            ))
+    
+    for row in index_rows:
+        indexes = indexes_by_oid.get(row['oid'])
+        if indexes is not None:
+            indexes.append(_index_from_row(row))
+    
+    schema: Dict[str, Table] = {}
+    for row in relation_rows:
+        name = qualified_name(row['schema_name'], row['table_name'])
+        schema[name] = Table(
+            name,
+            row['comment'],
+            tuple(columns_by_oid[row['oid']]),
+            tuple(fks_by_oid[row['oid']]),
+            RELATION_KINDS[row['relkind']],
+            row['partitions'],
+            tuple(indexes_by_oid[row['oid']])
+        )
+    return schema
+
+
+class SchemaSnapshot:
+    """
+    Schema metadata published by the loader at one point in time.
+    
+    Snapshots are never mutated after they are published: a refresh builds a
+    new snapshot (sharing the unchanged table entries) and swaps it in, so a
+    request that holds a snapshot sees one consistent schema throughout.
+    
+    Lazily loaded snapshots hold only names and comments in `tables`; the
+    full tables come from the loader's detail cache (see get_table) and are
+    matched to the snapshot by catalog fingerprint.
+    """
+    
+    def __init__(
+        self,
+        tables: Dict[str, Table],
+        fingerprints: Dict[int, Tuple[str, str]],
+        version: int,
+        stats: Optional[Dict[str, TableStats]] = None,
+        details: Optional[TableDetailCache] = None,
+        token_estimates: Optional[Dict[str, int]] = None
+    ):
+        # Table name -> metadata
+        self.tables = tables
+        # Relation oid -> (table name, catalog fingerprint)
+        self.fingerprints = fingerprints
+        # Table name -> planner statistics (filled by the background stats pass)
+        self.stats = stats or {}
+        # Incremented on every published change
+        self.version = version
+        # Lazy mode only: detail cache and token estimates of unloaded tables
+        self.details = details
+        self.token_estimates = token_estimates
+        # Rendering memos; they live and die with the snapshot
+        self._fragments: Dict[str, str] = {}
+        self._contexts: "OrderedDict[Tuple, str]" = OrderedDict()
+    
+    @cached_property
+    def table_names(self) -> FrozenSet[str]:
+        """Names of all tables in the snapshot."""
+        return frozenset(self.tables)
+    
+    @cached_property
+    def content_hash(self) -> str:
+        """
+        Hash of the catalog state the snapshot was loaded from.
+        
+        Unlike version, it is the same across restarts and processes as long
+        as no DDL ran, so it can key caches that outlive the process.
+        """
+        digest = hashlib.sha256()
+        for oid in sorted(self.fingerprints):
+            name, fingerprint = self.fingerprints[oid]
+            digest.update(f"{oid}\0{name}\0{fingerprint}\n".encode("utf-8"))
+        return digest.hexdigest()
+    
+    @property
+    def lazy(self) -> bool:
+        """Whether table details are loaded on demand."""
+        return self.details is not None
+    
+    @cached_property
+    def oids_by_name(self) -> Dict[str, int]:
+        """Relation oid of every table."""
+        return {name: oid for oid, (name, _) in self.fingerprints.items()}
+    
+    @cached_property
+    def index(self) -> SchemaIndex:
+        """Relevance index over the snapshot, built on first use."""
+        return SchemaIndex(
+            self.tables,
+            {table_name: self.fragment_tokens(table_name) for table_name in self.tables}
+        )
+    
+    @cached_property
+    def join_graph(self) -> JoinGraph:
+        """Foreign-key join graph over the snapshot, built on first use."""
+        return JoinGraph(self.tables, settings.schema_join_max_depth)
+    
+    @cached_property
+    def name_index(self) -> FuzzyNameIndex:
+        """Fuzzy index over table names for SQL repair, built on first use."""
+        return FuzzyNameIndex(self.tables)
+    
+    def get_table(self, table_name: str) -> Table:
+        """
+        Full metadata of a table.
+        
+        For lazy snapshots this is the cached detail when it has been loaded
+        (see SchemaLoader.load_tables), otherwise the name-only entry.
+        """
+        if self.details is not None:
+            oid = self.oids_by_name.get(table_name)
+            if oid is not None:
+                table = self.details.get(oid, self.fingerprints[oid][1])
+                if table is not None:
+                    return table
+        return self.tables[table_name]
+    
+    def missing_details(self, table_names: Iterable[str]) -> List[int]:
+        """Oids of the given tables whose details are not cached (lazy mode)."""
+        if self.details is None:
+            return []
+        missing = []
+        for table_name in table_names:
+            oid = self.oids_by_name.get(table_name)
+            if oid is not None and self.details.get(oid, self.fingerprints[oid][1]) is None:
+                missing.append(oid)
+        return missing
+    
+    def fragment(self, table_name: str) -> str:
+        """Rendered schema context section of one table (memoized)."""
+        fragment = self._fragments.get(table_name)
+        if fragment is None:
+            fragment = _render_table(self.get_table(table_name), self.stats.get(table_name))
+            # Lazy snapshots don't memoize fragments: that would keep every
+            # table ever rendered alive for the snapshot's lifetime
+            if self.details is None:
+                self._fragments[table_name] = fragment
+        return fragment
+    
+    def fragment_tokens(self, table_name: str) -> int:
+        """Approximate prompt tokens of a table's rendered section."""
+        if self.token_estimates is not None:
+            return self.token_estimates[table_name]
+        return len(self.fragment(table_name)) // CHARS_PER_TOKEN + 1
+    
+    def join_plan(self, table_names: List[str]) -> Tuple[List[str], List[JoinHop]]:
+        """
+        Bridge tables and join hops connecting the given tables.
+        
+        Lazy snapshots only know the foreign keys of loaded tables, so there
+        join hints are limited to direct joins between the given tables.
+        """
+        join_graph = self.join_graph if self.details is None else JoinGraph(
+            {name: self.get_table(name) for name in table_names},
+            settings.schema_join_max_depth
+        )
+        return join_graph.connect(table_names)
+    
+    def fit_join_budget(self, table_names: List[str], token_budget: int) -> List[str]:
+        """
+        Drop the least relevant tables until they fit the token budget
+        together with the bridge tables needed to join them.
+        
+        Args:
+            table_names: Selected tables, most relevant first
+            token_budget: Maximum estimated tokens (0 = unlimited)
+        """
+        names = list(table_names)
+        while token_budget and len(names) > 1:
+            bridges, _ = self.join_plan(names)
+            if sum(self.fragment_tokens(name) for name in names + bridges) <= token_budget:
+                break
+            names.pop()
+        return names
+    
+    def render_context(
+        self,
+        table_names: Optional[Tuple[str, ...]] = None,
+        join_hints: bool = False
+    ) -> str:
+        """
+        Assemble the schema context for a subset of tables (memoized).
+        
+        Args:
+            table_names: Tables to include, in order (None = all tables)
+            join_hints: Add bridge tables and join conditions connecting
+                the given tables
+        
+        Returns:
+            Formatted string describing the tables
+        """
+        key = (table_names, join_hints)
+        context = self._contexts.get(key)
+        if context is not None:
+            self._contexts.move_to_end(key)
+            return context
+        
+        names = list(self.tables) if table_names is None else list(table_names)
+        join_hops = []
+        if join_hints:
+            bridges, join_hops = self.join_plan(names)
+            names += bridges
+        
+        parts = [self.fragment(table_name) for table_name in names]
+        if join_hops:
+            parts.append("\n## Join hints")
+            parts.extend(f"  - {describe_hop(hop)}" for hop in join_hops)
+        context = "\n".join(parts)
+        
+        self._contexts[key] = context
+        if len(self._contexts) > _CONTEXT_CACHE_SIZE:
+            self._contexts.popitem(last=False)
+        return context
 
 
 class SchemaLoader:
     """Loads and caches Postgres schema metadata."""
     
-    def __init__(self):
-        self._schema_cache: Optional[Dict[str, Dict]] = None
+    def __init__(self, database: Database = db):
+        self.database = database
+        self._snapshot: Optional[SchemaSnapshot] = None
+        # Table details of lazily loaded snapshots
+        self._details = TableDetailCache(settings.schema_lazy_cache_tables)
+        self._store: Optional[SchemaSnapshotStore] = (
+            SchemaSnapshotStore(settings.schema_snapshot_dir, database.url)
+            if settings.schema_snapshot_dir else None
+        )
+        # Set once statistics have been published
+        self._stats_loaded = asyncio.Event()
+    
+    @property
+    def is_loaded(self) -> bool:
+        """Whether a schema snapshot has been published."""
+        return self._snapshot is not None
     
-    async def load_schema(self) -> Dict[str, Dict]:
+    async def load_schema(
+        self,
+        mode: Optional[str] = None,
+        parallelism: Optional[int] = None
+    ) -> Mapping[str, Dict]:
         """
         Load schema metadata from Postgres system catalogs.
         
+        Args:
+            mode: "bulk" (set-based pg_catalog queries), "per_table"
+                (five queries per table) or "lazy" (names and comments only;
+                details are loaded on demand, see load_tables). Defaults to
+                settings.schema_load_mode.
+            parallelism: Number of pool connections the bulk column query is
+                sharded across. Defaults to settings.schema_load_parallelism.
+        
         Returns:
-            Dict mapping table names to their metadata:
+            Mapping of table names to their metadata (a view over the
+            compact Table records, see get_schema):
             {
                 "table_name": {
                     "columns": [
@@ -28,176 +629,470 @@ class SchemaLoader:
                         "columns": {"col1": "Column comment", ...}
                     },
                     "foreign_keys": [
-                        {"column": "col1", "references_table": "other_table", "references_column": "id"},
+                        {"column": "col1", "references_table": "other_table", "references_column": "id",
+                         "constraint": "t_col1_fkey"},
+                        ...
+                    ],
+                    "kind": "table",  # or "partitioned table", "view", "materialized view"
+                    "partitions": 0,
+                    "indexes": [
+                        {"name": "t_pkey", "columns": ["id"], "unique": True, "primary": True,
+                         "method": "btree", "predicate": None},
                         ...
                     ]
                 }
             }
         """
-        async with db.acquire() as conn:
-            # Get all user tables (exclude system schemas)
-            tables_query = """
+        mode = mode or settings.schema_load_mode
+        parallelism = max(1, parallelism or settings.schema_load_parallelism)
+        if mode == "bulk":
+            relation_rows, column_rows, fk_rows, index_rows = await asyncio.gather(
+                self._fetch(_BULK_RELATIONS_QUERY, None),
+                self._fetch_columns(parallelism),
+                self._fetch(_BULK_FOREIGN_KEYS_QUERY, None),
+                self._fetch(_BULK_INDEXES_QUERY, None)
+            )
+            schema = _assemble_schema(relation_rows, column_rows, fk_rows, index_rows)
+        elif mode == "per_table":
+            relation_rows = await self._fetch(_BULK_RELATIONS_QUERY, None)
+            async with self.database.acquire() as conn:
+                schema = await self._load_per_table(conn, relation_rows)
+        elif mode == "lazy":
+            relation_rows = await self._fetch(_BULK_RELATIONS_QUERY, None)
+            schema, token_estimates = _assemble_stubs(relation_rows)
+            self._publish(schema, _fingerprints(relation_rows), token_estimates=token_estimates)
+            return self.get_schema()
+        else:
+            raise ValueError(f"Unknown schema load mode: {mode}")
+        
+        self._publish(schema, _fingerprints(relation_rows))
+        await self._save_snapshot_file()
+        return self.get_schema()
+    
+    def load_snapshot_file(self) -> bool:
+        """
+        Publish the schema saved by a previous run, without touching Postgres.
+        
+        The file may be stale; call refresh() afterwards to revalidate it
+        against the catalog (only changed tables are reloaded).
+        
+        Returns:
+            True if a snapshot file was found and published
+        """
+        if self._store is None or settings.schema_load_mode == "lazy":
+            return False
+        loaded = self._store.load()
+        if loaded is None:
+            return False
+        self._publish(*loaded)
+        return True
+    
+    async def _save_snapshot_file(self):
+        """Persist the current snapshot, if a snapshot directory is configured."""
+        if self._store is None or self.snapshot.lazy:
+            return
+        snapshot = self.snapshot
+        try:
+            await asyncio.to_thread(self._store.save, snapshot.tables, snapshot.fingerprints)
+        except Exception as e:
+            logger.warning(f"Failed to save schema snapshot: {str(e)}")
+    
+    async def refresh(self) -> bool:
+        """
+        Reload only the tables whose catalog fingerprint changed.
+        
+        Compares the fingerprint of every relation with the current snapshot,
+        fetches details for new and changed relations only, and atomically
+        publishes a new snapshot.
+        
+        Returns:
+            True if a new snapshot was published
+        """
+        current = self._snapshot
+        if current is None:
+            await self.load_schema()
+            return True
+        
+        relation_rows = await self._fetch(_BULK_RELATIONS_QUERY, None)
+        fingerprints = _fingerprints(relation_rows)
+        
+        changed = {
+            oid for oid, entry in fingerprints.items()
+            if current.fingerprints.get(oid) != entry
+        }
+        removed = {
+            name for oid, (name, _) in current.fingerprints.items()
+            if fingerprints.get(oid, (None,))[0] != name
+        }
+        if not changed and not removed:
+            return False
+        
+        # Foreign keys of unchanged tables can point at a renamed or dropped table
+        stale_targets = removed | {fingerprints[oid][0] for oid in changed}
+        
+        if current.lazy:
+            # Names are cheap to rebuild; changed details are reloaded on demand
+            self._details.discard(set(current.fingerprints) - set(fingerprints))
+            self._details.discard_referencing(stale_targets)
+            schema, token_estimates = _assemble_stubs(relation_rows)
+            self._publish(schema, fingerprints, token_estimates=token_estimates)
+            logger.info(
+                f"Schema refreshed lazily: {len(changed)} changed, {len(removed)} removed"
+            )
+            return True
+        
+        oids_by_name = {name: oid for oid, (name, _) in fingerprints.items()}
+        for name, table in current.tables.items():
+            if name in oids_by_name and any(
+                fk.references_table in stale_targets for fk in table.foreign_keys
+            ):
+                changed.add(oids_by_name[name])
+        
+        oids = sorted(changed)
+        parallelism = max(1, settings.schema_load_parallelism)
+        column_rows, fk_rows, index_rows = await asyncio.gather(
+            self._fetch_columns(parallelism, oids),
+            self._fetch(_BULK_FOREIGN_KEYS_QUERY, oids),
+            self._fetch(_BULK_INDEXES_QUERY, oids)
+        )
+        reloaded = _assemble_schema(
+            [row for row in relation_rows if row['oid'] in changed],
+            column_rows,
+            fk_rows,
+            index_rows
+        )
+        
+        # Keep catalog order; unchanged entries are shared with the old snapshot
+        schema = {}
+        for oid, (name, _) in fingerprints.items():
+            table = reloaded.get(name) if oid in changed else current.tables.get(name)
+            if table is not None:
+                schema[name] = table
+        
+        self._publish(schema, fingerprints)
+        await self._save_snapshot_file()
+        logger.info(
+            f"Schema refreshed: {len(changed)} table(s) reloaded, "
+            f"{len(removed - set(schema))} removed"
+        )
+        return True
+    
+    async def refresh_stats(self) -> bool:
+        """
+        Reload table and column statistics and publish them with the tables.
+        
+        Returns:
+            True if a new snapshot was published
+        """
+        if self._snapshot is None:
+            return False
+        
+        # Lazy snapshots only keep statistics of the tables with loaded details
+        current = self._snapshot
+        oids = self._details.oids() if current.lazy else None
+        table_rows, column_rows = await asyncio.gather(
+            self._fetch(_TABLE_STATS_QUERY, oids),
+            self._fetch(_COLUMN_STATS_QUERY, oids)
+        )
+        stats: Dict[str, TableStats] = {
+            qualified_name(row['schema_name'], row['table_name']): TableStats(
+                row['row_estimate'], row['total_bytes'], {}
+            )
+            for row in table_rows
+        }
+        for row in column_rows:
+            table_stats = stats.get(qualified_name(row['schema_name'], row['table_name']))
+            if table_stats is not None:
+                table_stats.columns[row['column_name']] = ColumnStats(
+                    row['avg_width'], row['n_distinct'], row['null_frac']
+                )
+        
+        # Tables may have been refreshed while the statistics were loading
+        current = self._snapshot
+        self._publish(current.tables, current.fingerprints, stats, current.token_estimates)
+        self._stats_loaded.set()
+        return True
+    
+    async def wait_for_stats(self, timeout: float) -> bool:
+        """
+        Wait until statistics have been loaded at least once.
+        
+        Returns:
+            False if they were not loaded within timeout seconds
+        """
+        try:
+            await asyncio.wait_for(self._stats_loaded.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+    
+    async def load_tables(
+        self,
+        table_names: Iterable[str],
+        snapshot: Optional[SchemaSnapshot] = None
+    ):
+        """
+        Make sure the details of the given tables are loaded.
+        
+        Only lazy snapshots need this: columns, foreign keys and indexes of
+        tables that are not in the detail cache yet are fetched with the
+        bulk queries (filtered to those tables) and cached. Unknown table
+        names are ignored.
+        
+        Args:
+            table_names: Tables about to be rendered or checked
+            snapshot: Snapshot the tables belong to (defaults to the current one)
+        """
+        snapshot = snapshot or self.snapshot
+        oids = snapshot.missing_details(table_names)
+        if not oids:
+            return
+        
+        relation_rows, column_rows, fk_rows, index_rows = await asyncio.gather(
+            self._fetch(_BULK_RELATIONS_QUERY, oids),
+            self._fetch_columns(1, oids),
+            self._fetch(_BULK_FOREIGN_KEYS_QUERY, oids),
+            self._fetch(_BULK_INDEXES_QUERY, oids)
+        )
+        loaded = _assemble_schema(relation_rows, column_rows, fk_rows, index_rows)
+        for row in relation_rows:
+            name = qualified_name(row['schema_name'], row['table_name'])
+            self._details.put(row['oid'], row['fingerprint'], loaded[name])
+    
+    def _publish(
+        self,
+        schema: Dict[str, Table],
+        fingerprints: Dict[int, Tuple[str, str]],
+        stats: Optional[Dict[str, TableStats]] = None,
+        token_estimates: Optional[Dict[str, int]] = None
+    ):
+        """
+        Swap in a new snapshot, keeping the current statistics unless given.
+        
+        Passing token estimates publishes a lazy snapshot (schema holds
+        name-only tables whose details come from the detail cache).
+        """
+        previous = self._snapshot
+        version = previous.version + 1 if previous else 1
+        if stats is None and previous is not None:
+            stats = previous.stats
+        self._snapshot = SchemaSnapshot(
+            schema,
+            fingerprints,
+            version,
+            stats,
+            self._details if token_estimates is not None else None,
+            token_estimates
+        )
+    
+    async def _fetch(self, query: str, *args) -> List[asyncpg.Record]:
+        """Run one catalog query on its own pool connection."""
+        async with self.database.acquire() as conn:
+            return await conn.fetch(query, *args)
+    
+    async def _fetch_columns(
+        self,
+        parallelism: int,
+        oids: Optional[List[int]] = None
+    ) -> List[asyncpg.Record]:
+        """
+        Fetch columns, sharded by relation oid across pool connections.
+        
+        The column query is by far the largest, so with parallelism > 1 it
+        is split into shards that run concurrently.
+        """
+        shards = await asyncio.gather(*(
+            self._fetch(_BULK_COLUMNS_QUERY, parallelism, shard, oids)
+            for shard in range(parallelism)
+        ))
+        return [row for shard_rows in shards for row in shard_rows]
+    
+    async def _load_per_table(
+        self,
+        conn: asyncpg.Connection,
+        relation_rows: List[asyncpg.Record]
+    ) -> Dict[str, Table]:
+        """Load schema metadata with separate catalog queries for every relation."""
+        schema: Dict[str, Table] = {}
+        
+        for table in relation_rows:
+            schema_name = table['schema_name']
+            table_name = table['table_name']
+            full_table_name = qualified_name(schema_name, table_name)
+            
+            # Get columns
+            columns_query = """
                 SELECT 
-                    schemaname,
-                    tablename
-                FROM pg_tables
-                WHERE schemaname NOT IN ('pg_catalog', 'information_schema')
-                ORDER BY schemaname, tablename
+                    a.attname AS column_name,
+                    pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+                    a.attnotnull AS not_null,
+                    a.attnum AS column_position
+                FROM pg_catalog.pg_attribute a
+                JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+                JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+                WHERE n.nspname = $1
+                  AND c.relname = $2
+                  AND a.attnum > 0
+                  AND NOT a.attisdropped
+                ORDER BY a.attnum
             """
             
-            tables = await conn.fetch(tables_query)
-            schema: Dict[str, Dict] = {}
-            
-            for table in tables:
-                schema_name = table['schemaname']
-                table_name = table['tablename']
-                full_table_name = f"{schema_name}.{table_name}" if schema_name != 'public' else table_name
-                
-                # Get columns
-                columns_query = """
-                    SELECT 
-                        a.attname AS column_name,
-                        pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
-                        a.attnotnull AS not_null,
-                        a.attnum AS column_position
-                    FROM pg_catalog.pg_attribute a
-                    JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
-                    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
-                    WHERE n.nspname = $1
-                      AND c.relname = $2
-                      AND a.attnum > 0
-                      AND NOT a.attisdropped
-                    ORDER BY a.attnum
-                """
-                
-                columns_rows = await conn.fetch(columns_query, schema_name, table_name)
-                columns = [
-                    {
-                        "name": row['column_name'],
-                        "type": row['data_type'],
-                        "nullable": not row['not_null']
-                    }
-                    for row in columns_rows
-                ]
-                
-                # Get table comment
-                table_comment_query = """
-                    SELECT obj_description(c.oid, 'pg_class') AS comment
-                    FROM pg_catalog.pg_class c
-                    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
-                    WHERE n.nspname = $1 AND c.relname = $2
-                """
-                table_comment_row = await conn.fetchrow(table_comment_query, schema_name, table_name)
-                table_comment = table_comment_row['comment'] if table_comment_row and table_comment_row['comment'] else None
-                
-                # Get column comments
-                column_comments_query = """
-                    SELECT 
-                        a.attname AS column_name,
-                        col_description(a.attrelid, a.attnum) AS comment
-                    FROM pg_catalog.pg_attribute a
-                    JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
-                    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
-                    WHERE n.nspname = $1
-                      AND c.relname = $2
-                      AND a.attnum > 0
-                      AND NOT a.attisdropped
-                """
-                column_comments_rows = await conn.fetch(column_comments_query, schema_name, table_name)
-                column_comments = {
-                    row['column_name']: row['comment']
-                    for row in column_comments_rows
-                    if row['comment']
+            columns_rows = await conn.fetch(columns_query, schema_name, table_name)
+            columns = [
+                {
+                    "name": row['column_name'],
+                    "type": row['data_type'],
+                    "nullable": not row['not_null']
                 }
-                
-                # Get foreign keys
-                fk_query = """
-                    SELECT
-                        kcu.column_name AS column_name,
-                        ccu.table_schema AS foreign_table_schema,
-                        ccu.table_name AS foreign_table_name,
-                        ccu.column_name AS foreign_column_name
-                    FROM information_schema.table_constraints AS tc
-                    JOIN information_schema.key_column_usage AS kcu
-                      ON tc.constraint_name = kcu.constraint_name
-                      AND tc.table_schema = kcu.table_schema
-                    JOIN information_schema.constraint_column_usage AS ccu
-                      ON ccu.constraint_name = tc.constraint_name
-                      AND ccu.table_schema = tc.table_schema
-                    WHERE tc.constraint_type = 'FOREIGN KEY'
-                      AND tc.table_schema = $1
-                      AND tc.table_name = $2
-                """
-                fk_rows = await conn.fetch(fk_query, schema_name, table_name)
-                foreign_keys = [
-                    {
-                        "column": row['column_name'],
-                        "references_table": (
-                            f"{row['foreign_table_schema']}.{row['foreign_table_name']}"
-                            if row['foreign_table_schema'] != 'public'
-                            else row['foreign_table_name']
-                        ),
-                        "references_column": row['foreign_column_name']
-                    }
-                    for row in fk_rows
-                ]
-                
-                schema[full_table_name] = {
-                    "columns": columns,
-                    "comments": {
-                        "table": table_comment,
-                        "columns": column_comments
-                    },
-                    "foreign_keys": foreign_keys
+                for row in columns_rows
+            ]
+            
+            # Get table comment
+            table_comment_query = """
+                SELECT obj_description(c.oid, 'pg_class') AS comment
+                FROM pg_catalog.pg_class c
+                JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+                WHERE n.nspname = $1 AND c.relname = $2
+            """
+            table_comment_row = await conn.fetchrow(table_comment_query, schema_name, table_name)
+            table_comment = table_comment_row['comment'] if table_comment_row and table_comment_row['comment'] else None
+            
+            # Get column comments
+            column_comments_query = """
+                SELECT 
+                    a.attname AS column_name,
+                    col_description(a.attrelid, a.attnum) AS comment
+                FROM pg_catalog.pg_attribute a
+                JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+                JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+                WHERE n.nspname = $1
+                  AND c.relname = $2
+                  AND a.attnum > 0
+                  AND NOT a.attisdropped
+            """
+            column_comments_rows = await conn.fetch(column_comments_query, schema_name, table_name)
+            column_comments = {
+                row['column_name']: row['comment']
+                for row in column_comments_rows
+                if row['comment']
+            }
+            
+            # Get foreign keys
+            fk_query = """
+                SELECT
+                    tc.constraint_name AS constraint_name,
+                    kcu.column_name AS column_name,
+                    ccu.table_schema AS foreign_table_schema,
+                    ccu.table_name AS foreign_table_name,
+                    ccu.column_name AS foreign_column_name
+                FROM information_schema.table_constraints AS tc
+                JOIN information_schema.key_column_usage AS kcu
+                  ON tc.constraint_name = kcu.constraint_name
+                  AND tc.table_schema = kcu.table_schema
+                JOIN information_schema.constraint_column_usage AS ccu
+                  ON ccu.constraint_name = tc.constraint_name
+                  AND ccu.table_schema = tc.table_schema
+                WHERE tc.constraint_type = 'FOREIGN KEY'
+                  AND tc.table_schema = $1
+                  AND tc.table_name = $2
+            """
+            fk_rows = await conn.fetch(fk_query, schema_name, table_name)
+            foreign_keys = [
+                {
+                    "column": row['column_name'],
+                    "references_table": qualified_name(
+                        row['foreign_table_schema'], row['foreign_table_name']
+                    ),
+                    "references_column": row['foreign_column_name'],
+                    "constraint": row['constraint_name']
                 }
+                for row in fk_rows
+            ]
+            
+            # Get indexes
+            index_rows = await conn.fetch(_BULK_INDEXES_QUERY, [table['oid']])
+            indexes = [_index_from_row(row).to_dict() for row in index_rows]
             
-            self._schema_cache = schema
-            return schema
+            schema[full_table_name] = Table.from_dict(full_table_name, {
+                "columns": columns,
+                "comments": {
+                    "table": table_comment,
+                    "columns": column_comments
+                },
+                "foreign_keys": foreign_keys,
+                "kind": RELATION_KINDS[table['relkind']],
+                "partitions": table['partitions'],
+                "indexes": indexes
+            })
+        
+        return schema
     
-    def get_schema(self) -> Dict[str, Dict]:
-        """Get cached schema. Raises RuntimeError if not loaded."""
-        if self._schema_cache is None:
+    @property
+    def snapshot(self) -> SchemaSnapshot:
+        """Get the current schema snapshot. Raises RuntimeError if not loaded."""
+        if self._snapshot is None:
             raise RuntimeError("Schema not loaded. Call load_schema() first.")
-        return self._schema_cache
+        return self._snapshot
+    
+    def get_schema(self) -> Mapping[str, Dict]:
+        """
+        Get cached schema in the dict format documented in load_schema.
+        
+        This is a view over the compact records of the current snapshot;
+        per-table dicts are built on access. Raises RuntimeError if not loaded.
+        """
+        return SchemaView(self.snapshot.tables)
     
-    def get_schema_context(self, max_tables: Optional[int] = None) -> str:
+    async def get_schema_context(
+        self,
+        max_tables: Optional[int] = None,
+        snapshot: Optional[SchemaSnapshot] = None,
+        question: Optional[str] = None,
+        token_budget: Optional[int] = None,
+        required_tables: Sequence[str] = ()
+    ) -> str:
         """
         Format schema for LLM prompt context.
         
+        Without a question, tables are included in catalog order. With a
+        question, the tables most relevant to it are included, best first,
+        up to the token budget, plus any bridge tables needed to join them
+        and a list of join hints. Lazy snapshots load the details of the
+        selected tables first, and without a question they are limited to
+        the token budget too.
+        
         Args:
             max_tables: Optional limit on number of tables to include
-            
+            snapshot: Snapshot to render (defaults to the current one)
+            question: User's question, used to rank tables by relevance
+            token_budget: Maximum estimated tokens of context (0 = unlimited).
+                Defaults to settings.schema_context_token_budget.
+            required_tables: Tables to include ahead of the ranked ones
+                (only used with a question)
+        
         Returns:
             Formatted string describing the schema
         """
-        schema = self.get_schema()
-        tables = list(schema.items())
+        snapshot = snapshot or self.snapshot
+        if token_budget is None:
+            token_budget = settings.schema_context_token_budget
         
-        if max_tables:
-            tables = tables[:max_tables]
+        if question is not None:
+            selected = snapshot.index.select_tables(
+                question, token_budget, max_tables, required_tables
+            )
+            await self.load_tables(selected, snapshot)
+            # Bridge tables added for join hints count against the budget too
+            selected = snapshot.fit_join_budget(selected, token_budget)
+            return snapshot.render_context(tuple(selected), join_hints=True)
         
-        lines = []
-        for table_name, table_info in tables:
-            lines.append(f"\n## Table: {table_name}")
-            
-            if table_info["comments"]["table"]:
-                lines.append(f"Description: {table_info['comments']['table']}")
-            
-            lines.append("Columns:")
-            for col in table_info["columns"]:
-                nullable = "nullable" if col["nullable"] else "NOT NULL"
-                comment = table_info["comments"]["columns"].get(col["name"], "")
-                comment_str = f" -- {comment}" if comment else ""
-                lines.append(f"  - {col['name']}: {col['type']} ({nullable}){comment_str}")
-            
-            if table_info["foreign_keys"]:
-                lines.append("Foreign Keys:")
-                for fk in table_info["foreign_keys"]:
-                    lines.append(
-                        f"  - {fk['column']} -> {fk['references_table']}.{fk['references_column']}"
-                    )
-        
-        return "\n".join(lines)
+        if snapshot.lazy:
+            selected = snapshot.index.select_tables("", token_budget, max_tables)
+            await self.load_tables(selected, snapshot)
+            return snapshot.render_context(tuple(selected))
+        if max_tables:
+            return snapshot.render_context(tuple(snapshot.tables)[:max_tables])
+        return snapshot.render_context()
 
 
 # Global schema loader instance
@@ -0,0 +1,329 @@
+"""Compact records for schema metadata."""
+import sys
+from collections.abc import Mapping
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Intern a catalog string so repeated names, types and comments share memory."""
+    return sys.intern(value) if value else None
+
+
+class Column:
+    """One column of a table."""
+    
+    __slots__ = ("name", "type", "nullable", "comment")
+    
+    def __init__(self, name: str, type: str, nullable: bool, comment: Optional[str] = None):
+        self.name = sys.intern(name)
+        self.type = sys.intern(type)
+        self.nullable = nullable
+        self.comment = _intern(comment)
+
+
+class ForeignKey:
+    """
+    One column of a foreign key constraint.
+    
+    The columns of a composite constraint share its name (see
+    group_foreign_keys); a key without a name stands alone.
+    """
+    
+    __slots__ = ("column", "references_table", "references_column", "constraint")
+    
+    def __init__(
+        self,
+        column: str,
+        references_table: str,
+        references_column: str,
+        constraint: Optional[str] = None
+    ):
+        self.column = sys.intern(column)
+        self.references_table = sys.intern(references_table)
+        self.references_column = sys.intern(references_column)
+        self.constraint = _intern(constraint)
+    
+    def to_dict(self) -> Dict:
+        """Legacy dict form."""
+        return {
+            "column": self.column,
+            "references_table": self.references_table,
+            "references_column": self.references_column,
+            "constraint": self.constraint
+        }
+
+
+def group_foreign_keys(foreign_keys: Tuple[ForeignKey, ...]) -> List[Tuple[ForeignKey, ...]]:
+    """The columns of a table's foreign keys grouped into constraints, in order."""
+    groups: Dict[object, List[ForeignKey]] = {}
+    for position, fk in enumerate(foreign_keys):
+        key = (fk.constraint, fk.references_table) if fk.constraint else position
+        groups.setdefault(key, []).append(fk)
+    return [tuple(group) for group in groups.values()]
+
+
+class Index:
+    """
+    One index of a table (primary key and unique constraints included).
+    
+    Keys are column names, or the expression text for expression keys.
+    """
+    
+    __slots__ = ("name", "keys", "unique", "primary", "method", "predicate")
+    
+    def __init__(
+        self,
+        name: str,
+        keys: Tuple[str, ...],
+        unique: bool,
+        primary: bool,
+        method: str = "btree",
+        predicate: Optional[str] = None
+    ):
+        self.name = sys.intern(name)
+        self.keys = tuple(sys.intern(key) for key in keys)
+        self.unique = unique
+        self.primary = primary
+        self.method = sys.intern(method)
+        self.predicate = _intern(predicate)
+    
+    def describe(self) -> str:
+        """Compact description such as "UNIQUE (a, b) WHERE deleted_at IS NULL"."""
+        if self.primary:
+            prefix = "PRIMARY KEY "
+        elif self.unique:
+            prefix = "UNIQUE "
+        else:
+            prefix = ""
+        if self.method != "btree":
+            prefix += f"{self.method} "
+        where = f" WHERE {self.predicate}" if self.predicate else ""
+        return f"{prefix}({', '.join(self.keys)}){where}"
+    
+    def to_dict(self) -> Dict:
+        """Legacy dict form."""
+        return {
+            "name": self.name,
+            "columns": list(self.keys),
+            "unique": self.unique,
+            "primary": self.primary,
+            "method": self.method,
+            "predicate": self.predicate
+        }
+
+
+# Relation kinds by pg_class.relkind
+RELATION_KINDS = {
+    'r': "table",
+    'p': "partitioned table",
+    'v': "view",
+    'm': "materialized view",
+}
+
+
+class Table:
+    """
+    Metadata of one table, view or materialized view.
+    
+    Tables are treated as immutable once published in a snapshot; a refresh
+    replaces changed tables instead of modifying them. Partitions are not
+    tables of their own: a partitioned table stands for its whole hierarchy
+    and only records how many partitions it has.
+    """
+    
+    __slots__ = (
+        "name", "comment", "columns", "foreign_keys", "kind", "partitions", "indexes"
+    )
+    
+    def __init__(
+        self,
+        name: str,
+        comment: Optional[str],
+        columns: Tuple[Column, ...],
+        foreign_keys: Tuple[ForeignKey, ...],
+        kind: str = "table",
+        partitions: int = 0,
+        indexes: Tuple[Index, ...] = ()
+    ):
+        self.name = sys.intern(name)
+        self.comment = _intern(comment)
+        self.columns = columns
+        self.foreign_keys = foreign_keys
+        self.kind = sys.intern(kind)
+        self.partitions = partitions
+        self.indexes = indexes
+    
+    def get_column(self, name: str) -> Optional[Column]:
+        """Find a column by name."""
+        for col in self.columns:
+            if col.name == name:
+                return col
+        return None
+    
+    @property
+    def primary_key(self) -> Optional[Tuple[str, ...]]:
+        """Primary key columns, if the table has a primary key."""
+        for index in self.indexes:
+            if index.primary:
+                return index.keys
+        return None
+    
+    def indexed_columns(self) -> FrozenSet[str]:
+        """
+        Columns that lead a full (non-partial) btree index.
+        
+        Equality, range and ORDER BY on these columns can use an index scan.
+        """
+        return frozenset(
+            index.keys[0]
+            for index in self.indexes
+            if index.method == "btree" and not index.predicate
+            and self.get_column(index.keys[0]) is not None
+        )
+    
+    def to_dict(self) -> Dict:
+        """Legacy dict form, as documented in SchemaLoader.load_schema."""
+        return {
+            "columns": [
+                {"name": col.name, "type": col.type, "nullable": col.nullable}
+                for col in self.columns
+            ],
+            "comments": {
+                "table": self.comment,
+                "columns": {col.name: col.comment for col in self.columns if col.comment}
+            },
+            "foreign_keys": [fk.to_dict() for fk in self.foreign_keys],
+            "kind": self.kind,
+            "partitions": self.partitions,
+            "indexes": [index.to_dict() for index in self.indexes]
+        }
+    
+    @classmethod
+    def from_dict(cls, name: str, table_info: Dict) -> "Table":
+        """Build a table from the legacy dict form."""
+        column_comments = table_info["comments"]["columns"]
+        return cls(
+            name,
+            table_info["comments"]["table"],
+            tuple(
+                Column(col["name"], col["type"], col["nullable"], column_comments.get(col["name"]))
+                for col in table_info["columns"]
+            ),
+            tuple(
+                ForeignKey(
+                    fk["column"], fk["references_table"], fk["references_column"], fk.get("constraint")
+                )
+                for fk in table_info["foreign_keys"]
+            ),
+            table_info.get("kind", "table"),
+            table_info.get("partitions", 0),
+            tuple(
+                Index(
+                    index["name"], tuple(index["columns"]), index["unique"],
+                    index["primary"], index["method"], index["predicate"]
+                )
+                for index in table_info.get("indexes", ())
+            )
+        )
+    
+    def to_row(self) -> List:
+        """Compact list form used by snapshot files."""
+        return [
+            self.comment,
+            [[col.name, col.type, col.nullable, col.comment] for col in self.columns],
+            [
+                [fk.column, fk.references_table, fk.references_column, fk.constraint]
+                for fk in self.foreign_keys
+            ],
+            self.kind,
+            self.partitions,
+            [
+                [index.name, list(index.keys), index.unique, index.primary,
+                 index.method, index.predicate]
+                for index in self.indexes
+            ]
+        ]
+    
+    @classmethod
+    def from_row(cls, name: str, row: List) -> "Table":
+        """Build a table from its to_row() form."""
+        comment, columns, foreign_keys, kind, partitions, indexes = row
+        return cls(
+            name,
+            comment,
+            tuple(Column(*col) for col in columns),
+            tuple(ForeignKey(*fk) for fk in foreign_keys),
+            kind,
+            partitions,
+            tuple(
+                Index(index_name, tuple(keys), unique, primary, method, predicate)
+                for index_name, keys, unique, primary, method, predicate in indexes
+            )
+        )
+
+
+class ColumnStats:
+    """Planner statistics of one column (from pg_stats)."""
+    
+    __slots__ = ("avg_width", "n_distinct", "null_frac")
+    
+    def __init__(self, avg_width: int, n_distinct: float, null_frac: float):
+        self.avg_width = avg_width
+        # Positive: number of distinct values; negative: minus the fraction of rows
+        self.n_distinct = n_distinct
+        self.null_frac = null_frac
+
+
+class TableStats:
+    """Planner statistics of one table (from pg_class and pg_stats)."""
+    
+    __slots__ = ("row_estimate", "total_bytes", "columns")
+    
+    def __init__(self, row_estimate: int, total_bytes: int, columns: Dict[str, ColumnStats]):
+        # -1 or 0 when the table has never been analyzed
+        self.row_estimate = row_estimate
+        self.total_bytes = total_bytes
+        self.columns = columns
+    
+    def distinct_values(self, column: str) -> Optional[int]:
+        """Estimated number of distinct values in a column, if known."""
+        col_stats = self.columns.get(column)
+        if col_stats is None:
+            return None
+        if col_stats.n_distinct >= 0:
+            return int(col_stats.n_distinct)
+        return int(-col_stats.n_distinct * max(self.row_estimate, 0))
+    
+    def size_hint(self) -> Optional[str]:
+        """Human-readable row count such as "~40M rows", if analyzed."""
+        rows = self.row_estimate
+        if rows <= 0:
+            return None
+        for threshold, suffix in ((1_000_000_000, "B"), (1_000_000, "M"), (1_000, "K")):
+            if rows >= threshold:
+                return f"~{rows / threshold:.3g}{suffix} rows"
+        return f"~{rows} rows"
+
+
+class SchemaView(Mapping):
+    """
+    Read-only dict-of-dicts view of a snapshot's tables.
+    
+    Keeps the original get_schema() format available; each table's dict is
+    built when it is accessed rather than stored.
+    """
+    
+    def __init__(self, tables: Dict[str, Table]):
+        self._tables = tables
+    
+    def __getitem__(self, table_name: str) -> Dict:
+        return self._tables[table_name].to_dict()
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tables)
+    
+    def __len__(self) -> int:
+        return len(self._tables)
+    
+    def __contains__(self, table_name: object) -> bool:
+        return table_name in self._tables
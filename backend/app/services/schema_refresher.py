@@ -0,0 +1,179 @@
+"""Background refresh of the schema snapshot when the catalog changes."""
+import asyncio
+import logging
+from typing import Optional
+import asyncpg
+
+from app.config import settings
+from app.services.schema_loader import schema_loader, SchemaLoader
+
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts to reconnect a lost listener connection
+_LISTEN_RETRY_MIN = 1
+_LISTEN_RETRY_MAX = 60
+
+
+class SchemaRefresher:
+    """
+    Keeps the schema snapshot in sync with DDL changes.
+    
+    Polls the catalog fingerprints every schema_refresh_interval seconds and,
+    if schema_refresh_channel is set, also refreshes as soon as a
+    NOTIFY arrives on that channel (see schema_change_trigger.sql).
+    Each refresh reloads only the changed tables. Table statistics are
+    reloaded on their own schedule (schema_stats_interval).
+    
+    If the listener connection is lost (server restart, idle disconnect),
+    it is reconnected with backoff, and a refresh is requested once it is
+    back, since notifications sent meanwhile were missed.
+    """
+    
+    def __init__(self, loader: SchemaLoader = schema_loader):
+        self._loader = loader
+        self._task: Optional[asyncio.Task] = None
+        self._stats_task: Optional[asyncio.Task] = None
+        self._listen_conn: Optional[asyncpg.Connection] = None
+        self._listen_channel: Optional[str] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+    
+    async def start(self, revalidate: bool = False):
+        """
+        Start the background refresh task.
+        
+        Args:
+            revalidate: Refresh once right away, e.g. because the current
+                snapshot came from a snapshot file. This happens even when
+                periodic refresh is disabled.
+        """
+        if settings.schema_stats_interval > 0:
+            self._stats_task = asyncio.create_task(self._run_stats(settings.schema_stats_interval))
+        
+        interval = settings.schema_refresh_interval
+        channel = settings.schema_refresh_channel
+        if interval <= 0 and not channel:
+            if revalidate:
+                self._task = asyncio.create_task(self._refresh())
+            return
+        
+        if revalidate:
+            self.request_refresh()
+        
+        if channel:
+            self._listen_channel = channel
+            await self._listen()
+        
+        self._task = asyncio.create_task(self._run(interval if interval > 0 else None))
+    
+    async def stop(self):
+        """Stop the background tasks and close the listener connection."""
+        # Stop reconnecting before the listener connection is closed
+        self._listen_channel = None
+        for task in (self._task, self._stats_task, self._reconnect_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._stats_task = None
+        self._reconnect_task = None
+        if self._listen_conn:
+            self._listen_conn.remove_termination_listener(self._on_listener_lost)
+            await self._listen_conn.close()
+            self._listen_conn = None
+    
+    def request_refresh(self):
+        """Wake the refresh task up before its next poll."""
+        self._wakeup.set()
+    
+    def _on_notify(self, connection, pid, channel, payload):
+        """asyncpg listener callback."""
+        self.request_refresh()
+    
+    async def _listen(self):
+        """Open the dedicated listener connection and subscribe to the channel."""
+        # Dedicated connection: a listener must not hold a pool connection
+        conn = await asyncpg.connect(self._loader.database.url)
+        try:
+            await conn.add_listener(self._listen_channel, self._on_notify)
+        except BaseException:
+            await conn.close()
+            raise
+        conn.add_termination_listener(self._on_listener_lost)
+        self._listen_conn = conn
+        logger.info(f"Listening for schema changes on channel '{self._listen_channel}'")
+    
+    def _on_listener_lost(self, connection):
+        """asyncpg termination callback: the listener connection closed."""
+        if self._listen_channel is None or connection is not self._listen_conn:
+            return
+        logger.warning("Schema change listener connection lost; reconnecting")
+        self._listen_conn = None
+        self._ensure_listening()
+    
+    def _ensure_listening(self):
+        """Start reconnecting the listener unless it is connected or already reconnecting."""
+        if self._listen_channel is None:
+            return
+        if self._listen_conn is not None and not self._listen_conn.is_closed():
+            return
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            return
+        self._listen_conn = None
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+    
+    async def _reconnect(self):
+        """Reconnect the listener with backoff, then refresh to catch missed changes."""
+        delay = _LISTEN_RETRY_MIN
+        while self._listen_channel is not None:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Schema change listener reconnect failed: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _LISTEN_RETRY_MAX)
+                continue
+            self.request_refresh()
+            return
+    
+    async def _run(self, interval: Optional[float]):
+        """Wait for a notification or the poll interval, then refresh."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Termination callbacks don't fire for every kind of lost
+            # connection, so check on every poll too
+            self._ensure_listening()
+            await self._refresh()
+    
+    async def _run_stats(self, interval: float):
+        """Reload table statistics now and then every interval seconds."""
+        while True:
+            try:
+                await self._loader.refresh_stats()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Schema statistics refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+    
+    async def _refresh(self):
+        """Refresh once, logging instead of raising on failure."""
+        try:
+            await self._loader.refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Schema refresh failed: {str(e)}")
+
+
+# Global schema refresher instance
+schema_refresher = SchemaRefresher()
@@ -0,0 +1,82 @@
+"""On-disk persistence of schema snapshots for fast startup."""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.services.schema_model import Table
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of Table.to_row() changes
+_FORMAT_VERSION = 5
+
+
+def database_identity(database_url: str) -> str:
+    """Stable identity of a database from its URL (credentials excluded)."""
+    parts = urlsplit(database_url)
+    identity = f"{parts.username or ''}@{parts.hostname or ''}:{parts.port or 5432}{parts.path}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+
+
+class SchemaSnapshotStore:
+    """
+    Reads and writes schema snapshot files.
+    
+    One gzip-compressed JSON file per database identity. The relation
+    fingerprints are stored with the tables, so after loading a file the
+    loader only needs an incremental refresh to catch up with the catalog.
+    """
+    
+    def __init__(self, directory: str, database_url: str):
+        self._identity = database_identity(database_url)
+        self.path = os.path.join(directory, f"schema-{self._identity}.json.gz")
+    
+    def load(self) -> Optional[Tuple[Dict[str, Table], Dict[int, Tuple[str, str]]]]:
+        """
+        Read the snapshot file.
+        
+        Returns:
+            (tables, fingerprints), or None if there is no usable file
+        """
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable schema snapshot {self.path}: {str(e)}")
+            return None
+        
+        if data.get("format") != _FORMAT_VERSION or data.get("identity") != self._identity:
+            return None
+        
+        fingerprints = {
+            int(oid): (name, fingerprint)
+            for oid, (name, fingerprint) in data["fingerprints"].items()
+        }
+        tables = {name: Table.from_row(name, row) for name, row in data["tables"].items()}
+        return tables, fingerprints
+    
+    def save(self, tables: Dict[str, Table], fingerprints: Dict[int, Tuple[str, str]]):
+        """Atomically replace the snapshot file."""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "format": _FORMAT_VERSION,
+            "identity": self._identity,
+            "fingerprints": {str(oid): list(entry) for oid, entry in fingerprints.items()},
+            "tables": {name: table.to_row() for name, table in tables.items()},
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".schema-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                f.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,85 @@
+"""Helpers for walking pglast AST nodes."""
+from typing import Any, Iterator, Optional
+from pglast import ast
+
+
+def node_tag(node: Any) -> Optional[str]:
+    """Node type name such as "SelectStmt" (None for non-node values)."""
+    tag = getattr(node, 'node_tag', None)
+    if tag is None and isinstance(node, ast.Node):
+        tag = type(node).__name__
+    return tag
+
+
+def iter_children(node: Any) -> Iterator[Any]:
+    """Direct child nodes of a node, looking into list and tuple fields."""
+    for attr_name in getattr(node, '__slots__', ()):
+        yield from _nodes_in(getattr(node, attr_name, None))
+
+
+def _nodes_in(value: Any) -> Iterator[Any]:
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _nodes_in(item)
+    elif node_tag(value) is not None:
+        yield value
+
+
+def walk(node: Any) -> Iterator[Any]:
+    """The node and all its descendants, depth first."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if node_tag(current) is None:
+            continue
+        yield current
+        stack.extend(reversed(list(iter_children(current))))
+
+
+def string_value(node: Any) -> Optional[str]:
+    """Value of a String node (pglast 5 uses sval, older versions str)."""
+    if node_tag(node) != "String":
+        return None
+    return getattr(node, 'sval', None) or getattr(node, 'str', None)
+
+
+def const_value(node: Any) -> Any:
+    """Python value of an A_Const, Integer, Float or String node (else None)."""
+    if node_tag(node) == "A_Const":
+        if getattr(node, 'isnull', False):
+            return None
+        node = node.val
+    tag = node_tag(node)
+    if tag == "Integer":
+        return node.ival
+    if tag == "Float":
+        return float(node.fval)
+    if tag == "String":
+        return string_value(node)
+    if tag == "Boolean":
+        return node.boolval
+    return None
+
+
+def range_var_name(node: Any) -> Optional[str]:
+    """Table name of a RangeVar as used by the schema ("schema.table" or "table")."""
+    if node_tag(node) != "RangeVar" or not getattr(node, 'relname', None):
+        return None
+    if getattr(node, 'schemaname', None):
+        return f"{node.schemaname}.{node.relname}"
+    return node.relname
+
+
+def quote_ident(name: str) -> str:
+    """Quote an identifier for use in SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_table(table_name: str) -> str:
+    """Quote a schema table name ("table" or "schema.table")."""
+    return ".".join(quote_ident(part) for part in table_name.split(".", 1))
+
+
+def quote_literal(value: str) -> str:
+    """Quote a string literal for display in prompts."""
+    return "'" + value.replace("'", "''") + "'"
@@ -0,0 +1,139 @@
+"""Plain-language explanations of SELECT queries, rendered from the pglast AST."""
+import logging
+from typing import Any, List, Optional
+
+from pglast import parse_sql
+from pglast.stream import RawStream
+
+from app.services.sql_ast import const_value, node_tag, range_var_name
+
+logger = logging.getLogger(__name__)
+
+# SortByDir.SORTBY_DESC and SetOperation values
+_SORTBY_DESC = 2
+_SET_OPERATIONS = {1: "UNION", 2: "INTERSECT", 3: "EXCEPT"}
+
+# Longer lists and expressions are shortened
+_MAX_ITEMS = 5
+_MAX_EXPRESSION_CHARS = 120
+
+_FALLBACK = "Generated SQL query"
+
+
+def _render(node: Any) -> str:
+    """SQL text of an expression, shortened if long."""
+    text = RawStream()(node)
+    if len(text) > _MAX_EXPRESSION_CHARS:
+        text = text[:_MAX_EXPRESSION_CHARS - 3].rstrip() + "..."
+    return text
+
+
+def _join_items(items: List[str]) -> str:
+    """"a, b and c", with items past _MAX_ITEMS counted instead of listed."""
+    if not items:
+        return ""
+    if len(items) > _MAX_ITEMS:
+        items = items[:_MAX_ITEMS] + [f"{len(items) - _MAX_ITEMS} more"]
+    if len(items) == 1:
+        return items[0]
+    return ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def _source(node: Any) -> str:
+    """Description of one FROM item."""
+    tag = node_tag(node)
+    if tag == "RangeVar":
+        return range_var_name(node)
+    if tag == "JoinExpr":
+        return f"{_source(node.larg)} joined with {_source(node.rarg)}"
+    if tag == "RangeSubselect":
+        return "a subquery"
+    if tag == "RangeFunction":
+        return "a set-returning function"
+    return _render(node)
+
+
+def _output(target: Any) -> str:
+    """Description of one select-list item: its alias or expression."""
+    if getattr(target, "name", None):
+        return target.name
+    return _render(target.val)
+
+
+def _describe_select(stmt: Any) -> str:
+    """One sentence describing a SELECT statement."""
+    operation = _SET_OPERATIONS.get(int(getattr(stmt, "op", 0) or 0))
+    if operation is not None:
+        return (
+            f"Combines the results of two queries with {operation}"
+            + _describe_order_and_limit(stmt)
+        )
+    if stmt.valuesLists:
+        return "Returns literal rows" + _describe_order_and_limit(stmt)
+    
+    targets = stmt.targetList or ()
+    if len(targets) == 1 and node_tag(targets[0].val) == "ColumnRef" and _render(targets[0].val).endswith("*"):
+        outputs = "all columns"
+    else:
+        outputs = _join_items([_output(target) for target in targets]) or "nothing"
+    verb = "Selects distinct" if stmt.distinctClause is not None else "Selects"
+    sentence = f"{verb} {outputs}"
+    
+    if stmt.fromClause:
+        sentence += " from " + _join_items([_source(item) for item in stmt.fromClause])
+    if stmt.whereClause is not None:
+        sentence += f" where {_render(stmt.whereClause)}"
+    if stmt.groupClause:
+        sentence += ", grouped by " + _join_items([_render(item) for item in stmt.groupClause])
+    if stmt.havingClause is not None:
+        sentence += f", keeping groups where {_render(stmt.havingClause)}"
+    return sentence + _describe_order_and_limit(stmt)
+
+
+def _describe_order_and_limit(stmt: Any) -> str:
+    """The ORDER BY and LIMIT clauses of a statement, as sentence parts."""
+    parts = ""
+    if stmt.sortClause:
+        keys = [
+            _render(sort.node) + (" descending" if int(sort.sortby_dir or 0) == _SORTBY_DESC else "")
+            for sort in stmt.sortClause
+        ]
+        parts += ", ordered by " + _join_items(keys)
+    if stmt.limitCount is not None:
+        limit = const_value(stmt.limitCount)
+        if isinstance(limit, int):
+            parts += f", limited to {limit} row{'s' if limit != 1 else ''}"
+    return parts
+
+
+def explain_sql(sql: str) -> str:
+    """
+    Describe what a SELECT query does, for the explanation of a response.
+    
+    Covers the output columns, tables and joins, filters, grouping,
+    ordering and limit of the top-level statement, and names the CTEs it
+    uses. Used instead of asking the model for an explanation, which costs
+    output tokens on every generation.
+    
+    Args:
+        sql: A query that passed validation
+    
+    Returns:
+        One sentence, or a generic description if the query can't be parsed
+        or described
+    """
+    try:
+        statements = parse_sql(sql)
+        if len(statements) != 1 or node_tag(statements[0].stmt) != "SelectStmt":
+            return _FALLBACK
+        stmt = statements[0].stmt
+        
+        sentence = _describe_select(stmt)
+        with_clause: Optional[Any] = stmt.withClause
+        if with_clause is not None and with_clause.ctes:
+            names = _join_items([cte.ctename for cte in with_clause.ctes])
+            sentence = f"Using {names}, {sentence[0].lower()}{sentence[1:]}"
+        return sentence + "."
+    except Exception as e:
+        logger.warning(f"Could not explain SQL: {str(e)}")
+        return _FALLBACK
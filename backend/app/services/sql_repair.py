@@ -0,0 +1,237 @@
+"""Local repair of misspelled or mis-cased identifiers in generated SQL."""
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.services.name_index import best_match
+from app.services.query_executor import QueryExecutionError
+from app.services.schema_loader import SchemaLoader, SchemaSnapshot
+from app.services.sql_ast import quote_ident, quote_table
+from app.services.sql_validator import SQLValidator, UnknownIdentifierError
+
+logger = logging.getLogger(__name__)
+
+# One part of a dotted identifier: quoted, or a plain word
+_PART = r'"(?:[^"]|"")*"|[^\W\d][\w$]*'
+_PART_PATTERN = re.compile(_PART)
+_CHAIN_PATTERN = re.compile(rf"(?:{_PART})(?:\s*\.\s*(?:{_PART}))*")
+
+# Postgres "undefined_column", e.g. 'column "totl" does not exist' or
+# 'column o.totl does not exist'
+_UNDEFINED_COLUMN = "42703"
+_MISSING_COLUMN = re.compile(r'column (.+?) does not exist')
+
+
+def _normalize(part: str) -> str:
+    """The name an identifier part stands for: unquoted, or case-folded."""
+    if part.startswith('"'):
+        return part[1:-1].replace('""', '"')
+    return part.lower()
+
+
+def _char_offset(sql: str, byte_offset: int) -> int:
+    """Character offset of a parser location (a byte offset into the UTF-8 query)."""
+    return len(sql.encode("utf-8")[:byte_offset].decode("utf-8", errors="ignore"))
+
+
+def replace_reference(
+    sql: str,
+    offset: int,
+    old_name: str,
+    new_name: str,
+    kind: str
+) -> Optional[str]:
+    """
+    Replace the identifier starting at a character offset.
+    
+    For tables the whole (possibly schema-qualified) name is replaced, for
+    columns the last part of the reference. The new name is always quoted,
+    so mixed-case names keep their case.
+    
+    Returns:
+        The rewritten SQL, or None if the text at the offset isn't old_name
+    """
+    chain = _CHAIN_PATTERN.match(sql, offset) if offset >= 0 else None
+    if chain is None:
+        return None
+    parts = list(_PART_PATTERN.finditer(sql, chain.start(), chain.end()))
+    
+    if kind == "table":
+        if ".".join(_normalize(part.group(0)) for part in parts) != old_name:
+            return None
+        start, end, replacement = chain.start(), chain.end(), quote_table(new_name)
+    else:
+        last = parts[-1]
+        if _normalize(last.group(0)) != old_name:
+            return None
+        start, end, replacement = last.start(), last.end(), quote_ident(new_name)
+    return sql[:start] + replacement + sql[end:]
+
+
+class SQLRepairer:
+    """
+    Fixes references to tables and columns that don't exist.
+    
+    Generated SQL sometimes misspells a name ("custmer_id") or writes a
+    mixed-case name without quotes (OrderItems, which Postgres folds to
+    orderitems). Instead of failing the request, the reference is replaced
+    by the schema name it most likely meant (see best_match) and the query
+    is validated again. Repaired SQL goes through the full validator, so a
+    repair can never produce a query the validator would reject.
+    """
+    
+    def __init__(self, max_fixes: int = settings.sql_repair_max_fixes):
+        self.max_fixes = max_fixes
+        self.validation_failures = 0
+        self.validation_repaired = 0
+        self.execution_failures = 0
+        self.execution_repaired = 0
+        self.fixes: Dict[str, int] = {"case": 0, "fuzzy": 0}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_fixes > 0
+    
+    async def validate(
+        self,
+        sql: str,
+        validator: SQLValidator,
+        loader: SchemaLoader,
+        snapshot: SchemaSnapshot
+    ) -> Tuple[str, str, List[str]]:
+        """
+        Validate SQL, repairing unknown identifiers.
+        
+        Args:
+            sql: Generated SQL
+            validator: Validator of the database
+            loader: Schema loader of the database (lazy mode loads the
+                details of the referenced tables before columns are checked)
+            snapshot: Schema snapshot of the request
+        
+        Returns:
+            (SQL after repairs, validated SQL, descriptions of the fixes)
+        
+        Raises:
+            ValidationError: If the SQL is invalid and can't be repaired
+        """
+        fixes: List[str] = []
+        while True:
+            await loader.load_tables(validator.get_referenced_tables(sql), snapshot)
+            try:
+                validated_sql = validator.validate(sql, snapshot=snapshot)
+            except UnknownIdentifierError as e:
+                if not fixes:
+                    self.validation_failures += 1
+                repaired = self.repair(sql, e, snapshot) if len(fixes) < self.max_fixes else None
+                if repaired is None:
+                    raise
+                sql, fix = repaired
+                fixes.append(fix)
+                continue
+            
+            if fixes:
+                self.validation_repaired += 1
+                logger.info(f"Repaired generated SQL ({'; '.join(fixes)})")
+            return sql, validated_sql, fixes
+    
+    def repair(
+        self,
+        sql: str,
+        error: UnknownIdentifierError,
+        snapshot: SchemaSnapshot
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Fix the reference a validation error points at.
+        
+        Returns:
+            (rewritten SQL, description of the fix), or None
+        """
+        if error.kind == "table":
+            match = snapshot.name_index.lookup(error.name)
+        else:
+            match = best_match(error.name, error.candidates)
+        if match is None:
+            return None
+        
+        new_name, how = match
+        rewritten = replace_reference(
+            sql, _char_offset(sql, error.location), error.name, new_name, error.kind
+        )
+        if rewritten is None:
+            return None
+        self.fixes[how] += 1
+        return rewritten, f"{error.kind} {error.name} -> {new_name} ({how})"
+    
+    def repair_execution_error(
+        self,
+        sql: str,
+        error: QueryExecutionError,
+        snapshot: SchemaSnapshot,
+        tables: Iterable[str]
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Fix an unknown column that only the database noticed.
+        
+        The validator leaves references it can't resolve (through
+        subqueries, CTEs or functions) to the database; those come back as
+        undefined_column errors with the position of the reference.
+        
+        Args:
+            sql: The executed SQL
+            error: The execution error
+            snapshot: Schema snapshot of the request
+            tables: Tables the query reads from; their columns are the
+                candidates
+        
+        Returns:
+            (rewritten SQL, description of the fix), or None
+        """
+        if not self.enabled or error.sqlstate != _UNDEFINED_COLUMN or not error.position:
+            return None
+        self.execution_failures += 1
+        found = _MISSING_COLUMN.search(str(error))
+        if found is None:
+            return None
+        # The message names the column as the database resolved it (already
+        # case-folded), quoted when unqualified
+        name = found.group(1).rsplit(".", 1)[-1].strip('"')
+        
+        candidates = [
+            column.name
+            for table_name in tables if table_name in snapshot.table_names
+            for column in snapshot.get_table(table_name).columns
+        ]
+        match = best_match(name, candidates)
+        if match is None:
+            return None
+        new_name, how = match
+        # Postgres positions are 1-based character offsets
+        rewritten = replace_reference(sql, int(error.position) - 1, name, new_name, "column")
+        if rewritten is None:
+            return None
+        self.fixes[how] += 1
+        return rewritten, f"column {name} -> {new_name} ({how})"
+    
+    def record_execution_repaired(self):
+        """Count a query that ran after an execution-time repair."""
+        self.execution_repaired += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """How often repair was tried and how often it avoided a failure."""
+        failures = self.validation_failures + self.execution_failures
+        repaired = self.validation_repaired + self.execution_repaired
+        return {
+            "enabled": self.enabled,
+            "validation_failures": self.validation_failures,
+            "validation_repaired": self.validation_repaired,
+            "execution_failures": self.execution_failures,
+            "execution_repaired": self.execution_repaired,
+            "fixes": dict(self.fixes),
+            "avoided_failure_rate": round(repaired / failures, 3) if failures else None
+        }
+
+
+# Global SQL repairer
+sql_repairer = SQLRepairer()
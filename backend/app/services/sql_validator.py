@@ -1,9 +1,18 @@
 """SQL query validator using pglast AST parsing."""
-from typing import Set, Optional, Any
+from typing import Dict, FrozenSet, List, Sequence, Set, Optional, Any
 from pglast import parse_sql
 
 from app.config import settings
-from app.services.schema_loader import schema_loader
+from app.services.schema_loader import schema_loader, SchemaLoader, SchemaSnapshot
+from app.services.sql_ast import (
+    const_value, iter_children, node_tag, range_var_name, string_value, walk
+)
+
+
+# Nodes that write data, even when nested inside a SELECT
+_WRITE_NODES = frozenset({
+    "InsertStmt", "UpdateStmt", "DeleteStmt", "MergeStmt", "IntoClause"
+})
 
 
 class ValidationError(Exception):
@@ -11,29 +20,217 @@ class ValidationError(Exception):
     pass
 
 
+class UnknownIdentifierError(ValidationError):
+    """
+    Raised for a table or column that the schema doesn't have.
+    
+    Carries what SQLRepairer needs to fix the reference: where it is in the
+    query and which names would have been valid in its place.
+    """
+    
+    def __init__(
+        self,
+        message: str,
+        kind: str,
+        name: str,
+        location: int,
+        field: Optional[int] = None,
+        candidates: Sequence[str] = ()
+    ):
+        super().__init__(message)
+        self.kind = kind  # "table" or "column"
+        self.name = name
+        self.location = location  # parser offset of the reference
+        self.field = field  # dotted part of the reference to replace, None = all
+        self.candidates = candidates  # valid column names (tables use the snapshot)
+
+
+# Expression fields of a SELECT checked for column references; the FROM
+# clause is handled separately because it defines the scope
+_EXPRESSION_FIELDS = (
+    "targetList", "whereClause", "groupClause", "havingClause", "sortClause",
+    "windowClause", "distinctClause", "valuesLists", "limitCount", "limitOffset"
+)
+
+
+class _Scope:
+    """Relations visible in one SELECT: alias -> column names (None = unknown)."""
+    
+    __slots__ = ("sources", "output_names", "has_unknown")
+    
+    def __init__(self):
+        self.sources: Dict[str, Optional[FrozenSet[str]]] = {}
+        self.output_names: Set[str] = set()
+        self.has_unknown = False
+    
+    def add(self, alias: Optional[str], columns: Optional[FrozenSet[str]]):
+        if columns is None:
+            self.has_unknown = True
+        if alias:
+            self.sources[alias] = columns
+    
+    def known_columns(self) -> List[str]:
+        """Column names of the relations whose columns are known."""
+        return sorted({column for columns in self.sources.values() if columns for column in columns})
+
+
+class _ColumnChecker:
+    """
+    Checks column references against the tables in scope.
+    
+    Deliberately lenient: a reference is only rejected when every relation
+    it could come from has known columns (tables with loaded details, not
+    subqueries, CTEs or functions) and none of them has it.
+    """
+    
+    def __init__(self, snapshot: SchemaSnapshot):
+        self._snapshot = snapshot
+    
+    def check_select(self, select: Any, outer: List[_Scope], ctes: FrozenSet[str]):
+        """Check one SELECT (and everything nested in it)."""
+        with_clause = getattr(select, "withClause", None)
+        if with_clause is not None:
+            ctes = ctes | {cte.ctename for cte in with_clause.ctes}
+            for cte in with_clause.ctes:
+                if node_tag(cte.ctequery) == "SelectStmt":
+                    self.check_select(cte.ctequery, outer, ctes)
+        
+        # Set operations (UNION etc.) have no scope of their own
+        if getattr(select, "larg", None) is not None:
+            self.check_select(select.larg, outer, ctes)
+            self.check_select(select.rarg, outer, ctes)
+            return
+        
+        scope = _Scope()
+        join_quals: List[Any] = []
+        for item in getattr(select, "fromClause", None) or ():
+            self._add_from_item(item, scope, outer, ctes, join_quals)
+        for target in getattr(select, "targetList", None) or ():
+            if getattr(target, "name", None):
+                scope.output_names.add(target.name)
+        
+        scopes = outer + [scope]
+        for field in _EXPRESSION_FIELDS:
+            self._check_expressions(getattr(select, field, None), scopes, ctes)
+        for quals in join_quals:
+            self._check_expressions(quals, scopes, ctes)
+    
+    def _add_from_item(
+        self,
+        item: Any,
+        scope: _Scope,
+        outer: List[_Scope],
+        ctes: FrozenSet[str],
+        join_quals: List[Any]
+    ):
+        """Add the relations of a FROM item to the scope."""
+        tag = node_tag(item)
+        alias = getattr(item, "alias", None)
+        alias_name = getattr(alias, "aliasname", None)
+        if tag == "RangeVar":
+            table_name = range_var_name(item)
+            columns: Optional[FrozenSet[str]] = None
+            if getattr(alias, "colnames", None):
+                columns = frozenset(string_value(name) for name in alias.colnames)
+            elif table_name not in ctes and table_name in self._snapshot.table_names:
+                table = self._snapshot.get_table(table_name)
+                # Lazy snapshots may not have the table's details
+                columns = frozenset(column.name for column in table.columns) or None
+            scope.add(alias_name or item.relname, columns)
+        elif tag == "JoinExpr":
+            self._add_from_item(item.larg, scope, outer, ctes, join_quals)
+            self._add_from_item(item.rarg, scope, outer, ctes, join_quals)
+            if getattr(item, "quals", None) is not None:
+                join_quals.append(item.quals)
+            if alias_name:
+                scope.add(alias_name, None)
+        elif tag == "RangeSubselect":
+            # Lateral subqueries see the relations before them; others only
+            # the enclosing queries
+            self.check_select(item.subquery, outer + [scope] if item.lateral else outer, ctes)
+            scope.add(alias_name, None)
+        else:
+            # Functions, table samples, XMLTABLE...: columns unknown
+            scope.add(alias_name, None)
+    
+    def _check_expressions(self, node: Any, scopes: List[_Scope], ctes: FrozenSet[str]):
+        """Check the column references of an expression tree, recursing into subqueries."""
+        stack = list(_nodes(node))
+        while stack:
+            current = stack.pop()
+            tag = node_tag(current)
+            if tag == "SelectStmt":
+                self.check_select(current, scopes, ctes)
+            elif tag == "ColumnRef":
+                self._check_reference(current, scopes)
+            else:
+                stack.extend(iter_children(current))
+    
+    def _check_reference(self, ref: Any, scopes: List[_Scope]):
+        """Check one column reference against the scopes, innermost first."""
+        fields = [string_value(field) for field in ref.fields]
+        if None in fields or len(fields) > 2:
+            # a.*, or schema-qualified references
+            return
+        location = getattr(ref, "location", -1)
+        
+        if len(fields) == 2:
+            qualifier, column = fields
+            for scope in reversed(scopes):
+                if qualifier in scope.sources:
+                    columns = scope.sources[qualifier]
+                    if columns is not None and column not in columns:
+                        raise UnknownIdentifierError(
+                            f"Column '{column}' does not exist in '{qualifier}'",
+                            "column", column, location, field=1, candidates=sorted(columns)
+                        )
+                    return
+            # Unknown qualifier: left to the database
+            return
+        
+        column = fields[0]
+        for scope in reversed(scopes):
+            if scope.has_unknown or column in scope.output_names or column in scope.sources:
+                return
+            if any(columns and column in columns for columns in scope.sources.values()):
+                return
+        raise UnknownIdentifierError(
+            f"Column '{column}' does not exist in the tables of the query",
+            "column", column, location, field=0, candidates=scopes[-1].known_columns() if scopes else []
+        )
+
+
+def _nodes(value: Any) -> List[Any]:
+    """AST nodes in a field value (a node, a list of nodes or nothing)."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [item for item in value if node_tag(item) is not None]
+    return [value] if node_tag(value) is not None else []
+
+
 class SQLValidator:
     """Validates SQL queries for safety and correctness."""
     
-    def __init__(self):
-        self._allowed_tables: Optional[Set[str]] = None
+    def __init__(self, loader: SchemaLoader = schema_loader):
+        self._loader = loader
     
-    def _get_allowed_tables(self) -> Set[str]:
-        """Get set of allowed table names from schema."""
-        if self._allowed_tables is None:
-            schema = schema_loader.get_schema()
-            self._allowed_tables = set(schema.keys())
-        return self._allowed_tables
+    def _get_allowed_tables(self, snapshot: Optional[SchemaSnapshot] = None) -> FrozenSet[str]:
+        """Get set of allowed table names from the schema snapshot."""
+        return (snapshot or self._loader.snapshot).table_names
     
-    def validate(self, sql: str) -> str:
+    def validate(self, sql: str, snapshot: Optional[SchemaSnapshot] = None) -> str:
         """
         Validate SQL query and return sanitized version.
         
         Args:
             sql: SQL query string to validate
-            
+            snapshot: Schema snapshot to validate against (defaults to the
+                current one)
+        
         Returns:
             Validated SQL query (may be modified, e.g., LIMIT added)
-            
+        
         Raises:
             ValidationError: If query is invalid or unsafe
         """
@@ -43,92 +240,110 @@ class SQLValidator:
         except Exception as e:
             raise ValidationError(f"Invalid SQL syntax: {str(e)}")
         
-        allowed_tables = self._get_allowed_tables()
+        snapshot = snapshot or self._loader.snapshot
+        allowed_tables = self._get_allowed_tables(snapshot)
         
         # Validate each statement
         for stmt in ast:
-            self._validate_statement(stmt, allowed_tables)
+            self._validate_statement(stmt, allowed_tables, snapshot)
         
         # Ensure LIMIT is present and within bounds
         sql = self._ensure_limit(sql, ast)
         
         return sql
     
-    def _validate_statement(self, stmt: Any, allowed_tables: Set[str]):
+    def _validate_statement(
+        self,
+        stmt: Any,
+        allowed_tables: FrozenSet[str],
+        snapshot: SchemaSnapshot
+    ):
         """Validate a single SQL statement node."""
-        if not hasattr(stmt, 'node_tag'):
+        stmt_type = node_tag(stmt)
+        if stmt_type is None:
             return
         
-        stmt_type = stmt.node_tag
-        
         # Only allow SELECT statements
         if stmt_type == "SelectStmt":
-            self._validate_select(stmt, allowed_tables)
+            self._validate_select(stmt, allowed_tables, snapshot)
         elif stmt_type == "RawStmt":
             # Recursively validate the inner statement
             if hasattr(stmt, 'stmt'):
                 inner_stmt = stmt.stmt
-                self._validate_statement(inner_stmt, allowed_tables)
+                self._validate_statement(inner_stmt, allowed_tables, snapshot)
         else:
             raise ValidationError(
                 f"Only SELECT queries are allowed. Found: {stmt_type}"
             )
     
-    def _validate_select(self, select_stmt: Any, allowed_tables: Set[str]):
+    def _validate_select(
+        self,
+        select_stmt: Any,
+        allowed_tables: FrozenSet[str],
+        snapshot: SchemaSnapshot
+    ):
         """Validate a SELECT statement."""
-        # Check for CTEs (WITH clauses)
-        if hasattr(select_stmt, 'withClause') and select_stmt.withClause:
-            if hasattr(select_stmt.withClause, 'ctes'):
-                for cte in select_stmt.withClause.ctes:
-                    if hasattr(cte, 'ctequery'):
-                        self._validate_select(cte.ctequery, allowed_tables)
+        # CTE names (WITH clauses, at any nesting level) may be used as tables
+        cte_names = {
+            node.ctename for node in walk(select_stmt)
+            if node_tag(node) == "CommonTableExpr"
+        }
         
         # Extract table references
-        self._extract_and_validate_tables(select_stmt, allowed_tables)
+        self._extract_and_validate_tables(select_stmt, allowed_tables | cte_names)
+        
+        # Column references, once every table is known to exist
+        _ColumnChecker(snapshot).check_select(select_stmt, [], frozenset())
     
     def _extract_and_validate_tables(
         self,
         node: Any,
-        allowed_tables: Set[str]
+        allowed_tables: FrozenSet[str]
     ):
         """Recursively extract and validate table references."""
-        if node is None:
-            return
-        
-        if not hasattr(node, 'node_tag'):
-            return
-        
-        node_tag = node.node_tag
-        
-        # Check for RangeVar (table references)
-        if node_tag == "RangeVar":
-            table_name = None
-            if hasattr(node, 'schemaname') and node.schemaname:
-                if hasattr(node, 'relname'):
-                    table_name = f"{node.schemaname}.{node.relname}"
-            elif hasattr(node, 'relname'):
-                table_name = node.relname
+        for child in walk(node):
+            tag = node_tag(child)
             
-            if table_name and table_name not in allowed_tables:
+            # Data-modifying CTEs and SELECT INTO
+            if tag in _WRITE_NODES:
                 raise ValidationError(
-                    f"Table '{table_name}' is not in the allowed schema. "
-                    f"Allowed tables: {sorted(allowed_tables)}"
+                    f"Only SELECT queries are allowed. Found: {tag}"
                 )
+            
+            # Check for RangeVar (table references)
+            if tag == "RangeVar":
+                table_name = range_var_name(child)
+                if table_name and table_name not in allowed_tables:
+                    raise UnknownIdentifierError(
+                        f"Table '{table_name}' is not in the allowed schema. "
+                        f"Allowed tables: {sorted(allowed_tables)}",
+                        "table", table_name, getattr(child, "location", -1)
+                    )
+    
+    def get_referenced_tables(self, sql: str) -> Set[str]:
+        """
+        Names of the tables a query reads from (CTE names excluded).
+        
+        Raises:
+            ValidationError: If the query cannot be parsed
+        """
+        try:
+            ast = parse_sql(sql)
+        except Exception as e:
+            raise ValidationError(f"Invalid SQL syntax: {str(e)}")
         
-        # Recursively check child nodes
-        for attr_name in dir(node):
-            if attr_name.startswith('_'):
-                continue
-            try:
-                attr_value = getattr(node, attr_name)
-                if hasattr(attr_value, 'node_tag'):
-                    self._extract_and_validate_tables(attr_value, allowed_tables)
-                elif isinstance(attr_value, list):
-                    for item in attr_value:
-                        if hasattr(item, 'node_tag'):
-                            self._extract_and_validate_tables(item, allowed_tables)
-            except (AttributeError, TypeError):
-                pass
+        tables: Set[str] = set()
+        cte_names: Set[str] = set()
+        for stmt in ast:
+            for node in walk(stmt):
+                tag = node_tag(node)
+                if tag == "CommonTableExpr":
+                    cte_names.add(node.ctename)
+                elif tag == "RangeVar":
+                    table_name = range_var_name(node)
+                    if table_name:
+                        tables.add(table_name)
+        return tables - cte_names
     
     def _ensure_limit(self, sql: str, ast: list) -> str:
         """
@@ -141,34 +356,14 @@ class SQLValidator:
         has_limit = False
         limit_value = None
         
-        def check_limit(node: Any):
-            nonlocal has_limit, limit_value
-            if hasattr(node, 'node_tag'):
-                if node.node_tag == "SelectStmt":
-                    if hasattr(node, 'limitCount') and node.limitCount:
-                        has_limit = True
-                        # Extract limit value
-                        if hasattr(node.limitCount, 'val'):
-                            try:
-                                limit_value = int(node.limitCount.val)
-                            except (ValueError, AttributeError):
-                                pass
-                # Recursively check
-                for attr_name in dir(node):
-                    if not attr_name.startswith('_'):
-                        try:
-                            attr_value = getattr(node, attr_name)
-                            if hasattr(attr_value, 'node_tag'):
-                                check_limit(attr_value)
-                            elif isinstance(attr_value, list):
-                                for item in attr_value:
-                                    if hasattr(item, 'node_tag'):
-                                        check_limit(item)
-                        except (AttributeError, TypeError):
-                            pass
-        
         for stmt in ast:
-            check_limit(stmt)
+            for node in walk(stmt):
+                if node_tag(node) == "SelectStmt" and getattr(node, 'limitCount', None):
+                    has_limit = True
+                    # Extract limit value
+                    value = const_value(node.limitCount)
+                    if isinstance(value, int):
+                        limit_value = value
         
         # If no LIMIT, add one
         if not has_limit:
@@ -0,0 +1,347 @@
+"""Sampled column values with a trigram index for grounding question literals."""
+import asyncio
+import logging
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncpg
+
+from app.config import settings
+from app.services.schema_index import tokenize
+from app.services.schema_loader import qualified_name, schema_loader, SchemaLoader, SchemaSnapshot
+from app.services.sql_ast import quote_ident, quote_literal, quote_table
+
+logger = logging.getLogger(__name__)
+
+# Column types whose values are worth sampling
+_TEXT_TYPE_PREFIXES = ("text", "character varying", "character(", "citext", "varchar")
+
+# Keep tables this large to a block sample instead of a full DISTINCT scan
+_SAMPLE_ROWS = 100_000
+
+# Without statistics, text columns of tables up to this size are sampled
+_SMALL_TABLE_ROWS = 10_000
+_SMALL_TABLE_BYTES = 16 * 1024 * 1024
+
+# How long the first pass waits for the first statistics load
+_STATS_WAIT_SECONDS = 60
+
+# Questions are matched as word n-grams of up to this many words
+_MAX_PHRASE_WORDS = 3
+
+_MIN_SIMILARITY = 0.5
+_MAX_MATCHES = 10
+
+_WORD = re.compile(r"[a-z0-9]+")
+_QUOTED = re.compile(r"""["'‘’“”]([^"'‘’“”]+)["'‘’“”]""")
+
+_ENUM_LABELS_QUERY = """
+    SELECT
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        a.attname AS column_name,
+        array_agg(e.enumlabel ORDER BY e.enumsortorder) AS labels
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+    JOIN pg_catalog.pg_enum e ON e.enumtypid = a.atttypid
+    WHERE c.relkind IN ('r', 'p', 'v', 'm')
+      AND NOT c.relispartition
+      AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+    GROUP BY n.nspname, c.relname, a.attname
+"""
+
+# Text columns of small tables, for tables without statistics. The size
+# check also covers tables that were never analyzed (reltuples -1 or 0)
+_SMALL_TABLE_COLUMNS_QUERY = """
+    SELECT
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        a.attname AS column_name,
+        pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+        greatest(c.reltuples, 0)::bigint AS row_estimate
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+    JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+    WHERE c.relkind IN ('r', 'm')
+      AND NOT c.relispartition
+      AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+      AND c.reltuples <= $1
+      AND pg_catalog.pg_relation_size(c.oid) <= $2
+    ORDER BY c.reltuples, n.nspname, c.relname, a.attnum
+"""
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm-style trigrams: lowercase words padded with two leading and one trailing space."""
+    result: Set[str] = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class ValueMatch(NamedTuple):
+    """A phrase of the question that matches a stored column value."""
+    table: str
+    column: str
+    value: str
+    phrase: str
+    score: float
+
+
+class _ColumnValues(NamedTuple):
+    values: Tuple[str, ...]
+    loaded_at: float
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to (table, column, value) entries."""
+    
+    def __init__(self, columns: Dict[Tuple[str, str], _ColumnValues]):
+        self._entries: List[Tuple[str, str, str]] = []
+        self._entry_trigrams: List[Set[str]] = []
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        
+        for (table, column), column_values in columns.items():
+            for value in column_values.values:
+                entry_id = len(self._entries)
+                grams = trigrams(value)
+                self._entries.append((table, column, value))
+                self._entry_trigrams.append(grams)
+                self._exact[value.lower()].append(entry_id)
+                for gram in grams:
+                    self._postings[gram].append(entry_id)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def lookup(self, phrase: str, min_similarity: float = _MIN_SIMILARITY) -> List[Tuple[int, float]]:
+        """Entries similar to a phrase as (entry id, similarity), exact matches scoring 1."""
+        exact = self._exact.get(phrase.lower())
+        if exact:
+            return [(entry_id, 1.0) for entry_id in exact]
+        
+        grams = trigrams(phrase)
+        if not grams:
+            return []
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for entry_id in self._postings.get(gram, ()):
+                shared[entry_id] += 1
+        
+        results = []
+        for entry_id, count in shared.items():
+            similarity = count / len(grams | self._entry_trigrams[entry_id])
+            if similarity >= min_similarity:
+                results.append((entry_id, similarity))
+        return results
+    
+    def entry(self, entry_id: int) -> Tuple[str, str, str]:
+        """(table, column, value) of an entry."""
+        return self._entries[entry_id]
+
+
+class ValueDictionary:
+    """
+    Distinct values of low-cardinality text and enum columns.
+    
+    A background pass samples candidate columns (chosen from the snapshot's
+    statistics) and pg_enum labels, re-sampling each column when its values
+    are older than value_dictionary_ttl. Tables without statistics (not
+    analyzed, or statistics disabled) fall back to the text columns of small
+    tables, whose DISTINCT query is bounded. The first pass waits for the
+    first statistics load. The trigram index is rebuilt and swapped after
+    every pass, and match() grounds the words of a question in exact stored
+    values before the prompt is built.
+    """
+    
+    def __init__(self, loader: SchemaLoader = schema_loader):
+        self._loader = loader
+        self._columns: Dict[Tuple[str, str], _ColumnValues] = {}
+        self._index = TrigramIndex({})
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Start the background sampling task (no-op when disabled)."""
+        if settings.value_dictionary_ttl <= 0:
+            return
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background sampling task."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        """Sample now, then check for expired columns periodically."""
+        interval = max(60, settings.value_dictionary_ttl // 4)
+        # Candidate columns come from statistics, which load concurrently
+        if settings.schema_stats_interval > 0:
+            if not await self._loader.wait_for_stats(_STATS_WAIT_SECONDS):
+                logger.warning("Value dictionary: statistics not loaded yet, sampling small tables only")
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Value dictionary refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+    
+    async def refresh(self, snapshot: Optional[SchemaSnapshot] = None):
+        """Sample new and expired candidate columns and swap in a new index."""
+        snapshot = snapshot or self._loader.snapshot
+        now = time.monotonic()
+        columns = {
+            key: column_values for key, column_values in self._columns.items()
+            if key[0] in snapshot.tables and now - column_values.loaded_at < settings.value_dictionary_ttl
+        }
+        
+        async with self._loader.database.acquire() as conn:
+            for row in await conn.fetch(_ENUM_LABELS_QUERY):
+                table = qualified_name(row['schema_name'], row['table_name'])
+                if table in snapshot.tables:
+                    columns[(table, row['column_name'])] = _ColumnValues(tuple(row['labels']), now)
+            
+            candidates = self._candidates(snapshot) + await self._small_table_candidates(conn, snapshot)
+            total = sum(len(column_values.values) for column_values in columns.values())
+            for table, column, rows in candidates:
+                if (table, column) in columns:
+                    continue
+                if total >= settings.value_dictionary_max_entries:
+                    break
+                values = await self._sample(conn, table, column, rows)
+                if values is not None:
+                    columns[(table, column)] = _ColumnValues(values, now)
+                    total += len(values)
+        
+        self._columns = columns
+        self._index = TrigramIndex(columns)
+        logger.info(f"Value dictionary: {len(self._index)} values in {len(columns)} columns")
+    
+    def _candidates(self, snapshot: SchemaSnapshot) -> List[Tuple[str, str, int]]:
+        """Text columns whose statistics say they hold few distinct values, as (table, column, rows)."""
+        max_distinct = settings.value_dictionary_max_distinct
+        candidates = []
+        # Statistics are only kept for tables with loaded details (lazy mode)
+        for table_name, stats in snapshot.stats.items():
+            if table_name not in snapshot.tables:
+                continue
+            for col in snapshot.get_table(table_name).columns:
+                if not col.type.startswith(_TEXT_TYPE_PREFIXES):
+                    continue
+                distinct = stats.distinct_values(col.name)
+                if distinct is not None and 0 < distinct <= max_distinct:
+                    candidates.append((table_name, col.name, stats.row_estimate))
+        return candidates
+    
+    async def _small_table_candidates(
+        self,
+        conn: asyncpg.Connection,
+        snapshot: SchemaSnapshot
+    ) -> List[Tuple[str, str, int]]:
+        """Text columns of small tables that have no statistics, as (table, column, rows)."""
+        if all(table_name in snapshot.stats for table_name in snapshot.tables):
+            return []
+        candidates = []
+        for row in await conn.fetch(_SMALL_TABLE_COLUMNS_QUERY, _SMALL_TABLE_ROWS, _SMALL_TABLE_BYTES):
+            table = qualified_name(row['schema_name'], row['table_name'])
+            if table not in snapshot.tables or table in snapshot.stats:
+                continue
+            if row['data_type'].startswith(_TEXT_TYPE_PREFIXES):
+                candidates.append((table, row['column_name'], row['row_estimate']))
+        return candidates
+    
+    async def _sample(
+        self,
+        conn: asyncpg.Connection,
+        table: str,
+        column: str,
+        rows: int
+    ) -> Optional[Tuple[str, ...]]:
+        """Distinct values of a column, or None if there are too many."""
+        limit = settings.value_dictionary_max_distinct
+        sample = ""
+        if rows > _SAMPLE_ROWS:
+            sample = f" TABLESAMPLE SYSTEM ({max(0.01, 100 * _SAMPLE_ROWS / rows):.4f})"
+        query = (
+            f"SELECT DISTINCT {quote_ident(column)}::text AS value "
+            f"FROM {quote_table(table)}{sample} "
+            f"WHERE {quote_ident(column)} IS NOT NULL LIMIT {limit + 1}"
+        )
+        try:
+            values = [row['value'] for row in await conn.fetch(query)]
+        except asyncpg.PostgresError as e:
+            logger.warning(f"Could not sample {table}.{column}: {str(e)}")
+            return None
+        if len(values) > limit:
+            return None
+        return tuple(values)
+    
+    def match(self, question: str, snapshot: Optional[SchemaSnapshot] = None) -> List[ValueMatch]:
+        """
+        Find stored column values mentioned in a question.
+        
+        Quoted strings and word n-grams of the question are looked up in the
+        trigram index; each phrase keeps its best match.
+        
+        Returns:
+            Best matches first, at most one per column
+        """
+        index = self._index
+        if not len(index):
+            return []
+        tables = (snapshot or self._loader.snapshot).tables
+        
+        best: Dict[Tuple[str, str], ValueMatch] = {}
+        for phrase in _phrases(question):
+            results = index.lookup(phrase)
+            if not results:
+                continue
+            entry_id, score = max(results, key=lambda result: result[1])
+            table, column, value = index.entry(entry_id)
+            if table not in tables:
+                continue
+            key = (table, column)
+            if key not in best or score > best[key].score:
+                best[key] = ValueMatch(table, column, value, phrase, score)
+        
+        return sorted(best.values(), key=lambda match: -match.score)[:_MAX_MATCHES]
+    
+    def render_hints(self, matches: List[ValueMatch]) -> str:
+        """Format matches as a schema context section."""
+        if not matches:
+            return ""
+        lines = ["\n## Value hints (exact stored values mentioned in the question)"]
+        for match in matches:
+            lines.append(f"  - {match.table}.{match.column} = {quote_literal(match.value)}")
+        return "\n".join(lines)
+
+
+def _phrases(question: str) -> List[str]:
+    """Quoted strings and word n-grams that are not just stopwords."""
+    phrases = [quoted.strip() for quoted in _QUOTED.findall(question)]
+    words = _WORD.findall(question.lower())
+    for size in range(1, _MAX_PHRASE_WORDS + 1):
+        for start in range(len(words) - size + 1):
+            phrase_words = words[start:start + size]
+            if not tokenize(" ".join(phrase_words)) or len("".join(phrase_words)) < 3:
+                continue
+            phrases.append(" ".join(phrase_words))
+    return phrases
+
+
+# Global value dictionary instance
+value_dictionary = ValueDictionary()
@@ -0,0 +1,97 @@
+"""
+Measure /chat throughput and tail latency against a running server.
+
+Start the server with the fake LLM backend so that the numbers reflect the
+server itself rather than the model provider:
+
+    LLM_BACKEND=fake FAKE_LLM_LATENCY_MS=300 uvicorn app.main:app
+
+then, from the backend directory:
+
+    python -m benchmarks.chat_load --requests 500 --concurrency 20
+
+Questions are read one per line from --questions, or default to a small
+built-in set. With the generation cache enabled repeated questions are
+cache hits; pass --unique to append a counter and defeat the cache.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import List
+
+import httpx
+
+DEFAULT_QUESTIONS = [
+    "How many rows are there?",
+    "Show me the latest records",
+    "Count the entries",
+    "List some rows",
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run(
+    url: str,
+    questions: List[str],
+    total: int,
+    concurrency: int,
+    unique: bool,
+    summary: str
+):
+    """Send total requests with at most concurrency in flight and report."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    counter = iter(range(total))
+
+    async def worker(client: httpx.AsyncClient):
+        for number in counter:
+            question = questions[number % len(questions)]
+            if unique:
+                question = f"{question} ({number})"
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json={"query": question, "summary": summary})
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{total} requests, concurrency {concurrency}, {elapsed:.2f}s")
+    print(f"throughput: {total / elapsed:.1f} req/s")
+    for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)):
+        print(f"{label}: {percentile(latencies, fraction) * 1000:.1f} ms")
+    print("status:", ", ".join(f"{status}={count}" for status, count in sorted(statuses.items(), key=str)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/chat")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--unique", action="store_true", help="make every question distinct")
+    parser.add_argument("--summary", default="llm", choices=["none", "stats", "llm"])
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+    asyncio.run(run(args.url, questions, args.requests, args.concurrency, args.unique, args.summary))
+
+
+if __name__ == "__main__":
+    main()
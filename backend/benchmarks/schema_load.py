@@ -0,0 +1,88 @@
+"""
+Benchmark schema loading time against catalog size.
+
+Creates synthetic schemas with a growing number of tables (each with columns,
+comments and a foreign key) and times every load mode against the same
+catalog. Run from the backend directory against a scratch database:
+
+    python -m benchmarks.schema_load --sizes 100,500,1000,3000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Loading the schema never calls the LLM, but Settings requires a key
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from app.database import db  # noqa: E402
+from app.services.schema_loader import SchemaLoader  # noqa: E402
+
+BENCH_SCHEMA = "schema_load_bench"
+
+MODES = [
+    ("per_table", 1),
+    ("bulk", 1),
+    ("bulk", 4),
+]
+
+
+async def create_catalog(num_tables: int, columns_per_table: int):
+    """(Re)create the benchmark schema with num_tables synthetic tables."""
+    async with db.acquire() as conn:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+        for i in range(num_tables):
+            columns = ", ".join(
+                f"col_{c} text" for c in range(columns_per_table)
+            )
+            parent = f", parent_id integer REFERENCES {BENCH_SCHEMA}.t_{i - 1}(id)" if i else ""
+            await conn.execute(
+                f"CREATE TABLE {BENCH_SCHEMA}.t_{i} (id serial PRIMARY KEY{parent}, {columns});"
+                f"COMMENT ON TABLE {BENCH_SCHEMA}.t_{i} IS 'Synthetic table {i}';"
+                f"COMMENT ON COLUMN {BENCH_SCHEMA}.t_{i}.col_0 IS 'First column';"
+            )
+
+
+async def time_load(loader: SchemaLoader, mode: str, parallelism: int, repeat: int) -> float:
+    """Best-of-N wall time in seconds for one load mode."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await loader.load_schema(mode=mode, parallelism=parallelism)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def main(sizes: list[int], columns_per_table: int, repeat: int):
+    await db.connect()
+    loader = SchemaLoader()
+    try:
+        header = f"{'tables':>8}  " + "  ".join(
+            f"{f'{mode}/{parallelism}':>14}" for mode, parallelism in MODES
+        )
+        print(header)
+        for size in sizes:
+            await create_catalog(size, columns_per_table)
+            timings = [
+                await time_load(loader, mode, parallelism, repeat)
+                for mode, parallelism in MODES
+            ]
+            print(f"{size:>8}  " + "  ".join(f"{t * 1000:>12.1f}ms" for t in timings))
+    finally:
+        async with db.acquire() as conn:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,500,1000", help="Comma-separated table counts")
+    parser.add_argument("--columns", type=int, default=8, help="Columns per synthetic table")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode (best is reported)")
+    args = parser.parse_args()
+    asyncio.run(main(
+        [int(size) for size in args.sizes.split(",")],
+        args.columns,
+        args.repeat,
+    ))
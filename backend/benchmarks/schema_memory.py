@@ -0,0 +1,143 @@
+"""
+Measure the memory held by the schema cache on a synthetic catalog.
+
+Builds the same synthetic catalog rows twice: once into the original
+dict-of-dicts layout and once into the compact Table records the loader
+uses, and reports the traced allocations of each. No database needed:
+
+    python -m benchmarks.schema_memory --tables 2500 --columns 20
+"""
+import argparse
+import gc
+import os
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/unused")
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from app.services.schema_loader import _assemble_schema  # noqa: E402
+
+TYPES = ["integer", "bigint", "text", "character varying(255)", "timestamp without time zone", "numeric(10,2)", "boolean"]
+
+
+def _fresh(value: str) -> str:
+    """A new string object, like the values decoded from each catalog row."""
+    return value.encode("utf-8").decode("utf-8")
+
+
+def synthetic_rows(num_tables: int, columns_per_table: int):
+    """Rows shaped like the bulk catalog query results."""
+    relation_rows = [
+        {
+            "oid": oid,
+            "schema_name": _fresh("public"),
+            "table_name": f"table_{oid}",
+            "comment": _fresh("Synthetic table"),
+            "relkind": _fresh("r"),
+            "partitions": 0,
+        }
+        for oid in range(num_tables)
+    ]
+    column_rows = [
+        {
+            "oid": oid,
+            "column_name": _fresh("id") if c == 0 else f"column_{c}",
+            "data_type": _fresh(TYPES[c % len(TYPES)]),
+            "not_null": c == 0,
+            "comment": _fresh("Primary key") if c == 0 else None,
+        }
+        for oid in range(num_tables)
+        for c in range(columns_per_table)
+    ]
+    fk_rows = [
+        {
+            "oid": oid,
+            "constraint_name": f"table_{oid}_column_1_fkey",
+            "column_name": _fresh("column_1"),
+            "foreign_table_schema": _fresh("public"),
+            "foreign_table_name": f"table_{oid - 1}",
+            "foreign_column_name": _fresh("id"),
+        }
+        for oid in range(1, num_tables)
+    ]
+    index_rows = [
+        {
+            "oid": oid,
+            "index_name": f"table_{oid}_pkey",
+            "keys": [_fresh("id")],
+            "is_unique": True,
+            "is_primary": True,
+            "method": _fresh("btree"),
+            "predicate": None,
+        }
+        for oid in range(num_tables)
+    ]
+    return relation_rows, column_rows, fk_rows, index_rows
+
+
+def build_dicts(relation_rows, column_rows, fk_rows, index_rows):
+    """The original dict-of-dicts layout."""
+    schema, by_oid = {}, {}
+    for row in relation_rows:
+        info = {
+            "columns": [],
+            "comments": {"table": row["comment"], "columns": {}},
+            "foreign_keys": [],
+            "indexes": [],
+            "kind": row["relkind"],
+            "partitions": row["partitions"],
+        }
+        schema[row["table_name"]] = by_oid[row["oid"]] = info
+    for row in column_rows:
+        info = by_oid[row["oid"]]
+        info["columns"].append({"name": row["column_name"], "type": row["data_type"], "nullable": not row["not_null"]})
+        if row["comment"]:
+            info["comments"]["columns"][row["column_name"]] = row["comment"]
+    for row in fk_rows:
+        by_oid[row["oid"]]["foreign_keys"].append({
+            "column": row["column_name"],
+            "references_table": row["foreign_table_name"],
+            "references_column": row["foreign_column_name"],
+            "constraint": row["constraint_name"],
+        })
+    for row in index_rows:
+        by_oid[row["oid"]]["indexes"].append({
+            "name": row["index_name"],
+            "columns": row["keys"],
+            "unique": row["is_unique"],
+            "primary": row["is_primary"],
+            "method": row["method"],
+            "predicate": row["predicate"],
+        })
+    return schema
+
+
+def measure(build, num_tables: int, columns_per_table: int) -> int:
+    """Bytes retained by the schema built by build() once the rows are freed."""
+    gc.collect()
+    tracemalloc.start()
+    rows = synthetic_rows(num_tables, columns_per_table)
+    result = build(*rows)
+    del rows
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(num_tables: int, columns_per_table: int):
+    dict_bytes = measure(build_dicts, num_tables, columns_per_table)
+    compact_bytes = measure(_assemble_schema, num_tables, columns_per_table)
+    print(f"catalog: {num_tables} tables, {num_tables * columns_per_table} columns")
+    print(f"dict-of-dicts:  {dict_bytes / 1024 / 1024:8.1f} MiB")
+    print(f"compact tables: {compact_bytes / 1024 / 1024:8.1f} MiB")
+    print(f"reduction:      {1 - compact_bytes / dict_bytes:8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tables", type=int, default=2500)
+    parser.add_argument("--columns", type=int, default=20, help="Columns per table")
+    args = parser.parse_args()
+    main(args.tables, args.columns)
@@ -0,0 +1,19 @@
+-- Optional: notify the backend about DDL so it refreshes its schema snapshot
+-- immediately instead of waiting for the next poll.
+-- Requires superuser (event triggers). Set SCHEMA_REFRESH_CHANNEL=schema_changed.
+
+CREATE OR REPLACE FUNCTION notify_schema_changed() RETURNS event_trigger AS $$
+BEGIN
+    PERFORM pg_notify('schema_changed', tg_tag);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP EVENT TRIGGER IF EXISTS schema_changed_ddl_end;
+CREATE EVENT TRIGGER schema_changed_ddl_end
+    ON ddl_command_end
+    EXECUTE FUNCTION notify_schema_changed();
+
+DROP EVENT TRIGGER IF EXISTS schema_changed_sql_drop;
+CREATE EVENT TRIGGER schema_changed_sql_drop
+    ON sql_drop
+    EXECUTE FUNCTION notify_schema_changed();
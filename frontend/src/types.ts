@@ -2,6 +2,8 @@
 
 export interface ChatRequest {
   query: string;
+  database?: string;
+  summary?: 'none' | 'stats' | 'llm';
 }
 
 export interface ChatResponse {